@@ -19,9 +19,9 @@ interface CostStats {
     total_output_tokens_today: number;
     service_costs_today: Record<string, number>;
     total_products: number;
-    total_products_with_cost: number;
+    total_runs_with_cost: number;
     total_cost_all_time_usd: number;
-    avg_cost_per_product_usd: number;
+    avg_cost_per_run_usd: number;
     daily_product_limit: number;
     max_batch_size: number;
     max_daily_cost_usd: number;
@@ -189,14 +189,14 @@ export default function AnalyticsPage() {
                     <SummaryCard
                         label="All-Time Spend"
                         value={formatCost(stats?.total_cost_all_time_usd ?? 0)}
-                        sub={`${stats?.total_products_with_cost ?? 0} products tracked`}
+                        sub={`${stats?.total_runs_with_cost ?? 0} runs tracked`}
                         icon={<TrendingUp className="w-5 h-5" />}
                         color="text-amber-400"
                         bgGlow="bg-amber-500/5"
                     />
                     <SummaryCard
-                        label="Avg Cost / Product"
-                        value={formatCost(stats?.avg_cost_per_product_usd ?? 0)}
+                        label="Avg Cost / Run"
+                        value={formatCost(stats?.avg_cost_per_run_usd ?? 0)}
                         sub={`${stats?.total_products ?? 0} total products`}
                         icon={<Database className="w-5 h-5" />}
                         color="text-cyan-400"
@@ -0,0 +1,317 @@
+"""
+DB overhead benchmark — per-product cost of the db.py helpers
+
+Replays the DB traffic of one enrichment run (status updates, log appends,
+scraped-page writes/reads, cost save) against a throwaway database, with the
+old open/PRAGMA/close-per-call connections, with the thread-local connection
+reuse in db.py, and with reuse plus the write-behind writer (DB_WRITE_BEHIND).
+
+--pipeline runs the real enrichment_pipeline on the pipeline runtime loop
+instead, with Firecrawl / Tavily / Claude replaced by instant offline fakes so
+only pipeline + DB overhead is measured. It compares per-call connections with
+the loop's connection pool and counts the connections each mode opens.
+
+    cd backend
+    python bench_db.py                  # 50 products, 1 thread
+    python bench_db.py --products 200 --threads 4
+    python bench_db.py --pipeline --products 50 --concurrency 8
+"""
+
+import os
+import re
+import sys
+import time
+import asyncio
+import sqlite3
+import argparse
+import importlib
+import tempfile
+import threading
+from datetime import datetime
+
+import db
+
+
+def _legacy_connection():
+    """The pre-reuse behaviour: new connection + PRAGMAs on every call."""
+    conn = sqlite3.connect(db.DB_PATH, timeout=10)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+def _simulate_product(product_id: int):
+    """Roughly the helper calls a full pipeline run makes for one product."""
+    for i in range(25):
+        db.update_step(product_id, "extracting", f"Step {i}...")
+    for i in range(30):
+        db.append_log(product_id, {
+            "timestamp": datetime.now().isoformat(),
+            "phase": "bench", "step": f"step_{i}", "status": "success",
+            "details": "x" * 120,
+        })
+    for i in range(6):
+        url = f"https://example.com/{product_id}/{i}"
+        db.save_scraped_page(product_id, url, "manufacturer", "# page\n" + "text " * 2000)
+        db.mark_page_extracted(product_id, url)
+    for _ in range(4):
+        db.get_scraped_pages(product_id)
+    for _ in range(10):
+        conn = db.get_db_connection()
+        conn.execute("SELECT * FROM products WHERE id = ?", (product_id,)).fetchone()
+        conn.close()
+    db.save_cost_data(product_id, {"total_cost_usd": 0.01})
+
+
+def _run(label: str, products: int, threads: int) -> float:
+    product_ids = list(range(1, products + 1))
+    chunks = [product_ids[i::threads] for i in range(threads)]
+
+    def worker(ids):
+        for pid in ids:
+            _simulate_product(pid)
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    db.flush_writes()
+    elapsed = time.perf_counter() - started
+
+    per_product_ms = elapsed / products * 1000
+    print(f"{label:<22} {elapsed:7.2f}s total  {per_product_ms:7.1f} ms/product  {products / elapsed:7.1f} products/s")
+    return per_product_ms
+
+
+def _fresh_db(path: str, products: int):
+    db.close_thread_connection()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    db.DB_PATH = path
+    db.init_db()
+    conn = db.get_db_connection()
+    conn.executemany(
+        "INSERT INTO products (id, ean, product_name) VALUES (?, ?, ?)",
+        [(pid, f"{pid:013d}", f"Product {pid}") for pid in range(1, products + 1)]
+    )
+    conn.commit()
+    conn.close()
+
+
+# ─── Pipeline Mode ────────────────────────────────────────────────────────────
+
+class _FakeDocument:
+    def __init__(self, markdown: str):
+        self.markdown = markdown
+
+
+class _FakeFirecrawl:
+    def __init__(self, api_key=None):
+        pass
+
+    def scrape(self, url, formats=None):
+        return _FakeDocument(f"# {url}\nNet weight 2.5 kg. Package weight 3 kg.\n" + "Specification text. " * 100)
+
+    def search(self, query, limit=5):
+        slug = abs(hash(query)) % 1000
+        return {"web": [{"url": f"https://shop.example.com/{slug}/{i}", "title": query, "description": ""}
+                        for i in range(limit)]}
+
+
+class _FakeTavily:
+    def __init__(self, api_key=None):
+        pass
+
+    def search(self, query, max_results=5, include_domains=None):
+        domain = include_domains[0] if include_domains else "shop.example.com"
+        slug = abs(hash(query)) % 1000
+        return {"results": [{"url": f"https://{domain}/{slug}/{i}", "title": query, "content": "Made in Japan."}
+                            for i in range(max_results)]}
+
+
+def _fake_llm_result(schema, prompt: str):
+    from schemas import (
+        ProductClassification, SearchResultList, SearchResultURL, DimensionsExtraction,
+        ContentExtraction, GapFillExtraction, EnrichedField, ValidationReport, BarcodeLookupResult,
+    )
+    if schema is ProductClassification:
+        return ProductClassification(
+            product_type="standard_product", brand="Makita", brand_confidence="certain",
+            model_number="DUR181", manufacturer_domain="makita.com", reasoning="bench",
+        )
+    if schema is SearchResultList:
+        urls = list(dict.fromkeys(re.findall(r"https?://[^\s|)]+", prompt)))[:8]
+        kinds = ["manufacturer", "manufacturer", "authorized_distributor", "third_party"]
+        return SearchResultList(results=[
+            SearchResultURL(url=url, title="", source_type=kinds[i % len(kinds)], reasoning="bench")
+            for i, url in enumerate(urls)
+        ])
+    if schema is DimensionsExtraction:
+        return DimensionsExtraction(net_weight=EnrichedField(value=2.5, unit="kg", confidence="official"))
+    if schema is ContentExtraction:
+        return ContentExtraction(features=["Brushless motor"], warranty_duration="2 years")
+    if schema is GapFillExtraction:
+        return GapFillExtraction(packaged_weight=EnrichedField(value=3, unit="kg", confidence="third_party"))
+    if schema is EnrichedField:
+        return EnrichedField(value="Japan", confidence="inferred")
+    if schema is ValidationReport:
+        return ValidationReport(overall_quality="good", issues=[])
+    if schema is BarcodeLookupResult:
+        return BarcodeLookupResult(brand="Makita")
+    return schema()
+
+
+async def _fake_aclassify(prompt, system, schema, model="haiku", return_usage=False, **kwargs):
+    await asyncio.sleep(0)
+    result = _fake_llm_result(schema, prompt)
+    usage = {"input_tokens": 1000, "output_tokens": 200, "cache_creation_input_tokens": 0,
+             "cache_read_input_tokens": 0, "model": "claude_haiku" if model == "haiku" else "claude_sonnet"}
+    return (result, usage) if return_usage else result
+
+
+def _install_fake_providers():
+    """Point every pipeline module at the offline fakes."""
+    for key in ("FIRECRAWL_API_KEY", "TAVILY_API_KEY"):
+        os.environ.setdefault(key, "bench")
+    for name in ("LLM", "TAVILY"):
+        os.environ.setdefault(f"{name}_MAX_RPM", "1000000")
+        os.environ.setdefault(f"{name}_MAX_CONCURRENT", "1000")
+    os.environ.setdefault("FIRECRAWL_TIER", "growth")
+
+    import firecrawl
+    for name in ("graph", "pipeline.triage", "pipeline.search", "pipeline.extract",
+                 "pipeline.gap_fill", "pipeline.validate", "utils.ean_lookup"):
+        importlib.import_module(name)
+    firecrawl.FirecrawlApp = _FakeFirecrawl
+    for module in list(sys.modules.values()):
+        if getattr(module, "FirecrawlApp", None) is not None:
+            module.FirecrawlApp = _FakeFirecrawl
+        if getattr(module, "TavilyClient", None) is not None:
+            module.TavilyClient = _FakeTavily
+        if getattr(module, "aclassify_with_schema", None) is not None:
+            module.aclassify_with_schema = _fake_aclassify
+
+
+def _patch_get_db_connection(replacement):
+    """Swap get_db_connection in db.py and every module that imported it."""
+    current = db.get_db_connection
+    for module in list(sys.modules.values()):
+        if getattr(module, "get_db_connection", None) is current:
+            module.get_db_connection = replacement
+
+
+def _drive_pipeline(products: int, concurrency: int) -> float:
+    """Run products 1..N through enrichment_pipeline on the runtime loop; returns seconds."""
+    from graph import enrichment_pipeline
+    from runtime import pipeline_runtime
+    from utils.cost_tracker import CostTracker
+
+    async def run_all():
+        gate = asyncio.Semaphore(concurrency)
+
+        async def one(pid: int):
+            async with gate:
+                await enrichment_pipeline.ainvoke({
+                    "product_id": pid, "has_brand": False, "has_search_results": False,
+                    "error": None, "cost_tracker": CostTracker(pid),
+                })
+        await asyncio.gather(*(one(pid) for pid in range(1, products + 1)))
+
+    started = time.perf_counter()
+    pipeline_runtime.run(run_all())
+    return time.perf_counter() - started
+
+
+def _run_pipeline(label: str, products: int, concurrency: int, opened: list) -> float:
+    opened[0] = 0
+    elapsed = _drive_pipeline(products, concurrency)
+    per_product_ms = elapsed / products * 1000
+    print(f"{label:<22} {elapsed:7.2f}s total  {per_product_ms:7.1f} ms/product  "
+          f"{opened[0]:6d} connections opened")
+    return per_product_ms
+
+
+def _bench_pipeline(products: int, concurrency: int):
+    _install_fake_providers()
+
+    # Count every connection opened, in both modes
+    opened = [0]
+    open_pooled = db._open_connection
+
+    def counted_open():
+        opened[0] += 1
+        return open_pooled()
+
+    def counted_legacy():
+        opened[0] += 1
+        return _legacy_connection()
+
+    db._open_connection = counted_open
+    pooled_connection = db.get_db_connection
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{products} products through enrichment_pipeline, concurrency {concurrency}\n")
+
+        # Untimed warm-up: imports, graph compile, limiter and client setup
+        _fresh_db(os.path.join(tmp, "warmup.db"), 2)
+        _drive_pipeline(2, concurrency)
+
+        _fresh_db(os.path.join(tmp, "legacy.db"), products)
+        _patch_get_db_connection(counted_legacy)
+        before = _run_pipeline("per-call connections", products, concurrency, opened)
+        _patch_get_db_connection(pooled_connection)
+
+        _fresh_db(os.path.join(tmp, "pooled.db"), products)
+        after = _run_pipeline("loop connection pool", products, concurrency, opened)
+        db.close_thread_connection()
+
+    print(f"\nPer-product pipeline time: {before:.1f} ms → {after:.1f} ms ({before / after:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-product DB overhead.")
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--pipeline", action="store_true",
+                        help="run enrichment_pipeline on the runtime loop with offline provider fakes")
+    parser.add_argument("--concurrency", type=int, default=8, help="products in flight (--pipeline)")
+    args = parser.parse_args()
+
+    if args.pipeline:
+        _bench_pipeline(args.products, args.concurrency)
+        return
+
+    reuse_connection = db.get_db_connection
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        print(f"{args.products} products, {args.threads} thread(s)\n")
+
+        _fresh_db(path, args.products)
+        db.get_db_connection = _legacy_connection
+        before = _run("per-call connections", args.products, args.threads)
+
+        db.get_db_connection = reuse_connection
+        _fresh_db(path, args.products)
+        after = _run("reused connections", args.products, args.threads)
+
+        db.DB_WRITE_BEHIND = True
+        _fresh_db(path, args.products)
+        behind = _run("write-behind writer", args.products, args.threads)
+        writer_stats = db.get_writer_stats()
+        db.DB_WRITE_BEHIND = False
+
+        db.close_thread_connection()
+
+    print(f"\nPer-product DB overhead: {before:.1f} ms → {after:.1f} ms ({before / after:.1f}x)"
+          f" → {behind:.1f} ms with write-behind ({before / behind:.1f}x)")
+    print(f"Write-behind: {writer_stats['writes']} writes in {writer_stats['batches']} commits "
+          f"(avg {writer_stats['avg_batch']} per commit)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,435 @@
 import sqlite3
 import json
 import os
-from datetime import datetime
+import asyncio
+import time
+import queue
+import atexit
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
 from events import event_bus
 
 DB_PATH = "products.db"
+EAN_UNIQUE = os.getenv("EAN_UNIQUE", "false").lower() == "true"
 
-def get_db_connection():
+logger = logging.getLogger("pipeline.db")
+
+# ─── Connection Reuse ─────────────────────────────────────────────────────────
+# Off the event loop each thread keeps one sqlite3 connection for its
+# lifetime, so PRAGMAs are applied once instead of on every helper call.
+# get_db_connection() hands out a thin proxy whose close() only rolls back
+# anything left uncommitted — the existing "open, execute, commit, close" call
+# pattern keeps working unchanged.
+#
+# On an event loop thread (the pipeline runtime) many coroutines share the
+# thread, and LangGraph nodes and gather() children each run as their own
+# task. There get_db_connection() checks a connection out of the loop's small
+# pool and close() hands it back (rolled back if left uncommitted);
+# transaction() holds one for the length of the block. Helpers don't await
+# between open and close, so a whole batch reuses a couple of connections,
+# and one coroutine's close() rollback or commit never touches another
+# coroutine's writes.
+
+_POOL_MAX_IDLE = 4
+
+_local = threading.local()
+
+
+class _ConnState:
+    """Connection, transaction depth, queued-write flag and events held back
+    until commit, for one thread or one asyncio task. A task only holds a
+    connection while its transaction() block is open."""
+    __slots__ = ("conn", "path", "tx_depth", "writes_pending", "pending_events")
+
+    def __init__(self):
+        self.conn: sqlite3.Connection | None = None
+        self.path: str | None = None
+        self.tx_depth = 0
+        self.writes_pending = False
+        self.pending_events: list[tuple[int, dict]] = []
+
+
+class _LoopPool:
+    """Idle connections of one event loop thread (sqlite3 connections stay on
+    the thread that opened them, so each loop thread has its own pool)."""
+
+    def __init__(self):
+        self.idle: list[tuple[sqlite3.Connection, str]] = []
+
+    def acquire(self) -> tuple[sqlite3.Connection, str]:
+        while self.idle:
+            conn, path = self.idle.pop()
+            if path == DB_PATH:
+                return conn, path
+            conn.close()
+        return _open_connection(), DB_PATH
+
+    def release(self, conn: sqlite3.Connection, path: str):
+        if conn.in_transaction:
+            conn.rollback()
+        if path == DB_PATH and len(self.idle) < _POOL_MAX_IDLE:
+            self.idle.append((conn, path))
+        else:
+            conn.close()
+
+    def close(self):
+        for conn, _ in self.idle:
+            conn.close()
+        self.idle.clear()
+
+
+def _loop_pool() -> _LoopPool:
+    pool = getattr(_local, "pool", None)
+    if pool is None:
+        pool = _local.pool = _LoopPool()
+    return pool
+
+
+_task_states: dict = {}  # asyncio.Task → _ConnState
+
+
+def _current_task():
+    try:
+        return asyncio.current_task()
+    except RuntimeError:  # no running event loop on this thread
+        return None
+
+
+def _forget_task_state(task):
+    _task_states.pop(task, None)
+
+
+def _state(task=None) -> _ConnState:
+    task = task or _current_task()
+    if task is None:
+        state = getattr(_local, "state", None)
+        if state is None:
+            state = _local.state = _ConnState()
+        return state
+    state = _task_states.get(task)
+    if state is None:
+        state = _task_states[task] = _ConnState()
+        task.add_done_callback(_forget_task_state)
+    return state
+
+
+def _open_connection() -> sqlite3.Connection:
     conn = sqlite3.connect(DB_PATH, timeout=10)
     conn.row_factory = sqlite3.Row
-    # WAL mode on every connection — allows concurrent reads during writes
+    # WAL mode — allows concurrent reads during writes
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA busy_timeout=5000")
+    conn.execute("PRAGMA synchronous=NORMAL")
     return conn
 
+
+def _thread_connection(state: _ConnState) -> sqlite3.Connection:
+    if state.conn is None or state.path != DB_PATH:
+        if state.conn is not None:
+            state.conn.close()
+        state.conn = _open_connection()
+        state.path = DB_PATH
+        state.tx_depth = 0
+    return state.conn
+
+
+class _ReusedConnection:
+    """Proxy for the calling thread's connection, a task's open transaction,
+    or a connection checked out of the loop pool.
+
+    commit() is deferred while it belongs to an open transaction() block, and
+    close() doesn't close the underlying connection — it rolls back
+    uncommitted work (and returns a pooled connection to the pool) so the next
+    caller starts clean. Callers must close() it, or use it as a context
+    manager (which closes on exit, without committing):
+
+        with get_db_connection() as conn:
+            rows = conn.execute(...).fetchall()
+    """
+
+    def __init__(self, conn: sqlite3.Connection, state: _ConnState,
+                 pool: _LoopPool | None = None, path: str | None = None):
+        self._conn = conn
+        self._state = state
+        self._pool = pool
+        self._path = path
+
+    def _in_transaction_block(self) -> bool:
+        return self._state.tx_depth > 0 and self._conn is self._state.conn
+
+    def commit(self):
+        if not self._in_transaction_block():
+            self._conn.commit()
+
+    def close(self):
+        if self._in_transaction_block():
+            return
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            pool.release(self._conn, self._path)
+        elif self._conn.in_transaction:
+            self._conn.rollback()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def _read_your_writes(state: _ConnState):
+    """Off the event loop, anything this thread queued for the write-behind
+    writer lands before it touches the DB directly again. On the loop a
+    blocking flush would stall every coroutine, so async code awaits
+    aflush_writes() instead (graph nodes do at their boundaries)."""
+    if state.writes_pending:
+        flush_writes()
+
+
+def get_db_connection():
+    task = _current_task()
+    state = _state(task)
+    if task is None:
+        _read_your_writes(state)
+        return _ReusedConnection(_thread_connection(state), state)
+    if state.tx_depth:
+        return _ReusedConnection(state.conn, state)  # joins the open transaction
+    pool = _loop_pool()
+    conn, path = pool.acquire()
+    return _ReusedConnection(conn, state, pool, path)
+
+
+@contextmanager
+def transaction():
+    """Group several helper writes into one commit (nestable).
+
+        with transaction():
+            update_step(...)
+            append_log(...)
+
+    Commits when the outermost block exits, rolls back if it raises. Status
+    and log events from helpers inside the block are published only after the
+    commit (and dropped on rollback), so subscribers never see them early.
+
+    Never await inside the block: the open write transaction would hold
+    SQLite's write lock while other coroutines run. On an event loop this is
+    checked — a block that yielded to the loop is rolled back and raises.
+    """
+    task = _current_task()
+    state = _state(task)
+    pool = path = None
+    if task is None:
+        _read_your_writes(state)
+        conn = _thread_connection(state)
+    elif state.tx_depth == 0:
+        pool = _loop_pool()
+        conn, path = pool.acquire()
+        state.conn = conn
+    else:
+        conn = state.conn
+
+    yielded = []
+    probe = None
+    if pool is not None:
+        # Runs only if the loop gets control before the block exits
+        probe = asyncio.get_running_loop().call_soon(yielded.append, True)
+    state.tx_depth += 1
+    try:
+        yield _ReusedConnection(conn, state)
+        if yielded:
+            raise RuntimeError("await inside db.transaction() — the block must not yield to the event loop")
+    except BaseException:
+        state.tx_depth -= 1
+        if state.tx_depth == 0:
+            conn.rollback()
+            state.pending_events.clear()
+        raise
+    else:
+        state.tx_depth -= 1
+        if state.tx_depth == 0:
+            conn.commit()
+            events, state.pending_events = state.pending_events, []
+            for product_id, event in events:
+                event_bus.publish_product_event(product_id, event)
+    finally:
+        if pool is not None:
+            probe.cancel()
+            state.conn = None
+            pool.release(conn, path)
+
+
+# ─── Write-Behind Writer ──────────────────────────────────────────────────────
+# Optional (DB_WRITE_BEHIND=true). Status, log and cost writes from
+# update_step / append_log / save_cost_data are queued to one thread that owns
+# its own connection and commits them in grouped transactions every few ms,
+# instead of every caller taking SQLite's write lock for its own commit.
+#
+# Ordering: the queue is FIFO, and a thread that queued writes flushes them
+# before its next get_db_connection(), so direct reads/writes on that thread
+# still see them. On the event loop, where a blocking flush would stall every
+# coroutine, async code awaits aflush_writes() (which waits in a worker
+# thread) before a direct write that must land after its queued ones, and
+# graph nodes do so at node boundaries (see graph.py).
+# Writes inside a transaction() block bypass the queue to stay atomic.
+
+DB_WRITE_BEHIND = os.getenv("DB_WRITE_BEHIND", "false").lower() == "true"
+DB_WRITE_BEHIND_MS = float(os.getenv("DB_WRITE_BEHIND_MS", "5"))
+
+
+class _DbWriter:
+    """Single writer thread draining a queue of (sql, params) statements."""
+
+    def __init__(self, window_ms: float, max_batch: int = 500):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self.batches = 0
+        self.writes = 0
+        self.failed = 0
+
+    def submit(self, sql: str, params: tuple, read_your_writes: bool = True):
+        """Queue a statement. read_your_writes=False for writes the caller
+        never reads back (e.g. outbox events), so they don't make its next
+        get_db_connection() wait for a flush."""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush, 10)
+        self._queue.put((sql, params))
+        if read_your_writes:
+            _state().writes_pending = True
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Block until everything queued so far is committed. Returns False on timeout."""
+        if self._thread is None:
+            return True
+        barrier = threading.Event()
+        self._queue.put(barrier)
+        return barrier.wait(timeout)
+
+    def _run(self):
+        conn, path = None, None
+        while True:
+            batch, barriers = self._next_batch()
+            if batch:
+                if conn is None or path != DB_PATH:
+                    if conn is not None:
+                        conn.close()
+                    conn, path = _open_connection(), DB_PATH
+                self._apply(conn, batch)
+            for barrier in barriers:
+                barrier.set()
+
+    def _next_batch(self) -> tuple[list, list]:
+        """Wait for the first statement, then collect more until the window
+        closes, the batch is full, or a flush barrier asks to commit now."""
+        batch, barriers = [], []
+        item = self._queue.get()
+        deadline = time.monotonic() + self.window
+        while True:
+            if isinstance(item, threading.Event):
+                barriers.append(item)
+                break
+            batch.append(item)
+            remaining = deadline - time.monotonic()
+            if len(batch) >= self.max_batch or remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+        return batch, barriers
+
+    def _apply(self, conn: sqlite3.Connection, batch: list):
+        try:
+            with conn:
+                for sql, params in batch:
+                    conn.execute(sql, params)
+            self.batches += 1
+            self.writes += len(batch)
+            return
+        except sqlite3.Error as e:
+            logger.warning(f"Write-behind batch of {len(batch)} failed ({e}) — retrying one by one")
+        # One bad statement shouldn't drop the rest of the group
+        for sql, params in batch:
+            try:
+                with conn:
+                    conn.execute(sql, params)
+                self.writes += 1
+            except sqlite3.Error as e:
+                self.failed += 1
+                logger.error(f"Write-behind statement failed: {e} — {sql.split()[0]} {params[-1]!r}")
+        self.batches += 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": DB_WRITE_BEHIND,
+            "window_ms": self.window * 1000,
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "writes": self.writes,
+            "failed": self.failed,
+            "avg_batch": round(self.writes / self.batches, 1) if self.batches else 0,
+        }
+
+
+_writer = _DbWriter(DB_WRITE_BEHIND_MS)
+
+
+def _write(sql: str, params: tuple):
+    """Apply a status/log/cost write — queued when write-behind is on, else committed now."""
+    if DB_WRITE_BEHIND and not _state().tx_depth:
+        _writer.submit(sql, params)
+        return
+    conn = get_db_connection()
+    conn.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+
+def flush_writes(timeout: float | None = None) -> bool:
+    """Barrier: wait until all queued write-behind writes are committed.
+    Blocks the caller — from async code use aflush_writes()."""
+    _state().writes_pending = False
+    return _writer.flush(timeout)
+
+
+async def aflush_writes():
+    """flush_writes() for coroutines: waits for the barrier in a worker thread
+    so the event loop keeps running. No-op when write-behind is off."""
+    if not DB_WRITE_BEHIND:
+        return
+    state = _state()
+    await asyncio.to_thread(_writer.flush)
+    state.writes_pending = False
+
+
+def get_writer_stats() -> dict:
+    return _writer.stats()
+
+
+def close_thread_connection():
+    """Close this thread's connection and its idle pooled ones, e.g. before
+    deleting the DB file."""
+    state = getattr(_local, "state", None)
+    if state is not None and state.conn is not None:
+        state.conn.close()
+        state.conn = None
+    pool = getattr(_local, "pool", None)
+    if pool is not None:
+        pool.close()
+
 def init_db():
     conn = get_db_connection()
     c = conn.cursor()
@@ -21,6 +437,7 @@ def init_db():
         CREATE TABLE IF NOT EXISTS products (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             ean TEXT NOT NULL,
+            ean_normalized TEXT,
             product_name TEXT NOT NULL,
             brand TEXT,
             weight TEXT,
@@ -38,6 +455,9 @@ def init_db():
             updated_at TEXT DEFAULT CURRENT_TIMESTAMP
         )
     """)
+    # Listing filters page by id DESC within a status / brand / product type
+    for name, column in [("status", "status"), ("brand", "brand"), ("type", "product_type")]:
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_products_{name} ON products({column}, id)")
 
     # Brand COO cache — stores brand → country of origin lookups to avoid
     # redundant Tavily + Claude calls for repeat brands.
@@ -72,33 +492,385 @@ def init_db():
         CREATE INDEX IF NOT EXISTS idx_scraped_pages_product
         ON scraped_pages(product_id, source_type)
     """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_scraped_pages_url
+        ON scraped_pages(url)
+    """)
+
+    # Global page cache — one row per URL, shared by all products and kept
+    # across resets. scraped_pages rows reference it by URL + content hash
+    # instead of holding their own copy of the markdown; a row keeps its own
+    # copy only once the cached page is refreshed to a different version.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS page_cache (
+            url TEXT PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            markdown TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            fetched_at REAL NOT NULL,
+            hits INTEGER DEFAULT 0,
+            last_hit_at REAL
+        )
+    """)
+
+    # Search result cache — keyed by a hash of (provider, normalized query,
+    # include_domains, max_results), so re-runs and duplicate SKUs don't pay
+    # for the same Tavily/Firecrawl query twice.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS search_cache (
+            cache_key TEXT PRIMARY KEY,
+            provider TEXT NOT NULL,
+            query TEXT NOT NULL,
+            include_domains TEXT,
+            max_results INTEGER,
+            results TEXT NOT NULL,
+            fetched_at REAL NOT NULL,
+            hits INTEGER DEFAULT 0,
+            last_hit_at REAL
+        )
+    """)
+
+    # LLM response cache (opt-in) — validated Claude responses keyed by a hash
+    # of the full request, with the original usage for replay. LRU by size.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            cache_key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL,
+            hits INTEGER DEFAULT 0
+        )
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_llm_cache_lru
+        ON llm_cache(last_used_at)
+    """)
+
+    # Durable job queue — one row per enrichment run. Workers claim a job by
+    # taking a time-limited lease and keep it alive with heartbeats; expired
+    # leases (crashed/restarted workers) are swept back to 'queued'.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            worker_id TEXT,
+            lease_expires_at REAL,
+            heartbeat_at REAL,
+            last_error TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_jobs_status
+        ON jobs(status, id)
+    """)
+    # At most one queued/running job per product
+    c.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_product
+        ON jobs(product_id) WHERE status IN ('queued', 'running')
+    """)
+
+    # Event outbox — status/log events written by standalone worker processes,
+    # polled by the API process and re-published to SSE subscribers.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS event_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    """)
+
+    # Enrichment log — one row per entry, appended by append_log() instead of
+    # rewriting a growing JSON array on products.enrichment_log. The API
+    # re-assembles the array on read (see get_enrichment_logs).
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS enrichment_log_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            ts TEXT,
+            phase TEXT,
+            step TEXT,
+            status TEXT,
+            details TEXT,
+            cost REAL,
+            extra TEXT
+        )
+    """)
+    c.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_enrichment_log_product_seq
+        ON enrichment_log_entries(product_id, seq)
+    """)
 
     # Migration: add current_step column if it doesn't exist (for existing DBs)
     # Migrations for existing DBs
-    for col in ['current_step TEXT', 'cost_data TEXT']:
+    for col in ['current_step TEXT', 'cost_data TEXT', 'row_version INTEGER']:
         try:
             c.execute(f"ALTER TABLE products ADD COLUMN {col}")
         except sqlite3.OperationalError:
             pass  # Column already exists
+    try:
+        c.execute("ALTER TABLE scraped_pages ADD COLUMN content_hash TEXT")
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+    try:
+        c.execute("ALTER TABLE products ADD COLUMN ean_normalized TEXT")
+        c.executemany(
+            "UPDATE products SET ean_normalized = ? WHERE id = ?",
+            [(normalize_ean(r["ean"]), r["id"]) for r in c.execute("SELECT id, ean FROM products").fetchall()]
+        )
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+    _migrate_enrichment_logs(c)
+
+    # EAN dedup on upload — lookups by normalized EAN; optionally enforced
+    # unique (EAN_UNIQUE=true) once existing duplicates are cleaned up.
+    c.execute("CREATE INDEX IF NOT EXISTS idx_products_ean_normalized ON products(ean_normalized)")
+    if EAN_UNIQUE:
+        try:
+            c.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_products_ean_unique
+                ON products(ean_normalized) WHERE ean_normalized IS NOT NULL
+            """)
+        except sqlite3.IntegrityError:
+            logger.warning("EAN_UNIQUE is set but products already has duplicate EANs — unique index not created")
+    else:
+        c.execute("DROP INDEX IF EXISTS idx_products_ean_unique")
+
+    # Change feed — every insert/update stamps the row with the next value of
+    # a one-row counter (change_seq), and every delete leaves a tombstone
+    # stamped the same way, so /api/products/changes can return rows and
+    # deletions past a cursor.
+    c.execute("UPDATE products SET row_version = id WHERE row_version IS NULL")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_products_row_version ON products(row_version)")
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS product_tombstones (
+            product_id INTEGER PRIMARY KEY,
+            row_version INTEGER NOT NULL
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_product_tombstones_row_version ON product_tombstones(row_version)")
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS change_seq (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            value INTEGER NOT NULL
+        )
+    """)
+    c.execute("INSERT OR IGNORE INTO change_seq (id, value) VALUES (1, 0)")
+    c.execute("""
+        UPDATE change_seq SET value = MAX(
+            value,
+            (SELECT COALESCE(MAX(row_version), 0) FROM products),
+            (SELECT COALESCE(MAX(row_version), 0) FROM product_tombstones)
+        )
+    """)
+    # Earlier versions stamped MAX(row_version) + 1 — replace those triggers
+    for event, guard, tombstone in [
+        ("INSERT", "", "DELETE FROM product_tombstones WHERE product_id = NEW.id;"),
+        ("UPDATE", "WHEN NEW.row_version IS OLD.row_version", ""),
+    ]:
+        c.execute(f"DROP TRIGGER IF EXISTS trg_products_row_version_{event.lower()}")
+        c.execute(f"""
+            CREATE TRIGGER trg_products_row_version_{event.lower()}
+            AFTER {event} ON products {guard}
+            BEGIN
+                UPDATE change_seq SET value = value + 1 WHERE id = 1;
+                UPDATE products SET row_version = (SELECT value FROM change_seq WHERE id = 1)
+                WHERE id = NEW.id;
+                {tombstone}
+            END
+        """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_products_row_version_delete
+        AFTER DELETE ON products
+        BEGIN
+            UPDATE change_seq SET value = value + 1 WHERE id = 1;
+            INSERT INTO product_tombstones (product_id, row_version)
+            VALUES (OLD.id, (SELECT value FROM change_seq WHERE id = 1))
+            ON CONFLICT(product_id) DO UPDATE SET row_version = excluded.row_version;
+        END
+    """)
+
+    # Status counters — kept in step with products by triggers, so dashboard
+    # stats read a handful of rows instead of counting the whole catalog.
+    # Rebuilt from the status index on startup in case they ever drift.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS product_status_counts (
+            status TEXT PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_products_status_count_insert
+        AFTER INSERT ON products
+        BEGIN
+            INSERT INTO product_status_counts (status, count) VALUES (COALESCE(NEW.status, ''), 1)
+            ON CONFLICT(status) DO UPDATE SET count = count + 1;
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_products_status_count_update
+        AFTER UPDATE OF status ON products WHEN OLD.status IS NOT NEW.status
+        BEGIN
+            UPDATE product_status_counts SET count = count - 1 WHERE status = COALESCE(OLD.status, '');
+            INSERT INTO product_status_counts (status, count) VALUES (COALESCE(NEW.status, ''), 1)
+            ON CONFLICT(status) DO UPDATE SET count = count + 1;
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_products_status_count_delete
+        AFTER DELETE ON products
+        BEGIN
+            UPDATE product_status_counts SET count = count - 1 WHERE status = COALESCE(OLD.status, '');
+        END
+    """)
+    # Cost rollups — spend per day / service / phase, added to when a run
+    # saves its costs. service = phase = '*' holds the per-run totals.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS cost_rollups (
+            day TEXT NOT NULL,
+            service TEXT NOT NULL,
+            phase TEXT NOT NULL,
+            cost REAL NOT NULL DEFAULT 0,
+            input_tokens INTEGER NOT NULL DEFAULT 0,
+            output_tokens INTEGER NOT NULL DEFAULT 0,
+            credits INTEGER NOT NULL DEFAULT 0,
+            products INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, service, phase)
+        )
+    """)
+    _backfill_cost_rollups(c)
+
+    # Products processed per day — one row per (day, product), so a product
+    # that is re-run (or fails and is retried) the same day counts once. The
+    # day's count is kept in cost_rollups under service '*', phase 'processed'.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS processed_products (
+            day TEXT NOT NULL,
+            product_id INTEGER NOT NULL,
+            PRIMARY KEY (day, product_id)
+        ) WITHOUT ROWID
+    """)
+    _backfill_processed_products(c)
+
+    c.execute("DELETE FROM product_status_counts")
+    c.execute("""
+        INSERT INTO product_status_counts (status, count)
+        SELECT COALESCE(status, ''), COUNT(*) FROM products GROUP BY COALESCE(status, '')
+    """)
 
     conn.commit()
     conn.close()
 
 
+def normalize_ean(ean) -> str | None:
+    """Canonical EAN/GTIN for dedup: spaces/dashes removed, leading zeros dropped
+    (so a UPC-A and its zero-padded EAN-13 match). None for anything that
+    isn't a barcode number ('UNKNOWN', internal SKUs) — those are never deduped."""
+    if ean is None:
+        return None
+    text = str(ean).strip()
+    if text.endswith(".0"):
+        text = text[:-2]  # numeric cell read as float
+    text = text.replace(" ", "").replace("-", "")
+    if not text.isdigit():
+        return None
+    return text.lstrip("0") or None
+
+
+def _backfill_cost_rollups(c):
+    """Seed an empty cost_rollups table from the cost_data already stored on products."""
+    if c.execute("SELECT 1 FROM cost_rollups LIMIT 1").fetchone():
+        return
+    from utils.cost_tracker import cost_rollup_rows
+    for row in c.execute("SELECT cost_data, updated_at FROM products WHERE cost_data IS NOT NULL").fetchall():
+        try:
+            summary = json.loads(row["cost_data"])
+        except (TypeError, ValueError):
+            continue
+        if summary.get("completed_at"):
+            try:
+                day = rollup_day(datetime.fromisoformat(summary["completed_at"]))
+            except ValueError:
+                continue
+        else:
+            day = (row["updated_at"] or "")[:10]
+        _upsert_cost_rollups(c, day, cost_rollup_rows(summary))
+
+
+def _backfill_processed_products(c):
+    """Seed an empty processed_products table from products already in a
+    terminal status (updated_at is UTC, like the rollup days)."""
+    if c.execute("SELECT 1 FROM processed_products LIMIT 1").fetchone():
+        return
+    c.execute("""
+        INSERT OR IGNORE INTO processed_products (day, product_id)
+        SELECT date(updated_at), id FROM products
+        WHERE status IN ('done', 'needs_review', 'error') AND updated_at IS NOT NULL
+    """)
+    c.execute("""
+        INSERT INTO cost_rollups (day, service, phase, products)
+        SELECT day, '*', 'processed', COUNT(*) FROM processed_products WHERE 1 GROUP BY day
+        ON CONFLICT(day, service, phase) DO UPDATE SET products = excluded.products
+    """)
+
+
+def _upsert_cost_rollups(conn, day: str, rows: list[dict]):
+    conn.executemany(
+        """INSERT INTO cost_rollups (day, service, phase, cost, input_tokens, output_tokens, credits, products)
+           VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+           ON CONFLICT(day, service, phase) DO UPDATE SET
+               cost = cost + excluded.cost,
+               input_tokens = input_tokens + excluded.input_tokens,
+               output_tokens = output_tokens + excluded.output_tokens,
+               credits = credits + excluded.credits,
+               products = products + 1""",
+        [(day, r["service"], r["phase"], r["cost"], r["input_tokens"], r["output_tokens"], r["credits"])
+         for r in rows]
+    )
+
+
+def _migrate_enrichment_logs(c):
+    """Move legacy products.enrichment_log JSON arrays into enrichment_log_entries."""
+    rows = c.execute("SELECT id, enrichment_log FROM products WHERE enrichment_log IS NOT NULL").fetchall()
+    for row in rows:
+        try:
+            entries = json.loads(row["enrichment_log"]) or []
+        except (TypeError, ValueError):
+            entries = []
+        c.executemany(
+            """INSERT INTO enrichment_log_entries
+               (product_id, seq, ts, phase, step, status, details, cost, extra)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            [(row["id"], seq, *_log_entry_columns(entry)) for seq, entry in enumerate(entries, start=1)
+             if isinstance(entry, dict)]
+        )
+        c.execute("UPDATE products SET enrichment_log = NULL WHERE id = ?", (row["id"],))
+
+
 def _publish_event(product_id: int, event: dict):
-    """Publish an SSE event. Thread-safe — event bus handles cross-thread delivery."""
+    """Publish an SSE event. Thread-safe — event bus handles cross-thread delivery.
+    Inside a transaction() block it is held back until the block commits."""
+    state = _state()
+    if state.tx_depth:
+        state.pending_events.append((product_id, event))
+        return
     event_bus.publish_product_event(product_id, event)
 
 
 def update_step(product_id: int, status: str, step: str):
     """Update the current processing step for a product (real-time UI feedback)."""
-    conn = get_db_connection()
-    conn.execute(
+    _write(
         "UPDATE products SET status = ?, current_step = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
         (status, step, product_id)
     )
-    conn.commit()
-    conn.close()
 
     _publish_event(product_id, {
         "type": "status",
@@ -107,15 +879,48 @@ def update_step(product_id: int, status: str, step: str):
     })
 
 
+# ─── Enrichment Log ───────────────────────────────────────────────────────────
+
+_LOG_COLUMNS = ("timestamp", "phase", "step", "status", "details", "cost_usd")
+
+
+def _log_entry_columns(entry: dict) -> tuple:
+    """Split a log entry dict into (ts, phase, step, status, details, cost, extra).
+    Keys without a column of their own (credits_used, ...) go into extra as JSON."""
+    details = entry.get("details")
+    if details is not None and not isinstance(details, str):
+        details = json.dumps(details)
+    extra = {k: v for k, v in entry.items() if k not in _LOG_COLUMNS}
+    return (
+        entry.get("timestamp"), entry.get("phase"), entry.get("step"), entry.get("status"),
+        details, entry.get("cost_usd"), json.dumps(extra) if extra else None,
+    )
+
+
+def _log_entry_from_row(row) -> dict:
+    entry = {
+        "timestamp": row["ts"],
+        "phase": row["phase"],
+        "step": row["step"],
+        "status": row["status"],
+        "details": row["details"],
+    }
+    if row["cost"] is not None:
+        entry["cost_usd"] = row["cost"]
+    if row["extra"]:
+        entry.update(json.loads(row["extra"]))
+    return entry
+
+
 def append_log(product_id: int, entry: dict):
-    """Append a log entry to the product's enrichment_log."""
-    conn = get_db_connection()
-    product = conn.execute("SELECT enrichment_log FROM products WHERE id = ?", (product_id,)).fetchone()
-    existing = json.loads(product['enrichment_log']) if product and product['enrichment_log'] else []
-    existing.append(entry)
-    conn.execute("UPDATE products SET enrichment_log = ? WHERE id = ?", (json.dumps(existing), product_id))
-    conn.commit()
-    conn.close()
+    """Append a log entry to the product's enrichment log (single-row insert)."""
+    _write(
+        """INSERT INTO enrichment_log_entries
+           (product_id, seq, ts, phase, step, status, details, cost, extra)
+           SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ?, ?, ?, ?, ?
+           FROM enrichment_log_entries WHERE product_id = ?""",
+        (product_id, *_log_entry_columns(entry), product_id)
+    )
 
     _publish_event(product_id, {
         "type": "log",
@@ -123,40 +928,162 @@ def append_log(product_id: int, entry: dict):
     })
 
 
+def get_enrichment_logs(product_ids: list[int]) -> dict[int, list[dict]]:
+    """Log entries for each product, in append order. Products without entries are omitted."""
+    logs: dict[int, list[dict]] = {}
+    if not product_ids:
+        return logs
+    conn = get_db_connection()
+    # Chunked to stay under SQLite's bound-parameter limit
+    for i in range(0, len(product_ids), 500):
+        chunk = product_ids[i:i + 500]
+        rows = conn.execute(
+            f"""SELECT product_id, ts, phase, step, status, details, cost, extra
+                FROM enrichment_log_entries
+                WHERE product_id IN ({",".join("?" * len(chunk))})
+                ORDER BY product_id, seq""",
+            chunk
+        ).fetchall()
+        for row in rows:
+            logs.setdefault(row["product_id"], []).append(_log_entry_from_row(row))
+    conn.close()
+    return logs
+
+
+def get_enrichment_log(product_id: int) -> list[dict]:
+    """Log entries for one product, in append order."""
+    return get_enrichment_logs([product_id]).get(product_id, [])
+
+
+def attach_enrichment_logs(products: list[dict]) -> list[dict]:
+    """Fill each product dict's enrichment_log with its entries as a JSON string
+    (None when empty) — the shape the API has always returned."""
+    logs = get_enrichment_logs([p["id"] for p in products])
+    for p in products:
+        entries = logs.get(p["id"])
+        p["enrichment_log"] = json.dumps(entries) if entries else None
+    return products
+
+
 def save_cost_data(product_id: int, cost_summary: dict):
     """Persist the cost tracking summary for a product."""
-    conn = get_db_connection()
-    conn.execute(
+    _write(
         "UPDATE products SET cost_data = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
         (json.dumps(cost_summary), product_id)
     )
+
+
+# ─── Cost Rollups ─────────────────────────────────────────────────────────────
+
+def rollup_day(at: datetime | None = None) -> str:
+    """UTC date (YYYY-MM-DD) that rollups and processed counts are keyed by —
+    the same clock as the CURRENT_TIMESTAMP columns. Naive `at` is local time."""
+    return (at or datetime.now(timezone.utc)).astimezone(timezone.utc).date().isoformat()
+
+
+def add_cost_rollups(day: str, rows: list[dict]):
+    """Add one run's spend (see cost_tracker.cost_rollup_rows) to the day's rollups."""
+    conn = get_db_connection()
+    _upsert_cost_rollups(conn, day, rows)
+    conn.commit()
+    conn.close()
+
+
+def mark_processed(day: str, product_id: int):
+    """Count product_id as processed on day, once however many runs it had.
+    Called in the same transaction as the run's cost save / error status."""
+    conn = get_db_connection()
+    inserted = conn.execute(
+        "INSERT OR IGNORE INTO processed_products (day, product_id) VALUES (?, ?)",
+        (day, product_id)
+    ).rowcount
+    if inserted:
+        conn.execute(
+            """INSERT INTO cost_rollups (day, service, phase, products) VALUES (?, '*', 'processed', 1)
+               ON CONFLICT(day, service, phase) DO UPDATE SET products = products + 1""",
+            (day,)
+        )
     conn.commit()
     conn.close()
 
 
+def get_cost_rollups(day: str) -> list[dict]:
+    """All rollup rows for one day, including the '*' totals and processed rows."""
+    conn = get_db_connection()
+    rows = conn.execute(
+        "SELECT service, phase, cost, input_tokens, output_tokens, credits, products FROM cost_rollups WHERE day = ?",
+        (day,)
+    ).fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+def get_cost_rollup_totals() -> dict:
+    """All-time spend and run count, summed over the daily '*' totals rows."""
+    conn = get_db_connection()
+    row = conn.execute(
+        """SELECT COALESCE(SUM(cost), 0) AS cost, COALESCE(SUM(products), 0) AS products
+           FROM cost_rollups WHERE service = '*' AND phase = '*'"""
+    ).fetchone()
+    conn.close()
+    return dict(row)
+
+
+# ─── Scraped Pages ────────────────────────────────────────────────────────────
+
+def hash_content(markdown: str) -> str:
+    """Content hash used to identify a cached page version."""
+    return hashlib.sha256(markdown.encode("utf-8")).hexdigest()
+
+
 def save_scraped_page(product_id: int, url: str, source_type: str, markdown: str | None, success: bool = True):
-    """Cache a scraped page's markdown for potential gap-fill use."""
+    """Record that a product used a scraped page (for gap fill / description lookup).
+    The markdown itself lives in page_cache; this row only references it, unless
+    the cache already holds a different version of the URL."""
+    content_hash = hash_content(markdown) if markdown else None
+    own_copy = None
     conn = get_db_connection()
+    if markdown:
+        # Normally already written by fetch_page(); this covers direct callers
+        conn.execute("""
+            INSERT INTO page_cache (url, content_hash, markdown, size_bytes, fetched_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO NOTHING
+        """, (url, content_hash, markdown, len(markdown.encode("utf-8")), time.time()))
+        cached = conn.execute("SELECT content_hash FROM page_cache WHERE url = ?", (url,)).fetchone()
+        if cached["content_hash"] != content_hash:
+            own_copy = markdown  # refreshed since this product fetched it
     conn.execute("""
         INSERT OR REPLACE INTO scraped_pages
-        (product_id, url, source_type, markdown, markdown_length, scrape_success, scraped_at)
-        VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-    """, (product_id, url, source_type, markdown, len(markdown) if markdown else 0, 1 if success else 0))
+        (product_id, url, source_type, markdown, markdown_length, scrape_success, content_hash, scraped_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    """, (product_id, url, source_type, own_copy, len(markdown) if markdown else 0, 1 if success else 0, content_hash))
     conn.commit()
     conn.close()
 
 
 def get_scraped_pages(product_id: int, source_type: str | None = None, only_unextracted: bool = False) -> list[dict]:
-    """Retrieve cached scraped pages for a product."""
+    """Retrieve cached scraped pages for a product, with the markdown of the
+    version the product actually used. markdown is None if that version is no
+    longer stored — callers treat the page as needing a re-scrape."""
     conn = get_db_connection()
-    query = "SELECT * FROM scraped_pages WHERE product_id = ? AND scrape_success = 1"
+    # Rows written before page_cache existed, and rows whose page has since
+    # been refreshed, carry their own markdown
+    query = """
+        SELECT sp.id, sp.product_id, sp.url, sp.source_type, sp.markdown_length,
+               sp.scrape_success, sp.extracted, sp.gap_filled, sp.scraped_at, sp.content_hash,
+               COALESCE(pc.markdown, sp.markdown) AS markdown
+        FROM scraped_pages sp
+        LEFT JOIN page_cache pc ON pc.url = sp.url AND pc.content_hash = sp.content_hash
+        WHERE sp.product_id = ? AND sp.scrape_success = 1
+    """
     params: list = [product_id]
     if source_type:
-        query += " AND source_type = ?"
+        query += " AND sp.source_type = ?"
         params.append(source_type)
     if only_unextracted:
-        query += " AND extracted = 0 AND gap_filled = 0"
-    query += " ORDER BY id ASC"
+        query += " AND sp.extracted = 0 AND sp.gap_filled = 0"
+    query += " ORDER BY sp.id ASC"
     rows = conn.execute(query, params).fetchall()
     conn.close()
     return [dict(r) for r in rows]
@@ -192,6 +1119,564 @@ def delete_scraped_pages(product_id: int):
     conn.close()
 
 
+# ─── Product Listing ──────────────────────────────────────────────────────────
+
+PRODUCT_COLUMNS = (
+    "id", "ean", "product_name", "brand", "weight", "original_data", "status",
+    "product_type", "current_step", "classification_result", "search_result",
+    "extraction_result", "validation_result", "enrichment_log", "cost_data",
+    "created_at", "updated_at", "row_version",
+)
+# Table view — no JSON blobs
+PRODUCT_SUMMARY_FIELDS = (
+    "id", "ean", "product_name", "brand", "weight", "status", "product_type",
+    "current_step", "created_at", "updated_at", "row_version",
+)
+
+
+def list_products(fields: list[str] | None = None, statuses: list[str] | None = None,
+                  brand: str | None = None, product_type: str | None = None,
+                  before_id: int | None = None, limit: int | None = None) -> tuple[list[dict], int | None]:
+    """
+    Products newest first, keyset-paginated on id.
+
+    fields projects the selected columns (id is always included); enrichment_log
+    is assembled from enrichment_log_entries only when asked for. Returns
+    (rows, next_cursor) — pass next_cursor back as before_id for the next page,
+    None when this was the last one.
+    """
+    columns = [c for c in (fields or PRODUCT_COLUMNS) if c != "enrichment_log"]
+    if "id" not in columns:
+        columns.insert(0, "id")
+
+    where, params = [], []
+    if statuses:
+        where.append(f"status IN ({','.join('?' * len(statuses))})")
+        params.extend(statuses)
+    if brand is not None:
+        where.append("brand = ?")
+        params.append(brand)
+    if product_type is not None:
+        where.append("product_type = ?")
+        params.append(product_type)
+    if before_id is not None:
+        where.append("id < ?")
+        params.append(before_id)
+
+    sql = f"SELECT {', '.join(columns)} FROM products"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id DESC"
+    if limit is not None:
+        # One extra row tells us whether there is a next page
+        sql += " LIMIT ?"
+        params.append(limit + 1)
+
+    conn = get_db_connection()
+    rows = [dict(r) for r in conn.execute(sql, params).fetchall()]
+    conn.close()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1]["id"]
+    if fields is None or "enrichment_log" in fields:
+        attach_enrichment_logs(rows)
+    return rows, next_cursor
+
+
+def list_product_changes(since: int, fields: list[str] | None = None,
+                         limit: int = 500) -> tuple[list[dict], list[int], int, bool]:
+    """
+    Products inserted, updated or deleted after `since`, oldest change first.
+    Returns (rows, deleted_ids, next_cursor, has_more); together rows and
+    deleted_ids hold at most `limit` changes. next_cursor is the last
+    change's row_version, or `since` unchanged when nothing moved.
+    """
+    columns = [c for c in (fields or PRODUCT_COLUMNS) if c != "enrichment_log"]
+    for required in ("row_version", "id"):
+        if required not in columns:
+            columns.insert(0, required)
+
+    conn = get_db_connection()
+    rows = [dict(r) for r in conn.execute(
+        f"SELECT {', '.join(columns)} FROM products WHERE row_version > ? ORDER BY row_version LIMIT ?",
+        (since, limit + 1)
+    ).fetchall()]
+    tombstones = conn.execute(
+        "SELECT product_id, row_version FROM product_tombstones WHERE row_version > ? ORDER BY row_version LIMIT ?",
+        (since, limit + 1)
+    ).fetchall()
+    conn.close()
+
+    # Merge both streams in change order and keep the first `limit` changes
+    changes = sorted(
+        [(r["row_version"], r) for r in rows] + [(t["row_version"], t["product_id"]) for t in tombstones],
+        key=lambda change: change[0]
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    rows = [change for _, change in changes if isinstance(change, dict)]
+    deleted = [change for _, change in changes if not isinstance(change, dict)]
+    if fields is None or "enrichment_log" in fields:
+        attach_enrichment_logs(rows)
+    return rows, deleted, (changes[-1][0] if changes else since), has_more
+
+
+def get_status_counts() -> dict[str, int]:
+    """Product count per status, from the trigger-maintained counter table."""
+    conn = get_db_connection()
+    rows = conn.execute("SELECT status, count FROM product_status_counts WHERE count > 0").fetchall()
+    conn.close()
+    return {row["status"]: row["count"] for row in rows}
+
+
+# ─── Page Cache ───────────────────────────────────────────────────────────────
+# The page, search and LLM response cache functions below are blocking sqlite
+# calls. Their async callers (fetch_page, cached_search, aclassify_with_schema)
+# run them with asyncio.to_thread, so a cache lookup never stalls the pipeline
+# loop.
+
+def get_cached_page(url: str, max_age_seconds: float) -> str | None:
+    """Return cached markdown for a URL if it is younger than max_age_seconds."""
+    conn = get_db_connection()
+    row = conn.execute(
+        "SELECT markdown FROM page_cache WHERE url = ? AND fetched_at >= ?",
+        (url, time.time() - max_age_seconds)
+    ).fetchone()
+    if row:
+        conn.execute(
+            "UPDATE page_cache SET hits = hits + 1, last_hit_at = ? WHERE url = ?",
+            (time.time(), url)
+        )
+        conn.commit()
+    conn.close()
+    return row['markdown'] if row else None
+
+
+def save_cached_page(url: str, markdown: str, max_total_bytes: int = 0):
+    """Store (or refresh) a URL's markdown in the global page cache. Products
+    still referencing the version being replaced get their own copy of it.
+    With max_total_bytes set, least recently used unreferenced pages are
+    evicted above that size."""
+    content_hash = hash_content(markdown)
+    conn = get_db_connection()
+    conn.execute("""
+        UPDATE scraped_pages
+        SET markdown = (SELECT markdown FROM page_cache WHERE url = ?)
+        WHERE url = ? AND markdown IS NULL
+          AND content_hash = (SELECT content_hash FROM page_cache WHERE url = ? AND content_hash != ?)
+    """, (url, url, url, content_hash))
+    conn.execute("""
+        INSERT INTO page_cache (url, content_hash, markdown, size_bytes, fetched_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET
+            content_hash = excluded.content_hash, markdown = excluded.markdown,
+            size_bytes = excluded.size_bytes, fetched_at = excluded.fetched_at
+    """, (url, content_hash, markdown, len(markdown.encode("utf-8")), time.time()))
+    if max_total_bytes:
+        _evict_page_cache(conn, max_total_bytes)
+    conn.commit()
+    conn.close()
+
+
+def _evict_page_cache(conn, max_total_bytes: int) -> int:
+    """Delete the least recently used pages no product references until the
+    cache fits in max_total_bytes (referenced pages still count towards it)."""
+    total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) AS total FROM page_cache").fetchone()['total']
+    if total <= max_total_bytes:
+        return 0
+    referenced = conn.execute("""
+        SELECT COALESCE(SUM(size_bytes), 0) AS total FROM page_cache
+        WHERE EXISTS (SELECT 1 FROM scraped_pages sp WHERE sp.url = page_cache.url)
+    """).fetchone()['total']
+    # Keep the most recently used unreferenced pages that fit in what's left
+    return conn.execute("""
+        DELETE FROM page_cache WHERE url IN (
+            SELECT url FROM (
+                SELECT url, SUM(size_bytes) OVER (
+                    ORDER BY COALESCE(last_hit_at, fetched_at) DESC, url
+                ) AS running
+                FROM page_cache
+                WHERE NOT EXISTS (SELECT 1 FROM scraped_pages sp WHERE sp.url = page_cache.url)
+            ) WHERE running > ?
+        )
+    """, (max_total_bytes - referenced,)).rowcount
+
+
+def prune_page_cache(max_age_seconds: float, max_total_bytes: int = 0) -> int:
+    """Delete expired cache entries that no product still references, then (with
+    max_total_bytes set) evict down to that size. Returns rows deleted."""
+    conn = get_db_connection()
+    deleted = conn.execute("""
+        DELETE FROM page_cache
+        WHERE fetched_at < ?
+          AND NOT EXISTS (SELECT 1 FROM scraped_pages sp WHERE sp.url = page_cache.url)
+    """, (time.time() - max_age_seconds,)).rowcount
+    if max_total_bytes:
+        deleted += _evict_page_cache(conn, max_total_bytes)
+    conn.commit()
+    conn.close()
+    return deleted
+
+
+def get_page_cache_stats() -> dict:
+    """Entry count, stored size and hit totals for the dashboard."""
+    conn = get_db_connection()
+    row = conn.execute("""
+        SELECT COUNT(*) AS entries, COALESCE(SUM(size_bytes), 0) AS size_bytes,
+               COALESCE(SUM(hits), 0) AS hits
+        FROM page_cache
+    """).fetchone()
+    conn.close()
+    return {
+        "entries": row['entries'],
+        "size_mb": round(row['size_bytes'] / 1_048_576, 2),
+        "hits": row['hits'],
+    }
+
+
+# ─── Search Cache ─────────────────────────────────────────────────────────────
+
+def get_cached_search(cache_key: str, max_age_seconds: float) -> list[dict] | None:
+    """Return cached search results if younger than max_age_seconds."""
+    conn = get_db_connection()
+    row = conn.execute(
+        "SELECT results FROM search_cache WHERE cache_key = ? AND fetched_at >= ?",
+        (cache_key, time.time() - max_age_seconds)
+    ).fetchone()
+    if row:
+        conn.execute(
+            "UPDATE search_cache SET hits = hits + 1, last_hit_at = ? WHERE cache_key = ?",
+            (time.time(), cache_key)
+        )
+        conn.commit()
+    conn.close()
+    return json.loads(row['results']) if row else None
+
+
+def save_cached_search(cache_key: str, provider: str, query: str, include_domains: list[str] | None,
+                       max_results: int, results: list[dict]):
+    """Store (or refresh) a search result list."""
+    conn = get_db_connection()
+    conn.execute("""
+        INSERT INTO search_cache (cache_key, provider, query, include_domains, max_results, results, fetched_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(cache_key) DO UPDATE SET
+            results = excluded.results, fetched_at = excluded.fetched_at
+    """, (cache_key, provider, query, json.dumps(include_domains) if include_domains else None,
+          max_results, json.dumps(results), time.time()))
+    conn.commit()
+    conn.close()
+
+
+def prune_search_cache(max_age_seconds: float) -> int:
+    """Delete expired search cache entries. Returns rows deleted."""
+    conn = get_db_connection()
+    cur = conn.execute("DELETE FROM search_cache WHERE fetched_at < ?", (time.time() - max_age_seconds,))
+    conn.commit()
+    conn.close()
+    return cur.rowcount
+
+
+def get_search_cache_stats() -> dict:
+    """Entry count and stored hit totals per provider."""
+    conn = get_db_connection()
+    rows = conn.execute("""
+        SELECT provider, COUNT(*) AS entries, COALESCE(SUM(hits), 0) AS hits
+        FROM search_cache GROUP BY provider
+    """).fetchall()
+    conn.close()
+    return {r['provider']: {"entries": r['entries'], "hits": r['hits']} for r in rows}
+
+
+# ─── LLM Response Cache ───────────────────────────────────────────────────────
+
+def get_cached_llm_response(cache_key: str) -> dict | None:
+    """Return a cached response payload and bump its LRU timestamp."""
+    conn = get_db_connection()
+    row = conn.execute("SELECT payload FROM llm_cache WHERE cache_key = ?", (cache_key,)).fetchone()
+    if row:
+        conn.execute(
+            "UPDATE llm_cache SET hits = hits + 1, last_used_at = ? WHERE cache_key = ?",
+            (time.time(), cache_key)
+        )
+        conn.commit()
+    conn.close()
+    return json.loads(row['payload']) if row else None
+
+
+def save_cached_llm_response(cache_key: str, model: str, payload: dict, max_total_bytes: int):
+    """Store a response payload, then evict least-recently-used entries above max_total_bytes."""
+    data = json.dumps(payload)
+    now = time.time()
+    conn = get_db_connection()
+    conn.execute("""
+        INSERT OR REPLACE INTO llm_cache (cache_key, model, payload, size_bytes, created_at, last_used_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (cache_key, model, data, len(data.encode("utf-8")), now, now))
+    total = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) AS total FROM llm_cache").fetchone()['total']
+    if total > max_total_bytes:
+        # Keep the most recently used entries that fit in the budget
+        conn.execute("""
+            DELETE FROM llm_cache WHERE cache_key IN (
+                SELECT cache_key FROM (
+                    SELECT cache_key, SUM(size_bytes) OVER (ORDER BY last_used_at DESC, cache_key) AS running
+                    FROM llm_cache
+                ) WHERE running > ?
+            )
+        """, (max_total_bytes,))
+    conn.commit()
+    conn.close()
+
+
+def get_llm_cache_stats() -> dict:
+    """Entry count, stored size and hit totals for the dashboard."""
+    conn = get_db_connection()
+    row = conn.execute("""
+        SELECT COUNT(*) AS entries, COALESCE(SUM(size_bytes), 0) AS size_bytes,
+               COALESCE(SUM(hits), 0) AS hits
+        FROM llm_cache
+    """).fetchone()
+    conn.close()
+    return {
+        "entries": row['entries'],
+        "size_mb": round(row['size_bytes'] / 1_048_576, 2),
+        "hits": row['hits'],
+    }
+
+
+# ─── Job Queue ────────────────────────────────────────────────────────────────
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# (job_id, worker_id) of the job the current run belongs to. Set by the
+# scheduler inside the run's task, so every node and to_thread() call of that
+# run inherits it; unset for single-phase endpoint runs.
+_job_lease: ContextVar[tuple[int, str] | None] = ContextVar("job_lease", default=None)
+
+
+class LeaseLost(Exception):
+    """The run's job lease expired and was handed to another worker."""
+
+
+def set_job_lease(job_id: int, worker_id: str):
+    """Bind the current run (this task and what it spawns) to a claimed job."""
+    _job_lease.set((job_id, worker_id))
+
+
+def require_job_lease(conn):
+    """Guard for a run's terminal product writes: call inside the transaction()
+    block that makes them. Touches the job row — taking the write lock, so the
+    sweeper can't requeue it before the block commits — and raises LeaseLost
+    (rolling the block back) if this worker no longer holds the lease.
+    No-op outside a job run."""
+    lease = _job_lease.get()
+    if lease is None:
+        return
+    cur = conn.execute(
+        "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND worker_id = ? AND status = 'running'",
+        (time.time(), *lease)
+    )
+    if not cur.rowcount:
+        raise LeaseLost(f"Lost lease on job {lease[0]}")
+
+
+def enqueue_jobs(product_ids: list[int]) -> list[int]:
+    """Queue enrichment jobs. Products that already have a queued or running
+    job are skipped. Returns the product IDs that were newly queued."""
+    conn = get_db_connection()
+    queued = []
+    for pid in product_ids:
+        cur = conn.execute("""
+            INSERT OR IGNORE INTO jobs (product_id, max_attempts) VALUES (?, ?)
+        """, (pid, JOB_MAX_ATTEMPTS))
+        if cur.rowcount:
+            queued.append(pid)
+    conn.commit()
+    conn.close()
+    return queued
+
+
+def claim_next_job(worker_id: str, lease_seconds: float) -> dict | None:
+    """Atomically claim the oldest queued job for this worker.
+    Single UPDATE ... RETURNING, so two workers can never claim the same row."""
+    now = time.time()
+    conn = get_db_connection()
+    row = conn.execute("""
+        UPDATE jobs
+        SET status = 'running', worker_id = ?, attempts = attempts + 1,
+            lease_expires_at = ?, heartbeat_at = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+        RETURNING id, product_id, attempts, max_attempts
+    """, (worker_id, now + lease_seconds, now)).fetchone()
+    conn.commit()
+    conn.close()
+    return dict(row) if row else None
+
+
+def heartbeat_job(job_id: int, worker_id: str, lease_seconds: float) -> bool:
+    """Extend a running job's lease. Returns False if the lease was lost."""
+    now = time.time()
+    conn = get_db_connection()
+    cur = conn.execute("""
+        UPDATE jobs SET lease_expires_at = ?, heartbeat_at = ?
+        WHERE id = ? AND worker_id = ? AND status = 'running'
+    """, (now + lease_seconds, now, job_id, worker_id))
+    conn.commit()
+    conn.close()
+    return cur.rowcount > 0
+
+
+def finish_job(job_id: int, worker_id: str, success: bool, error: str | None = None) -> str | None:
+    """
+    Close out a claimed job: 'done' on success; on failure back to 'queued'
+    while attempts remain (the product goes back to 'enriching'), else
+    'failed'. Returns the job's new status, or None if the lease was lost.
+    """
+    conn = get_db_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    row = conn.execute("""
+        UPDATE jobs
+        SET status = CASE WHEN ? THEN 'done' WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+            worker_id = CASE WHEN ? OR attempts >= max_attempts THEN worker_id END,
+            last_error = ?, lease_expires_at = NULL, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND worker_id = ? AND status = 'running'
+        RETURNING product_id, status
+    """, (success, success, error, job_id, worker_id)).fetchone()
+    if row and row['status'] == 'queued':
+        conn.execute(
+            "UPDATE products SET status = 'enriching', current_step = 'Queued for retry...', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (row['product_id'],)
+        )
+    conn.commit()
+    conn.close()
+    return row['status'] if row else None
+
+
+def release_job(job_id: int, worker_id: str):
+    """Hand a claimed job back to the queue without running it (the claim
+    doesn't count as an attempt)."""
+    conn = get_db_connection()
+    conn.execute("""
+        UPDATE jobs
+        SET status = 'queued', worker_id = NULL, attempts = attempts - 1,
+            lease_expires_at = NULL, updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND worker_id = ? AND status = 'running'
+    """, (job_id, worker_id))
+    conn.commit()
+    conn.close()
+
+
+def requeue_expired_jobs() -> tuple[list[int], list[int]]:
+    """
+    Recover jobs whose worker stopped heartbeating (crash, restart, deploy).
+    Jobs with attempts left go back to 'queued'; the rest are marked failed.
+    Returns (requeued_product_ids, failed_product_ids).
+    """
+    now = time.time()
+    conn = get_db_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    expired = conn.execute("""
+        SELECT id, product_id, attempts, max_attempts FROM jobs
+        WHERE status = 'running' AND lease_expires_at < ?
+    """, (now,)).fetchall()
+    requeued, failed = [], []
+    for job in expired:
+        if job['attempts'] < job['max_attempts']:
+            conn.execute("""
+                UPDATE jobs SET status = 'queued', worker_id = NULL, lease_expires_at = NULL,
+                    last_error = 'Lease expired', updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (job['id'],))
+            conn.execute(
+                "UPDATE products SET status = 'enriching', current_step = 'Queued for processing...', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (job['product_id'],)
+            )
+            requeued.append(job['product_id'])
+        else:
+            conn.execute("""
+                UPDATE jobs SET status = 'failed', lease_expires_at = NULL,
+                    last_error = 'Lease expired (max attempts reached)', updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (job['id'],))
+            conn.execute(
+                "UPDATE products SET status = 'error', current_step = NULL, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (job['product_id'],)
+            )
+            failed.append(job['product_id'])
+    conn.commit()
+    conn.close()
+    return requeued, failed
+
+
+def enqueue_orphaned_products() -> list[int]:
+    """Queue jobs for products left in 'enriching' without an active job
+    (e.g. queued in memory before a restart). Returns the queued product IDs."""
+    conn = get_db_connection()
+    rows = conn.execute("""
+        SELECT id FROM products p
+        WHERE status = 'enriching'
+          AND NOT EXISTS (
+              SELECT 1 FROM jobs j
+              WHERE j.product_id = p.id AND j.status IN ('queued', 'running')
+          )
+    """).fetchall()
+    conn.close()
+    return enqueue_jobs([r['id'] for r in rows])
+
+
+def get_job_counts() -> dict:
+    """Job counts per status, for the dashboard."""
+    conn = get_db_connection()
+    rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+    conn.close()
+    counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+    counts.update({r['status']: r['n'] for r in rows})
+    return counts
+
+
+# ─── Event Outbox ─────────────────────────────────────────────────────────────
+
+def write_outbox_event(product_id: int, event: dict):
+    """Persist a product event for the API process to relay (worker side).
+    Always queued to the writer thread, whether or not DB_WRITE_BEHIND is on,
+    so publishing an event never commits on the pipeline loop; the writer
+    batches them and keeps their order."""
+    _writer.submit(
+        "INSERT INTO event_outbox (product_id, payload, created_at) VALUES (?, ?, ?)",
+        (product_id, json.dumps(event), time.time()),
+        read_your_writes=False,
+    )
+
+
+def get_outbox_cursor() -> int:
+    """Highest outbox event id — the relay starts after it."""
+    conn = get_db_connection()
+    row = conn.execute("SELECT COALESCE(MAX(id), 0) AS max_id FROM event_outbox").fetchone()
+    conn.close()
+    return row['max_id']
+
+
+def read_outbox_events(after_id: int, limit: int = 500) -> list[tuple[int, int, dict]]:
+    """Outbox events newer than after_id, oldest first, as (id, product_id, event)."""
+    conn = get_db_connection()
+    rows = conn.execute(
+        "SELECT id, product_id, payload FROM event_outbox WHERE id > ? ORDER BY id LIMIT ?",
+        (after_id, limit)
+    ).fetchall()
+    conn.close()
+    return [(r['id'], r['product_id'], json.loads(r['payload'])) for r in rows]
+
+
+def prune_outbox_events(max_age_seconds: float):
+    """Delete relayed outbox events older than max_age_seconds."""
+    conn = get_db_connection()
+    conn.execute("DELETE FROM event_outbox WHERE created_at < ?", (time.time() - max_age_seconds,))
+    conn.commit()
+    conn.close()
+
+
 if __name__ == "__main__":
     init_db()
     print("Database initialized.")
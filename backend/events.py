@@ -3,6 +3,7 @@ import json
 import threading
 import time
 from collections import defaultdict
+from typing import Callable
 
 
 class EventBus:
@@ -17,11 +18,20 @@ class EventBus:
         self._channels: dict[str, list[asyncio.Queue]] = defaultdict(list)
         self._lock = threading.Lock()
         self._loop: asyncio.AbstractEventLoop | None = None
+        self._forwarder: Callable[[int, dict], None] | None = None
 
     def set_loop(self, loop: asyncio.AbstractEventLoop):
         """Register the main event loop (call once on startup)."""
         self._loop = loop
 
+    def set_forwarder(self, forwarder: Callable[[int, dict], None]):
+        """Send product events somewhere else instead of local subscribers.
+
+        Used by standalone worker processes, which have no SSE clients: their
+        events are written to the DB outbox and re-published by the API process.
+        """
+        self._forwarder = forwarder
+
     def subscribe(self, channel: str) -> asyncio.Queue:
         queue: asyncio.Queue = asyncio.Queue(maxsize=256)
         with self._lock:
@@ -59,6 +69,13 @@ class EventBus:
     def publish_product_event(self, product_id: int, event: dict):
         """Publish to both the global 'products' channel and the per-product channel."""
         event = {**event, "product_id": product_id, "ts": time.time()}
+        if self._forwarder is not None:
+            self._forwarder(product_id, event)
+            return
+        self.deliver_product_event(product_id, event)
+
+    def deliver_product_event(self, product_id: int, event: dict):
+        """Deliver an already-stamped product event to local subscribers."""
         self.publish("products", event)
         self.publish(f"product:{product_id}", event)
 
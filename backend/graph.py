@@ -12,11 +12,15 @@ for real-time UI feedback. State carries flow-control data + cost tracker.
 
 import json
 import logging
+import functools
 from typing import TypedDict, Optional, Literal, Any
 from langgraph.graph import StateGraph, START, END
-from db import get_db_connection, update_step, append_log, save_cost_data
+from db import (
+    get_db_connection, update_step, append_log, save_cost_data, transaction,
+    aflush_writes, DB_WRITE_BEHIND, add_cost_rollups, mark_processed, rollup_day, require_job_lease,
+)
 from datetime import datetime
-from utils.cost_tracker import CostTracker
+from utils.cost_tracker import CostTracker, cost_rollup_rows
 
 logger = logging.getLogger("pipeline.graph")
 
@@ -60,12 +64,8 @@ async def _ean_lookup(state: ProductState) -> dict:
         return {"error": f"Product {product_id} not found"}
 
     ean = product['ean']
-    result = await lookup_ean(ean)
-
-    # Track costs: 1 Firecrawl scrape + 1 Claude Haiku call
-    if cost_tracker:
-        cost_tracker.add_api_call("firecrawl", credits=1, phase="ean_lookup")
-        cost_tracker.add_llm_call("claude_haiku", input_tokens=500, output_tokens=200, phase="ean_lookup")
+    # Records its own costs: Firecrawl scrape (or page cache hit) + Claude Haiku call
+    result = await lookup_ean(ean, cost_tracker)
 
     if result and result.get('brand'):
         # Update classification with discovered brand
@@ -73,6 +73,7 @@ async def _ean_lookup(state: ProductState) -> dict:
         cls_data['brand'] = result['brand']
         cls_data['brand_confidence'] = 'likely'
 
+        await aflush_writes()  # queued step updates land before current_step is set here
         conn = get_db_connection()
         conn.execute(
             "UPDATE products SET classification_result = ?, current_step = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
@@ -110,7 +111,8 @@ async def _extract(state: ProductState) -> dict:
     if state.get("error"):
         return state
     from pipeline.extract import extract_node
-    return await extract_node(state)
+    # gap_fill runs next, so extract may start prefetching its pages
+    return await extract_node({**state, "prefetch_gap_fill": True})
 
 
 async def _validate(state: ProductState) -> dict:
@@ -134,19 +136,28 @@ async def _save_costs(state: ProductState) -> dict:
 
     if cost_tracker:
         summary = cost_tracker.get_summary()
-        save_cost_data(product_id, summary)
         logger.info(
             f"[Product {product_id}] 💰 Total cost: ${cost_tracker.total_cost:.4f} "
-            f"({len(cost_tracker.llm_calls)} LLM calls, {len(cost_tracker.api_calls)} API calls)"
+            f"({len(cost_tracker.llm_calls)} LLM calls, {len(cost_tracker.api_calls)} API calls, "
+            f"{len(cost_tracker.cache_hits)} cache hits)"
         )
-        append_log(product_id, {
-            "timestamp": datetime.now().isoformat(),
-            "phase": "pipeline", "step": "cost_summary", "status": "success",
-            "details": f"Total cost: ${cost_tracker.total_cost:.4f} | "
-                       f"Tokens: {cost_tracker.total_input_tokens}→{cost_tracker.total_output_tokens} | "
-                       f"API credits: {cost_tracker.total_api_credits}",
-            "cost_usd": round(cost_tracker.total_cost, 4)
-        })
+        # Cost data, daily rollups and summary log entry land in one commit;
+        # the log event is published only once it has
+        with transaction() as conn:
+            require_job_lease(conn)
+            save_cost_data(product_id, summary)
+            day = rollup_day()
+            add_cost_rollups(day, cost_rollup_rows(summary))
+            mark_processed(day, product_id)
+            append_log(product_id, {
+                "timestamp": datetime.now().isoformat(),
+                "phase": "pipeline", "step": "cost_summary", "status": "success",
+                "details": f"Total cost: ${cost_tracker.total_cost:.4f} | "
+                           f"Tokens: {cost_tracker.total_input_tokens}→{cost_tracker.total_output_tokens} | "
+                           f"API credits: {cost_tracker.total_api_credits}"
+                           + (f" | Cache hits: {cost_tracker.cache_hits_by_service}" if cost_tracker.cache_hits else ""),
+                "cost_usd": round(cost_tracker.total_cost, 4)
+            })
     return {}
 
 
@@ -163,17 +174,32 @@ def route_after_triage(state: ProductState) -> Literal["ean_lookup", "search"]:
 
 # --- Build Graph ---
 
+def _node(fn):
+    """Node boundary barrier: with DB_WRITE_BEHIND on, a node's queued
+    status/log writes are committed before the next node starts."""
+    if not DB_WRITE_BEHIND:
+        return fn
+
+    @functools.wraps(fn)
+    async def wrapper(state: ProductState) -> dict:
+        try:
+            return await fn(state)
+        finally:
+            await aflush_writes()
+    return wrapper
+
+
 def build_pipeline() -> StateGraph:
     """Constructs and compiles the enrichment pipeline graph."""
     builder = StateGraph(ProductState)
 
-    builder.add_node("triage", _triage)
-    builder.add_node("ean_lookup", _ean_lookup)
-    builder.add_node("search", _search)
-    builder.add_node("extract", _extract)
-    builder.add_node("validate", _validate)
-    builder.add_node("gap_fill", _gap_fill)
-    builder.add_node("save_costs", _save_costs)
+    builder.add_node("triage", _node(_triage))
+    builder.add_node("ean_lookup", _node(_ean_lookup))
+    builder.add_node("search", _node(_search))
+    builder.add_node("extract", _node(_extract))
+    builder.add_node("validate", _node(_validate))
+    builder.add_node("gap_fill", _node(_gap_fill))
+    builder.add_node("save_costs", _node(_save_costs))
 
     builder.add_edge(START, "triage")
     builder.add_conditional_edges("triage", route_after_triage)
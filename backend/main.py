@@ -1,23 +1,35 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse
 import pandas as pd
 import io
-import json
 import os
+import time
 import logging
 import asyncio
-import time
-from datetime import datetime
 from typing import List, Optional
 from pydantic import BaseModel
-from db import get_db_connection, init_db, update_step
+from db import (
+    get_db_connection, init_db, attach_enrichment_logs,
+    list_products, list_product_changes, PRODUCT_COLUMNS, PRODUCT_SUMMARY_FIELDS,
+    get_status_counts, EAN_UNIQUE,
+    get_outbox_cursor, read_outbox_events, prune_outbox_events,
+    prune_page_cache, get_page_cache_stats, prune_search_cache, get_llm_cache_stats,
+)
 from schemas import ProductResponse
-from graph import enrichment_pipeline, ProductState
 from events import event_bus, format_sse
+from scheduler import batch_scheduler, _publish_final_status
+from runtime import pipeline_runtime
 from utils.cost_tracker import (
     check_can_process, get_daily_stats, get_limits, set_limits
 )
+from utils.rate_limiter import get_rate_limiter_stats
+from utils.scrape import PAGE_CACHE_TTL_SECONDS, PAGE_CACHE_MAX_BYTES
+from utils.search_cache import SEARCH_CACHE_TTL_SECONDS, get_search_cache_metrics
+from utils.singleflight import get_single_flight_stats
+from utils.llm import LLM_CACHE_ENABLED
+from utils.ingest import ingest_file, UPLOAD_MODES
+from utils.export import build_export_row, parquet_available, EXPORT_FORMATS, EXPORT_STREAMERS
 
 # --- Logging ---
 logging.basicConfig(
@@ -43,6 +55,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 class BatchProcessRequest(BaseModel):
@@ -56,83 +69,137 @@ class LimitsUpdateRequest(BaseModel):
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    pruned = prune_page_cache(PAGE_CACHE_TTL_SECONDS, PAGE_CACHE_MAX_BYTES)
+    if pruned:
+        logger.info(f"Pruned {pruned} expired or over-size page cache entries")
+    pruned = prune_search_cache(SEARCH_CACHE_TTL_SECONDS)
+    if pruned:
+        logger.info(f"Pruned {pruned} expired search cache entries")
     # Register main event loop with event bus for thread-safe SSE delivery
     event_bus.set_loop(asyncio.get_running_loop())
-
-# --- Helper: run async pipeline in a separate thread ---
-
-def _run_async_in_thread(async_fn, *args):
-    """Run an async function in a new event loop in the current thread.
-    This isolates blocking I/O (SQLite, sync HTTP) from the main event loop."""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(async_fn(*args))
-    finally:
-        loop.close()
-
-def _publish_final_status(product_id: int):
-    """Read current status from DB and publish SSE event.
-    Needed because pipeline nodes write terminal status directly to DB."""
-    conn = get_db_connection()
-    row = conn.execute("SELECT status, current_step FROM products WHERE id = ?", (product_id,)).fetchone()
-    conn.close()
-    if row:
-        event_bus.publish_product_event(product_id, {
-            "type": "status",
-            "status": row["status"],
-            "current_step": row["current_step"],
-        })
+    # One persistent loop for all pipeline work (batch workers + single-phase endpoints)
+    pipeline_runtime.start()
+    batch_scheduler.start()
+    asyncio.create_task(_relay_worker_events())
+
+# --- Worker event relay ---
+
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "0.5"))
+OUTBOX_RETENTION_SECONDS = 300
+
+async def _relay_worker_events():
+    """Re-publish events written to the DB outbox by standalone worker
+    processes (worker.py) to this process's SSE subscribers. Outbox reads and
+    prunes run in a thread so they don't block the API loop."""
+    cursor = await asyncio.to_thread(get_outbox_cursor)
+    last_prune = time.monotonic()
+    while True:
+        await asyncio.sleep(OUTBOX_POLL_SECONDS)
+        try:
+            for event_id, product_id, event in await asyncio.to_thread(read_outbox_events, cursor):
+                event_bus.deliver_product_event(product_id, event)
+                cursor = event_id
+            if time.monotonic() - last_prune > 60:
+                await asyncio.to_thread(prune_outbox_events, OUTBOX_RETENTION_SECONDS)
+                last_prune = time.monotonic()
+        except Exception as e:
+            logger.warning(f"Event relay failed: {e}")
 
 # --- Upload ---
 
 @app.post("/api/upload")
-async def upload_products(file: UploadFile = File(...)):
+async def upload_products(file: UploadFile = File(...), mode: str = Query("skip")):
+    """Import products. mode: skip (default) | update | duplicate — how rows
+    whose EAN is already in the catalog (or earlier in the file) are handled."""
     if not file.filename.endswith(('.csv', '.xlsx')):
         raise HTTPException(status_code=400, detail="Invalid file format")
+    if mode not in UPLOAD_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(UPLOAD_MODES)}")
+    if mode == "duplicate" and EAN_UNIQUE:
+        raise HTTPException(status_code=400, detail="mode=duplicate is not allowed while EAN_UNIQUE is enabled")
 
-    contents = await file.read()
+    def on_progress(progress: dict):
+        event_bus.publish("products", {"type": "upload_progress", "filename": file.filename, **progress})
 
     try:
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(contents))
-        else:
-            df = pd.read_excel(io.BytesIO(contents))
-
-        conn = get_db_connection()
-        c = conn.cursor()
-
-        for _, row in df.iterrows():
-            row_dict = json.loads(row.to_json())
-            ean = str(row_dict.get('EAN', row_dict.get('ean', 'UNKNOWN')))
-            name = str(row_dict.get('Name', row_dict.get('name', row_dict.get('Product Name', row_dict.get('naziv', 'UNKNOWN')))))
-            brand = str(row_dict.get('Brand', row_dict.get('brand', None)))
-            weight = str(row_dict.get('Weight', row_dict.get('weight', None)))
-
-            if ean == 'UNKNOWN' and name == 'UNKNOWN':
-                continue
-
-            c.execute("""
-                INSERT INTO products (ean, product_name, brand, weight, original_data)
-                VALUES (?, ?, ?, ?, ?)
-            """, (ean, name, brand, weight, json.dumps(row_dict)))
-
-        conn.commit()
-        conn.close()
-
-        return {"message": f"Successfully processed {len(df)} products"}
-
+        # Streams the spooled upload in batches, off the event loop
+        result = await asyncio.to_thread(ingest_file, file.file, file.filename, on_progress, mode)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    return {"message": f"Successfully processed {result['rows']} products", **result}
+
 # --- Product Listing ---
 
+def _parse_projection(fields: Optional[str], view: Optional[str]) -> Optional[List[str]]:
+    """Columns to return for ?fields= / ?view=, or None for full rows."""
+    projection = None
+    if view == "summary":
+        projection = list(PRODUCT_SUMMARY_FIELDS)
+    elif view not in (None, "full"):
+        raise HTTPException(status_code=400, detail="view must be 'full' or 'summary'")
+    if fields:
+        projection = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in projection if f not in PRODUCT_COLUMNS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return projection
+
+
 @app.get("/api/products", response_model=List[ProductResponse])
-def get_products():
-    conn = get_db_connection()
-    products = conn.execute("SELECT * FROM products ORDER BY id DESC").fetchall()
-    conn.close()
-    return [dict(p) for p in products]
+def get_products(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[int] = None,
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
+    status: Optional[str] = None,
+    brand: Optional[str] = None,
+    product_type: Optional[str] = None,
+):
+    """
+    Products newest first. Without parameters this is the full list, as before.
+
+    - limit / cursor — keyset pagination; the next cursor comes back in the
+      X-Next-Cursor header (absent on the last page)
+    - fields=id,status,... — return only these columns
+    - view=summary — table-view columns only, none of the JSON blobs
+    - status (comma-separated), brand, product_type — indexed filters
+    """
+    projection = _parse_projection(fields, view)
+    products, next_cursor = list_products(
+        fields=projection,
+        statuses=[s.strip() for s in status.split(",") if s.strip()] if status else None,
+        brand=brand,
+        product_type=product_type,
+        before_id=cursor,
+        limit=limit,
+    )
+    headers = {"X-Next-Cursor": str(next_cursor)} if next_cursor is not None else {}
+
+    # Projected rows don't fit ProductResponse — skip model validation for them
+    if projection is not None:
+        return JSONResponse(products, headers=headers)
+    response.headers.update(headers)
+    return products
+
+
+@app.get("/api/products/changes")
+def get_product_changes(
+    since: int = 0,
+    limit: int = Query(500, ge=1, le=5000),
+    fields: Optional[str] = None,
+    view: Optional[str] = None,
+):
+    """
+    Delta sync: products inserted or updated after the `since` cursor, in
+    change order, plus the IDs of products deleted since then. Start with
+    since=0, then pass back next_cursor; keep paging while has_more is true.
+    fields / view work as on GET /api/products.
+    """
+    projection = _parse_projection(fields, view)
+    products, deleted, next_cursor, has_more = list_product_changes(since, fields=projection, limit=limit)
+    return {"products": products, "deleted": deleted, "next_cursor": next_cursor, "has_more": has_more}
 
 # --- SSE Endpoints ---
 
@@ -173,7 +240,7 @@ async def sse_product(product_id: int):
     async def event_generator():
         # Send initial snapshot
         conn = get_db_connection()
-        product = conn.execute("SELECT id, status, current_step, enrichment_log FROM products WHERE id = ?", (product_id,)).fetchone()
+        product = conn.execute("SELECT id, status, current_step FROM products WHERE id = ?", (product_id,)).fetchone()
         conn.close()
         if product:
             snapshot = {
@@ -209,101 +276,10 @@ async def sse_product(product_id: int):
     )
 
 
-# --- Enrichment Pipeline ---
-# These functions are SYNC and run in a thread (via BackgroundTasks)
-# to keep the main event loop free for SSE streams and API requests.
-
-def run_full_enrichment(product_id: int):
-    """
-    Invokes the LangGraph enrichment pipeline for a single product.
-    Runs in a thread — all blocking I/O is isolated from the main event loop.
-    """
-    try:
-        # Load product name for logging
-        conn = get_db_connection()
-        product_row = conn.execute("SELECT product_name FROM products WHERE id = ?", (product_id,)).fetchone()
-        product_name = product_row['product_name'] if product_row else f"ID:{product_id}"
-        conn.close()
-
-        logger.info(f"")
-        logger.info(f"{'='*60}")
-        logger.info(f"[Product {product_id}] ▶ PIPELINE START — {product_name}")
-        logger.info(f"{'='*60}")
-
-        # Set initial status (publishes SSE event via thread-safe event bus)
-        update_step(product_id, "enriching", "Initializing pipeline...")
-
-        # Initialize cost tracker for this run
-        from utils.cost_tracker import CostTracker
-        cost_tracker = CostTracker(product_id)
-
-        # Build initial state
-        initial_state: ProductState = {
-            "product_id": product_id,
-            "has_brand": False,
-            "has_search_results": False,
-            "error": None,
-            "cost_tracker": cost_tracker,
-        }
-
-        # Run the async LangGraph pipeline in its own event loop (in this thread)
-        result = _run_async_in_thread(enrichment_pipeline.ainvoke, initial_state)
-
-        if result.get("error"):
-            raise Exception(result["error"])
-
-        # Publish final status for SSE clients.
-        # Pipeline nodes (e.g. validate) write terminal status directly to DB
-        # without calling update_step(), so we read it back and publish here.
-        conn = get_db_connection()
-        final_row = conn.execute("SELECT status, current_step FROM products WHERE id = ?", (product_id,)).fetchone()
-        conn.close()
-        if final_row:
-            event_bus.publish_product_event(product_id, {
-                "type": "status",
-                "status": final_row["status"],
-                "current_step": final_row["current_step"],
-            })
-
-        logger.info(f"[Product {product_id}] ✓ PIPELINE COMPLETE — {product_name}")
-        logger.info(f"{'='*60}")
-
-    except Exception as e:
-        logger.error(f"[Product {product_id}] ✗ PIPELINE FAILED — {e}")
-        conn = get_db_connection()
-        product_row = conn.execute("SELECT enrichment_log FROM products WHERE id = ?", (product_id,)).fetchone()
-        existing_log = json.loads(product_row['enrichment_log']) if product_row and product_row['enrichment_log'] else []
-        existing_log.append({
-            "timestamp": datetime.now().isoformat(),
-            "phase": "pipeline", "step": "error", "status": "error",
-            "details": str(e)
-        })
-        conn.execute(
-            "UPDATE products SET status = 'error', current_step = NULL, enrichment_log = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-            (json.dumps(existing_log), product_id)
-        )
-        conn.commit()
-        conn.close()
-
-        # Publish error event
-        event_bus.publish_product_event(product_id, {
-            "type": "status",
-            "status": "error",
-            "current_step": None,
-        })
-
-
-def process_batch(product_ids: List[int]):
-    """Process products sequentially (to respect API rate limits).
-    Runs in a thread via BackgroundTasks."""
-    for pid in product_ids:
-        run_full_enrichment(pid)
-        time.sleep(0.5)
-
 # --- Static sub-paths FIRST (before parameterized {id} routes) ---
 
 @app.post("/api/products/process-all")
-async def process_all_products(background_tasks: BackgroundTasks):
+async def process_all_products():
     conn = get_db_connection()
     rows = conn.execute("SELECT id FROM products WHERE status IN ('pending', 'needs_review')").fetchall()
     product_ids = [row['id'] for row in rows]
@@ -322,7 +298,7 @@ async def process_all_products(background_tasks: BackgroundTasks):
     limits = get_limits()
     product_ids = product_ids[:limits["max_batch_size"]]
 
-    # Set status immediately before background task — fixes race condition
+    # Set status immediately before queueing — fixes race condition
     for pid in product_ids:
         conn.execute(
             "UPDATE products SET status = 'enriching', current_step = 'Queued for processing...', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
@@ -339,11 +315,11 @@ async def process_all_products(background_tasks: BackgroundTasks):
             "current_step": "Queued for processing...",
         })
 
-    background_tasks.add_task(process_batch, product_ids)
+    batch_scheduler.submit(product_ids)
     return {"message": f"Started processing {len(product_ids)} products"}
 
 @app.post("/api/products/process-batch")
-async def process_batch_products(request: BatchProcessRequest, background_tasks: BackgroundTasks):
+async def process_batch_products(request: BatchProcessRequest):
     if not request.product_ids:
         return {"message": "No product IDs provided"}
 
@@ -352,7 +328,7 @@ async def process_batch_products(request: BatchProcessRequest, background_tasks:
     if not allowed:
         raise HTTPException(status_code=429, detail=reason)
 
-    # Set status immediately before background task — fixes race condition
+    # Set status immediately before queueing — fixes race condition
     conn = get_db_connection()
     for pid in request.product_ids:
         conn.execute(
@@ -370,7 +346,7 @@ async def process_batch_products(request: BatchProcessRequest, background_tasks:
             "current_step": "Queued for processing...",
         })
 
-    background_tasks.add_task(process_batch, request.product_ids)
+    batch_scheduler.submit(request.product_ids)
     return {"message": f"Started processing {len(request.product_ids)} products"}
 
 # --- Parameterized routes AFTER static ones ---
@@ -384,10 +360,10 @@ def get_product(id: int):
     if product is None:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    return dict(product)
+    return attach_enrichment_logs([dict(product)])[0]
 
 @app.post("/api/products/{id}/enrich")
-async def enrich_product(id: int, background_tasks: BackgroundTasks):
+async def enrich_product(id: int):
     # Set status immediately — fixes race condition
     conn = get_db_connection()
     conn.execute(
@@ -402,11 +378,11 @@ async def enrich_product(id: int, background_tasks: BackgroundTasks):
         "current_step": "Starting enrichment...",
     })
 
-    background_tasks.add_task(run_full_enrichment, id)
+    batch_scheduler.submit([id])
     return {"message": "Enrichment started"}
 
 @app.post("/api/products/{id}/classify")
-async def trigger_classify(id: int, background_tasks: BackgroundTasks):
+async def trigger_classify(id: int):
     """Run Phase 1 (Triage) only."""
     # Set status immediately
     conn = get_db_connection()
@@ -423,17 +399,14 @@ async def trigger_classify(id: int, background_tasks: BackgroundTasks):
     })
 
     from pipeline.triage import triage_node
-    def run():
-        _run_async_in_thread(
-            triage_node,
-            {"product_id": id, "has_brand": False, "has_search_results": False, "error": None}
-        )
+    async def run():
+        await triage_node({"product_id": id, "has_brand": False, "has_search_results": False, "error": None})
         _publish_final_status(id)
-    background_tasks.add_task(run)
+    pipeline_runtime.submit(run())
     return {"message": "Classification started"}
 
 @app.post("/api/products/{id}/search")
-async def trigger_search(id: int, background_tasks: BackgroundTasks):
+async def trigger_search(id: int):
     # Set status immediately
     conn = get_db_connection()
     conn.execute(
@@ -449,17 +422,14 @@ async def trigger_search(id: int, background_tasks: BackgroundTasks):
     })
 
     from pipeline.search import search_node
-    def run():
-        _run_async_in_thread(
-            search_node,
-            {"product_id": id, "has_brand": True, "has_search_results": False, "error": None}
-        )
+    async def run():
+        await search_node({"product_id": id, "has_brand": True, "has_search_results": False, "error": None})
         _publish_final_status(id)
-    background_tasks.add_task(run)
+    pipeline_runtime.submit(run())
     return {"message": "Search started"}
 
 @app.post("/api/products/{id}/extract")
-async def trigger_extract(id: int, background_tasks: BackgroundTasks):
+async def trigger_extract(id: int):
     # Set status immediately
     conn = get_db_connection()
     conn.execute(
@@ -475,17 +445,14 @@ async def trigger_extract(id: int, background_tasks: BackgroundTasks):
     })
 
     from pipeline.extract import extract_node
-    def run():
-        _run_async_in_thread(
-            extract_node,
-            {"product_id": id, "has_brand": True, "has_search_results": True, "error": None}
-        )
+    async def run():
+        await extract_node({"product_id": id, "has_brand": True, "has_search_results": True, "error": None})
         _publish_final_status(id)
-    background_tasks.add_task(run)
+    pipeline_runtime.submit(run())
     return {"message": "Extraction started"}
 
 @app.post("/api/products/{id}/validate")
-async def trigger_validate(id: int, background_tasks: BackgroundTasks):
+async def trigger_validate(id: int):
     # Set status immediately
     conn = get_db_connection()
     conn.execute(
@@ -501,13 +468,10 @@ async def trigger_validate(id: int, background_tasks: BackgroundTasks):
     })
 
     from pipeline.validate import validate_node
-    def run():
-        _run_async_in_thread(
-            validate_node,
-            {"product_id": id, "has_brand": True, "has_search_results": True, "error": None}
-        )
+    async def run():
+        await validate_node({"product_id": id, "has_brand": True, "has_search_results": True, "error": None})
         _publish_final_status(id)
-    background_tasks.add_task(run)
+    pipeline_runtime.submit(run())
     return {"message": "Validation started"}
 
 @app.post("/api/products/{id}/reset")
@@ -528,6 +492,9 @@ async def reset_product(id: int):
     """, (id,))
     # Clean up cached scraped pages
     conn.execute("DELETE FROM scraped_pages WHERE product_id = ?", (id,))
+    conn.execute("DELETE FROM enrichment_log_entries WHERE product_id = ?", (id,))
+    # Drop any queued (not yet claimed) enrichment job
+    conn.execute("DELETE FROM jobs WHERE product_id = ? AND status = 'queued'", (id,))
     conn.commit()
     conn.close()
 
@@ -549,7 +516,7 @@ def export_single_product(id: int):
         raise HTTPException(status_code=404, detail="Product not found")
 
     row = dict(product)
-    export_row = _build_export_row(row)
+    export_row = build_export_row(row)
 
     df = pd.DataFrame([export_row])
     stream = io.BytesIO()
@@ -565,19 +532,40 @@ def export_single_product(id: int):
 
 # --- Dashboard ---
 
+PROCESSING_STATUSES = ('enriching', 'classifying', 'searching', 'extracting', 'validating', 'gap_filling')
+
+
 @app.get("/api/dashboard/stats")
 def get_dashboard_stats():
-    conn = get_db_connection()
-    total = conn.execute("SELECT COUNT(*) as c FROM products").fetchone()['c']
-    pending = conn.execute("SELECT COUNT(*) as c FROM products WHERE status = 'pending'").fetchone()['c']
-    done = conn.execute("SELECT COUNT(*) as c FROM products WHERE status = 'done'").fetchone()['c']
-    errors = conn.execute("SELECT COUNT(*) as c FROM products WHERE status = 'error'").fetchone()['c']
-    needs_review = conn.execute("SELECT COUNT(*) as c FROM products WHERE status = 'needs_review'").fetchone()['c']
-    processing = conn.execute("SELECT COUNT(*) as c FROM products WHERE status IN ('enriching','classifying','searching','extracting','validating','gap_filling')").fetchone()['c']
-    conn.close()
+    counts = get_status_counts()
+    processing = sum(counts.get(s, 0) for s in PROCESSING_STATUSES)
+    return {
+        "total": sum(counts.values()), "pending": counts.get("pending", 0), "done": counts.get("done", 0),
+        "errors": counts.get("error", 0), "needs_review": counts.get("needs_review", 0), "processing": processing
+    }
+
+
+@app.get("/api/dashboard/scheduler")
+def get_scheduler_stats():
+    """Return batch scheduler queue depth and in-flight counts."""
+    return batch_scheduler.stats()
+
+
+@app.get("/api/dashboard/rate-limits")
+def get_rate_limit_stats():
+    """Return per-provider limiter usage and wait times (slowest provider first)."""
+    return get_rate_limiter_stats()
+
+
+@app.get("/api/dashboard/cache")
+def get_cache_stats():
+    """Return size and hit counts for the page, search and LLM response caches,
+    plus how many in-flight lookups were shared (single-flight)."""
     return {
-        "total": total, "pending": pending, "done": done,
-        "errors": errors, "needs_review": needs_review, "processing": processing
+        "pages": get_page_cache_stats(),
+        "searches": get_search_cache_metrics(),
+        "llm": {"enabled": LLM_CACHE_ENABLED, **get_llm_cache_stats()},
+        "single_flight": get_single_flight_stats(),
     }
 
 
@@ -602,130 +590,24 @@ def update_guardrail_limits(request: LimitsUpdateRequest):
 # --- Export All ---
 
 @app.get("/api/export")
-def export_products():
-    conn = get_db_connection()
-    products = conn.execute("SELECT * FROM products").fetchall()
-    conn.close()
-
-    export_data = [_build_export_row(dict(p)) for p in products]
-
-    df = pd.DataFrame(export_data)
-    stream = io.BytesIO()
-    df.to_excel(stream, index=False)
-    stream.seek(0)
+def export_products(format: str = "xlsx"):
+    """
+    Export all products, streamed in DB chunks: xlsx (default), csv, ndjson
+    or parquet (needs pyarrow). See utils/export.py.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export needs pyarrow (pip install pyarrow)")
 
+    streamer, media_type = EXPORT_STREAMERS[format]
     return StreamingResponse(
-        stream,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=enriched_products.xlsx"}
+        streamer(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=enriched_products.{format}"}
     )
 
 
-def _build_export_row(row: dict) -> dict:
-    export_row = {
-        "ID": row['id'],
-        "EAN": row['ean'],
-        "Name": row['product_name'],
-        "Status": row['status'],
-    }
-
-    enriched_data = {}
-    if row.get('validation_result'):
-        try:
-            val_res = json.loads(row['validation_result'])
-            enriched_data = val_res.get('normalized_data', {})
-            export_row['Quality Status'] = val_res.get('report', {}).get('overall_quality', 'unknown')
-        except: pass
-    elif row.get('extraction_result'):
-        try:
-            enriched_data = json.loads(row['extraction_result'])
-            export_row['Quality Status'] = 'raw_extraction'
-        except: pass
-
-    # Classification
-    if row.get('classification_result'):
-        try:
-            cls_res = json.loads(row['classification_result'])
-            export_row['Type'] = cls_res.get('product_type')
-            export_row['Brand'] = cls_res.get('brand')
-        except: pass
-
-    # Helper to extract EnrichedField value/unit from a nested dict
-    def _field_val(data: dict, *path) -> tuple:
-        """Traverse nested dict and return (value, unit) tuple."""
-        obj = data
-        for key in path:
-            if isinstance(obj, dict) and key in obj:
-                obj = obj[key]
-            else:
-                return (None, None)
-        if isinstance(obj, dict):
-            return (obj.get('value'), obj.get('unit'))
-        return (None, None)
-
-    # Net dimensions
-    for dim_field in ['height', 'width', 'length', 'depth', 'weight', 'diameter', 'volume']:
-        val, unit = _field_val(enriched_data, 'dimensions', 'net', dim_field)
-        label = f"Net {dim_field.title()}"
-        export_row[label] = val
-        export_row[f"{label} Unit"] = unit
-
-    # Packaged dimensions
-    for dim_field in ['height', 'width', 'length', 'depth', 'weight']:
-        val, unit = _field_val(enriched_data, 'dimensions', 'packaged', dim_field)
-        label = f"Pkg {dim_field.title()}"
-        export_row[label] = val
-        export_row[f"{label} Unit"] = unit
-
-    # Color + COO
-    color_val, _ = _field_val(enriched_data, 'color')
-    export_row['Color'] = color_val
-    coo_val, _ = _field_val(enriched_data, 'country_of_origin')
-    export_row['Country Of Origin'] = coo_val
-
-    # Descriptions
-    desc = enriched_data.get('descriptions', {})
-    short_desc = desc.get('short_description', {})
-    if isinstance(short_desc, dict):
-        export_row['Short Description'] = short_desc.get('value')
-    mktg_desc = desc.get('marketing_description', {})
-    if isinstance(mktg_desc, dict):
-        export_row['Marketing Description'] = mktg_desc.get('value')
-    features = desc.get('features', [])
-    if features:
-        export_row['Features'] = "; ".join(features[:20])
-
-    # Technical Specs
-    tech = enriched_data.get('technical_data', {})
-    specs = tech.get('specs', [])
-    if specs:
-        export_row['Tech Specs Count'] = len(specs)
-        # Flatten first 30 specs as individual columns
-        for spec in specs[:30]:
-            if isinstance(spec, dict) and spec.get('name'):
-                col_name = f"Spec: {spec['name']}"
-                spec_val = spec.get('value', '')
-                spec_unit = spec.get('unit', '')
-                export_row[col_name] = f"{spec_val} {spec_unit}".strip() if spec_val else None
-
-    # Warranty
-    warranty = enriched_data.get('warranty', {})
-    war_dur = warranty.get('duration', {})
-    if isinstance(war_dur, dict):
-        export_row['Warranty Duration'] = war_dur.get('value')
-    export_row['Warranty Type'] = warranty.get('type')
-
-    # Documents
-    docs = enriched_data.get('documents', {})
-    doc_list = docs.get('documents', [])
-    if doc_list:
-        export_row['Documents Count'] = len(doc_list)
-        doc_urls = [d.get('url', '') for d in doc_list if isinstance(d, dict)]
-        export_row['Document URLs'] = "; ".join(doc_urls)
-
-    return export_row
-
-
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
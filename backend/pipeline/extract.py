@@ -18,14 +18,18 @@ import json
 import logging
 import asyncio
 import httpx
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import List, Type, Dict, Any
 from urllib.parse import urljoin, urlparse
 from firecrawl import FirecrawlApp
 from pydantic import BaseModel
 from tavily import TavilyClient
-from db import get_db_connection, update_step, append_log, save_scraped_page, mark_page_extracted, get_scraped_pages
-from utils.llm import classify_with_schema, get_raw_client, HAIKU_MODEL
+from db import get_db_connection, aflush_writes, update_step, append_log, save_scraped_page, mark_page_extracted, get_scraped_pages
+from utils.llm import aclassify_with_schema
+from utils.scrape import fetch_page, track_scrape
+from utils.rate_limiter import get_rate_limiter
+from utils.singleflight import get_single_flight
 from schemas import (
     EnrichedProduct, EnrichedField, ProductClassification,
     DimensionsExtraction, ContentExtraction, TechnicalSpec,
@@ -269,11 +273,11 @@ async def extract_node(state: dict) -> dict:
     """
     LangGraph node: Phase 3 — Extraction (v3).
 
-    Two-pass extraction per URL:
+    Two-pass extraction per URL (all URLs scraped and extracted concurrently):
       Pass 1: Structured data (dimensions, color, COO, images)
       Pass 2: Content (descriptions, features, tech specs, warranty)
     Plus: Regex-based PDF/document link collection
-    Then: Merge all sources, deterministic image filtering, gap fill (color + COO)
+    Then: Merge all sources; image filtering → color runs concurrently with the COO lookup
     """
     product_id = state["product_id"]
     cost_tracker = state.get("cost_tracker")
@@ -297,28 +301,23 @@ async def extract_node(state: dict) -> dict:
     classification = ProductClassification.model_validate_json(product['classification_result'])
 
     # Tier-based URL selection: manufacturer first, then authorized distributors.
-    # Third-party sites are scraped and cached but NOT extracted in this pass —
-    # the gap_fill node will extract from them later if critical data is missing.
+    # Third-party sites are NOT scraped here — the gap_fill node fetches them
+    # on demand, and only if critical data is missing after this pass.
     all_results_filtered = search_results.get('results', [])
     manufacturer_urls = [r for r in all_results_filtered if r['source_type'] == 'manufacturer']
     authorized_urls = [r for r in all_results_filtered if r['source_type'] == 'authorized_distributor']
-    third_party_urls = [r for r in all_results_filtered if r['source_type'] == 'third_party']
 
     # Main extraction targets (LLM calls)
     urls_to_process = manufacturer_urls[:2] + authorized_urls[:3]
 
-    # Scrape-only targets (cached for gap fill, no LLM calls)
-    urls_to_cache_only = third_party_urls[:3]
-
     if not urls_to_process:
         # Fallback: if classification was poor and nothing is manufacturer/authorized, take top 3
         urls_to_process = [r for r in all_results_filtered if r['source_type'] != 'irrelevant'][:3]
-        urls_to_cache_only = []  # Already taking from all tiers
 
     logger.info(
         f"[Product {product_id}]   URLs to process: "
         f"{len(manufacturer_urls[:2])} manufacturer + {len(authorized_urls[:3])} authorized "
-        f"= {len(urls_to_process)} total, {len(urls_to_cache_only)} third-party to cache"
+        f"= {len(urls_to_process)} total"
     )
 
     dimension_extractions: List[DimensionsExtraction] = []
@@ -340,295 +339,43 @@ async def extract_node(state: dict) -> dict:
 
     firecrawl = FirecrawlApp(api_key=fc_api_key)
 
-    # ── Process each URL ──────────────────────────────────────────────────
-    for result in urls_to_process:
-        url = result['url']
-        source_type = result['source_type']
-        source_type_by_url[url] = source_type
-
-        try:
-            logger.info(f"[Product {product_id}]   Scraping {_shorten_url(url)} ({source_type})...")
-            update_step(product_id, "extracting", f"Scraping {_shorten_url(url)}...")
-
-            scraped = firecrawl.scrape(url, formats=['markdown'])
-
-            # Track Firecrawl cost
-            if cost_tracker:
-                cost_tracker.add_api_call("firecrawl", credits=1, phase="extract_scrape")
-
-            markdown = ''
-            if hasattr(scraped, 'markdown') and scraped.markdown:
-                markdown = scraped.markdown[:40000]
-            elif isinstance(scraped, dict):
-                markdown = scraped.get('markdown', '')[:40000]
-
-            # Cache the scraped page for potential gap-fill use
-            save_scraped_page(product_id, url, source_type, markdown if markdown else None, success=bool(markdown))
-
-            if not markdown:
-                append_log(product_id, {
-                    "timestamp": datetime.now().isoformat(),
-                    "phase": "extract", "step": f"scrape_{url}", "status": "warning",
-                    "details": f"No content from {url}"
-                })
-                continue
-
-            # Extract images from this page
-            page_images = _extract_all_image_urls(markdown, url)
-            all_discovered_images.extend(page_images)
-
-            # Extract PDF links from this page
-            page_pdfs = _extract_pdf_links(markdown, url)
-            all_pdf_links.extend(page_pdfs)
-
-            # Determine confidence level based on source type (three-tier)
-            if source_type == "manufacturer":
-                confidence_level = "official"
-            elif source_type == "authorized_distributor":
-                confidence_level = "authorized"
-            else:
-                confidence_level = "third_party"
-
-            # Shared system preamble for both passes (must be identical for cache hit)
-            # The scraped markdown goes into cached_content, shared between Pass 1 and Pass 2.
-            # Pass-specific instructions go into the user message.
-            extraction_preamble = f"""You are a product data extraction assistant analyzing a scraped product page.
-Source URL: {url}
-Source type: {source_type} (confidence level: {confidence_level})
-Product: {classification.brand} {classification.model_number} (EAN: {product['ean']})
-
-The full page content is provided below. Follow the extraction instructions in the user message."""
-
-            # Use the same truncation for both passes so the cached prefix matches exactly
-            page_content = markdown[:30000]
-
-            # ── Pass 1: Structured Dimensions ─────────────────────────────
-            logger.info(f"[Product {product_id}]   Pass 1: Structured extraction from {_shorten_url(url)}...")
-            update_step(product_id, "extracting", f"Pass 1: Dimensions from {_shorten_url(url)}...")
-
-            pass1_user = f"""Extract PHYSICAL PRODUCT DATA from the page content above.
-
-EXTRACT NET (product itself) AND PACKAGED (with box/packaging) dimensions separately.
-Many product pages list both — look for labels like "Net weight", "Package weight", "Brutto/Netto",
-"Teža izdelka / Teža paketa", "Product dimensions / Package dimensions".
-
-For each dimension field:
-- value: The numeric value (e.g. 45.2). NO UNITS in the value.
-- unit: The original unit (cm, mm, kg, g, L, mL, etc.)
-- confidence: "{confidence_level}"
-- source_url: "{url}"
-
-Also extract:
-- color: The product's primary color.
-- country_of_origin: Manufacturing country if mentioned.
-- Extract the highest-resolution PRODUCT IMAGE URL (not PDFs, icons, or logos).
-- image_urls: List ALL product image URLs found on the page."""
-
-            try:
-                dim_extraction, usage = classify_with_schema(
-                    prompt=pass1_user,
-                    system=extraction_preamble,
-                    schema=DimensionsExtraction,
-                    model="haiku",
-                    return_usage=True,
-                    cached_content=page_content,
-                    max_tokens=4096,
-                )
-                dimension_extractions.append(dim_extraction)
-
-                # Track cost (with cache metrics)
-                if cost_tracker:
-                    cost_tracker.add_llm_call(
-                        usage["model"], usage["input_tokens"], usage["output_tokens"],
-                        phase="extract_pass1",
-                        cache_creation_input_tokens=usage.get("cache_creation_input_tokens", 0),
-                        cache_read_input_tokens=usage.get("cache_read_input_tokens", 0),
-                    )
-
-                # Collect LLM-extracted images
-                if dim_extraction.image_urls:
-                    for img in dim_extraction.image_urls:
-                        if _is_valid_image_url(img):
-                            all_discovered_images.append(img)
-
-                append_log(product_id, {
-                    "timestamp": datetime.now().isoformat(),
-                    "phase": "extract", "step": "pass1_structured", "status": "success",
-                    "details": f"Pass 1 done for {_shorten_url(url)} ({source_type})",
-                    "credits_used": {"claude_in": usage["input_tokens"], "claude_out": usage["output_tokens"],
-                                     "cache_read": usage.get("cache_read_input_tokens", 0)}
-                })
-            except Exception as e:
-                logger.warning(f"[Product {product_id}]   Pass 1 failed for {_shorten_url(url)}: {e}")
-                append_log(product_id, {
-                    "timestamp": datetime.now().isoformat(),
-                    "phase": "extract", "step": "pass1_structured", "status": "error",
-                    "details": f"Pass 1 failed for {_shorten_url(url)}: {e}"
-                })
-
-            # ── Pass 2: Content Extraction ────────────────────────────────
-            # Uses the same system preamble + page_content as Pass 1 → cache HIT on the markdown
-            logger.info(f"[Product {product_id}]   Pass 2: Content extraction from {_shorten_url(url)}...")
-            update_step(product_id, "extracting", f"Pass 2: Content from {_shorten_url(url)}...")
-
-            pass2_user = f"""Extract technical content and description MARKERS from the page content above.
-
-1. SHORT DESCRIPTION (markers only):
-   The brief product summary, usually 1-2 sentences near the top of the product page.
-   Return ONLY the first ~50 characters as short_description_start
-   and the last ~50 characters as short_description_end.
-   These markers will be used to locate the full text in the raw page content.
-   Do NOT return the full description text.
-
-2. MARKETING DESCRIPTION (markers only):
-   The longer marketing/promotional text describing product features and benefits.
-   Return ONLY the first ~50 characters as marketing_description_start
-   and the last ~50 characters as marketing_description_end.
-   These markers will be used to locate the full text in the raw page content.
-   Do NOT return the full description text.
-
-3. FEATURES:
-   A list of product features/highlights. Often presented as bullet points on the page.
-   Extract each feature as a separate string. Keep original language.
-
-4. TECHNICAL SPECIFICATIONS:
-   ALL key-value pairs from specification/technical data tables on the page.
-   Common examples: motor power, voltage, RPM, cutting width, tank capacity, noise level,
-   blade length, cable length, speed settings, battery info, etc.
-   For each spec: name (exactly as shown), value (exactly as shown), unit (if separate).
-   Set confidence to "{confidence_level}" and source_url to "{url}".
-
-5. WARRANTY:
-   Look for warranty terms: "garancija", "Garantie", "warranty", "jamstvo", "garanzia".
-   Extract duration (e.g., "2 years", "24 mesecev"), type, and any conditions.
-
-RULES:
-- DO NOT fabricate content. Only extract what is actually on the page.
-- For descriptions, return EXACT text from the page as markers (copy-paste, not paraphrased).
-- Keep original language text (Slovenian, German, English, etc.) — do NOT translate.
-- If a field is not present on the page, leave it empty."""
-
-            try:
-                content_extraction, usage = classify_with_schema(
-                    prompt=pass2_user,
-                    system=extraction_preamble,
-                    schema=ContentExtraction,
-                    model="haiku",
-                    return_usage=True,
-                    cached_content=page_content,
-                    max_tokens=4096,  # Reduced: descriptions use markers now, not full text
-                )
-                content_extractions.append(content_extraction)
-                content_source_urls.append(url)
-                content_source_types.append(source_type)
-
-                # Track cost (with cache metrics)
-                if cost_tracker:
-                    cost_tracker.add_llm_call(
-                        usage["model"], usage["input_tokens"], usage["output_tokens"],
-                        phase="extract_pass2",
-                        cache_creation_input_tokens=usage.get("cache_creation_input_tokens", 0),
-                        cache_read_input_tokens=usage.get("cache_read_input_tokens", 0),
-                    )
-
-                spec_count = len(content_extraction.technical_specs)
-                feat_count = len(content_extraction.features)
-                logger.info(f"[Product {product_id}]   Pass 2 done: {spec_count} specs, {feat_count} features")
-
-                append_log(product_id, {
-                    "timestamp": datetime.now().isoformat(),
-                    "phase": "extract", "step": "pass2_content", "status": "success",
-                    "details": f"Pass 2 done for {_shorten_url(url)}: {spec_count} tech specs, {feat_count} features, warranty={bool(content_extraction.warranty_duration)}",
-                    "credits_used": {"claude_in": usage["input_tokens"], "claude_out": usage["output_tokens"],
-                                     "cache_read": usage.get("cache_read_input_tokens", 0)}
-                })
-            except Exception as e:
-                logger.warning(f"[Product {product_id}]   Pass 2 failed for {_shorten_url(url)}: {e}")
-                append_log(product_id, {
-                    "timestamp": datetime.now().isoformat(),
-                    "phase": "extract", "step": "pass2_content", "status": "error",
-                    "details": f"Pass 2 failed for {_shorten_url(url)}: {e}"
-                })
-
-            # Mark page as extracted in cache (even if one pass failed)
-            mark_page_extracted(product_id, url)
-
-        except Exception as e:
-            logger.warning(f"[Product {product_id}]   Scrape failed for {_shorten_url(url)}: {e}, retrying...")
-            # Retry once
-            try:
-                update_step(product_id, "extracting", f"Retrying {_shorten_url(url)}...")
-                await asyncio.sleep(3)
-                scraped = firecrawl.scrape(url, formats=['markdown'])
-
-                # Track retry scrape cost
-                if cost_tracker:
-                    cost_tracker.add_api_call("firecrawl", credits=1, phase="extract_scrape_retry")
-
-                markdown = ''
-                if hasattr(scraped, 'markdown') and scraped.markdown:
-                    markdown = scraped.markdown[:40000]
-                elif isinstance(scraped, dict):
-                    markdown = scraped.get('markdown', '')[:40000]
-                if markdown:
-                    page_images = _extract_all_image_urls(markdown, url)
-                    all_discovered_images.extend(page_images)
-                    page_pdfs = _extract_pdf_links(markdown, url)
-                    all_pdf_links.extend(page_pdfs)
-                    append_log(product_id, {
-                        "timestamp": datetime.now().isoformat(),
-                        "phase": "extract", "step": "retry_success", "status": "success",
-                        "details": f"Retry scrape succeeded for {_shorten_url(url)}"
-                    })
-            except Exception as retry_e:
-                append_log(product_id, {
-                    "timestamp": datetime.now().isoformat(),
-                    "phase": "extract", "step": "scrape_error", "status": "error",
-                    "details": f"Failed {_shorten_url(url)} after retry: {retry_e}"
-                })
-
-    # ── Scrape-only: Cache third-party pages for potential gap fill ─────
-    if urls_to_cache_only:
-        logger.info(f"[Product {product_id}]   Caching {len(urls_to_cache_only)} third-party pages for gap fill...")
-        update_step(product_id, "extracting", f"Caching {len(urls_to_cache_only)} third-party pages...")
-
-        for result in urls_to_cache_only:
-            tp_url = result['url']
-            source_type_by_url[tp_url] = 'third_party'
-            try:
-                scraped = firecrawl.scrape(tp_url, formats=['markdown'])
-
-                if cost_tracker:
-                    cost_tracker.add_api_call("firecrawl", credits=1, phase="extract_scrape_cache")
-
-                tp_markdown = ''
-                if hasattr(scraped, 'markdown') and scraped.markdown:
-                    tp_markdown = scraped.markdown[:40000]
-                elif isinstance(scraped, dict):
-                    tp_markdown = scraped.get('markdown', '')[:40000]
-
-                save_scraped_page(product_id, tp_url, 'third_party', tp_markdown if tp_markdown else None, success=bool(tp_markdown))
-
-                if tp_markdown:
-                    # Extract images and PDFs from third-party pages (regex, no LLM cost)
-                    page_images = _extract_all_image_urls(tp_markdown, tp_url)
-                    all_discovered_images.extend(page_images)
-                    page_pdfs = _extract_pdf_links(tp_markdown, tp_url)
-                    all_pdf_links.extend(page_pdfs)
+    # Optional: start scraping the gap-fill candidates in the background
+    # (GAP_FILL_PREFETCH). Only the graph sets prefetch_gap_fill — the
+    # standalone /extract endpoint has no gap_fill step to consume them.
+    if state.get("prefetch_gap_fill"):
+        from pipeline.gap_fill import prefetch_third_party_pages
+        prefetch_third_party_pages(
+            product_id, firecrawl, all_results_filtered,
+            exclude={r['url'] for r in urls_to_process}, cost_tracker=cost_tracker,
+        )
 
-                append_log(product_id, {
-                    "timestamp": datetime.now().isoformat(),
-                    "phase": "extract", "step": "scrape_cache", "status": "success" if tp_markdown else "warning",
-                    "details": f"Cached {_shorten_url(tp_url)} ({len(tp_markdown)} chars)" if tp_markdown else f"No content from {_shorten_url(tp_url)}"
-                })
-            except Exception as e:
-                save_scraped_page(product_id, tp_url, 'third_party', None, success=False)
-                logger.warning(f"[Product {product_id}]   Cache scrape failed for {_shorten_url(tp_url)}: {e}")
-                append_log(product_id, {
-                    "timestamp": datetime.now().isoformat(),
-                    "phase": "extract", "step": "scrape_cache", "status": "error",
-                    "details": f"Cache scrape failed for {_shorten_url(tp_url)}: {e}"
-                })
+    # ── Fan out: scrape + extract every URL concurrently ──────────────────
+    # Each URL runs Pass 1 → Pass 2 as soon as its own markdown arrives
+    # (Pass 2 still follows Pass 1 so it gets the Mode B cache hit).
+    # Concurrency is bounded by the shared firecrawl_scrape / llm rate
+    # limiters. gather() returns outcomes in input order, so the merge below
+    # is deterministic regardless of completion order.
+    for result in urls_to_process:
+        source_type_by_url[result['url']] = result['source_type']
+
+    total_urls = len(urls_to_process)
+    logger.info(f"[Product {product_id}]   Scraping {total_urls} pages in parallel...")
+    update_step(product_id, "extracting", f"Scraping {total_urls} pages in parallel...")
+
+    url_outcomes: List[_UrlOutcome] = await asyncio.gather(*[
+        _extract_from_url(firecrawl, result, classification, product['ean'], product_id, cost_tracker)
+        for result in urls_to_process
+    ])
+
+    for outcome in url_outcomes:
+        all_discovered_images.extend(outcome.images)
+        all_pdf_links.extend(outcome.pdf_links)
+        if outcome.dimensions is not None:
+            dimension_extractions.append(outcome.dimensions)
+        if outcome.content is not None:
+            content_extractions.append(outcome.content)
+            content_source_urls.append(outcome.url)
+            content_source_types.append(outcome.source_type)
 
     # ── Merge Dimensions ──────────────────────────────────────────────────
     logger.info(f"[Product {product_id}]   Merging data from {len(dimension_extractions)} sources...")
@@ -704,62 +451,17 @@ RULES:
         "details": f"Merged {len(dimension_extractions)} dim + {len(content_extractions)} content sources, {len(unique_images)} images, {len(documents)} docs"
     })
 
-    # ── Deterministic Image Filtering (no AI) ─────────────────────────────
-    if unique_images:
-        update_step(product_id, "extracting", f"🖼️ Filtering {len(unique_images)} images (HTTP check)...")
-        cleaned_images = await _filter_images_deterministic(unique_images, product_id)
-        merged.image_urls = cleaned_images
-    else:
-        merged.image_urls = []
-
-    # Validate primary image
-    if merged.image_url and merged.image_url.value:
-        image_url_str = str(merged.image_url.value).lower()
-        if not _is_valid_image_url(image_url_str) or (merged.image_urls and str(merged.image_url.value) not in merged.image_urls):
-            merged.image_url.value = None
-            merged.image_url.confidence = 'not_found'
-
-    # If no primary image but cleaned images exist, use first one
-    if (not merged.image_url or not merged.image_url.value) and merged.image_urls:
-        merged.image_url = EnrichedField(
-            value=merged.image_urls[0],
-            confidence="third_party",
-            notes="Auto-selected from verified product images"
-        )
-
-    # ── Gap Fill: Country of Origin ───────────────────────────────────────
-    if (merged.country_of_origin is None or
-            merged.country_of_origin.value is None or
-            merged.country_of_origin.confidence == 'not_found'):
-        update_step(product_id, "extracting", "Searching for country of origin...")
-        coo_result = await _fill_country_of_origin(classification.brand, product['ean'], product_id, cost_tracker)
-        if coo_result:
-            merged.country_of_origin = coo_result
-
-    # ── Gap Fill: Color (Gemini Vision — single call) ─────────────────────
-    if (merged.color is None or
-            merged.color.value is None or
-            merged.color.confidence == 'not_found'):
-        image_for_color = None
-        if merged.image_url and merged.image_url.value:
-            image_for_color = str(merged.image_url.value)
-
-        if image_for_color:
-            logger.info(f"[Product {product_id}]   🔍 Calling Gemini Vision for color detection...")
-            update_step(product_id, "extracting", "🔍 Gemini Vision: detecting color...")
-            color_result = _fill_color_gemini(image_for_color, product_id, cost_tracker)
-            if color_result:
-                merged.color = color_result
-            else:
-                color_result = _fill_color_from_name(product['product_name'], product_id)
-                if color_result:
-                    merged.color = color_result
-        else:
-            color_result = _fill_color_from_name(product['product_name'], product_id)
-            if color_result:
-                merged.color = color_result
+    # ── Post-extraction sub-tasks ─────────────────────────────────────────
+    # Images → primary image → color (color needs the filtered images) runs
+    # concurrently with the COO lookup (Tavily + Claude), which needs neither.
+    # Each branch writes different fields of `merged`.
+    await asyncio.gather(
+        _finish_images_and_color(merged, unique_images, product['product_name'], product_id, cost_tracker),
+        _finish_country_of_origin(merged, classification.brand, product['ean'], product_id, cost_tracker),
+    )
 
     # ── Save ──────────────────────────────────────────────────────────────
+    await aflush_writes()  # queued step updates land before current_step is set here
     conn = get_db_connection()
     conn.execute(
         "UPDATE products SET extraction_result = ?, current_step = 'Extraction complete', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
@@ -771,6 +473,245 @@ RULES:
     return {}
 
 
+# ─── Per-URL Scrape + Extraction ──────────────────────────────────────────────
+
+@dataclass
+class _UrlOutcome:
+    """Everything one URL contributed to the merge (collected in input order)."""
+    url: str
+    source_type: str
+    images: List[str] = field(default_factory=list)
+    pdf_links: List[Dict[str, str]] = field(default_factory=list)
+    dimensions: DimensionsExtraction | None = None
+    content: ContentExtraction | None = None
+
+
+async def _extract_from_url(
+    firecrawl: FirecrawlApp,
+    result: dict,
+    classification: ProductClassification,
+    ean: str,
+    product_id: int,
+    cost_tracker=None,
+) -> _UrlOutcome:
+    """Scrape one manufacturer/authorized URL, then run Pass 1 and Pass 2 on its markdown."""
+    url = result['url']
+    source_type = result['source_type']
+    outcome = _UrlOutcome(url=url, source_type=source_type)
+
+    try:
+        logger.info(f"[Product {product_id}]   Scraping {_shorten_url(url)} ({source_type})...")
+        update_step(product_id, "extracting", f"Scraping {_shorten_url(url)}...")
+
+        markdown, from_cache = await fetch_page(firecrawl, url)
+
+        # Track Firecrawl cost
+        track_scrape(cost_tracker, from_cache, "extract_scrape")
+
+        # Cache the scraped page for potential gap-fill use
+        save_scraped_page(product_id, url, source_type, markdown if markdown else None, success=bool(markdown))
+
+        if not markdown:
+            append_log(product_id, {
+                "timestamp": datetime.now().isoformat(),
+                "phase": "extract", "step": f"scrape_{url}", "status": "warning",
+                "details": f"No content from {url}"
+            })
+            return outcome
+
+        # Extract images and PDF links from this page
+        outcome.images.extend(_extract_all_image_urls(markdown, url))
+        outcome.pdf_links.extend(_extract_pdf_links(markdown, url))
+
+        # Determine confidence level based on source type (three-tier)
+        if source_type == "manufacturer":
+            confidence_level = "official"
+        elif source_type == "authorized_distributor":
+            confidence_level = "authorized"
+        else:
+            confidence_level = "third_party"
+
+        # Shared system preamble for both passes (must be identical for cache hit)
+        # The scraped markdown goes into cached_content, shared between Pass 1 and Pass 2.
+        # Pass-specific instructions go into the user message.
+        extraction_preamble = f"""You are a product data extraction assistant analyzing a scraped product page.
+Source URL: {url}
+Source type: {source_type} (confidence level: {confidence_level})
+Product: {classification.brand} {classification.model_number} (EAN: {ean})
+
+The full page content is provided below. Follow the extraction instructions in the user message."""
+
+        # Use the same truncation for both passes so the cached prefix matches exactly
+        page_content = markdown[:30000]
+
+        # ── Pass 1: Structured Dimensions ─────────────────────────────────
+        logger.info(f"[Product {product_id}]   Pass 1: Structured extraction from {_shorten_url(url)}...")
+        update_step(product_id, "extracting", f"Pass 1: Dimensions from {_shorten_url(url)}...")
+
+        pass1_user = f"""Extract PHYSICAL PRODUCT DATA from the page content above.
+
+EXTRACT NET (product itself) AND PACKAGED (with box/packaging) dimensions separately.
+Many product pages list both — look for labels like "Net weight", "Package weight", "Brutto/Netto",
+"Teža izdelka / Teža paketa", "Product dimensions / Package dimensions".
+
+For each dimension field:
+- value: The numeric value (e.g. 45.2). NO UNITS in the value.
+- unit: The original unit (cm, mm, kg, g, L, mL, etc.)
+- confidence: "{confidence_level}"
+- source_url: "{url}"
+
+Also extract:
+- color: The product's primary color.
+- country_of_origin: Manufacturing country if mentioned.
+- Extract the highest-resolution PRODUCT IMAGE URL (not PDFs, icons, or logos).
+- image_urls: List ALL product image URLs found on the page."""
+
+        try:
+            dim_extraction, usage = await aclassify_with_schema(
+                prompt=pass1_user,
+                system=extraction_preamble,
+                schema=DimensionsExtraction,
+                model="haiku",
+                return_usage=True,
+                cached_content=page_content,
+                max_tokens=4096,
+            )
+            outcome.dimensions = dim_extraction
+
+            # Track cost (with cache metrics)
+            if cost_tracker:
+                cost_tracker.add_llm_usage(usage, phase="extract_pass1")
+
+            # Collect LLM-extracted images
+            if dim_extraction.image_urls:
+                for img in dim_extraction.image_urls:
+                    if _is_valid_image_url(img):
+                        outcome.images.append(img)
+
+            append_log(product_id, {
+                "timestamp": datetime.now().isoformat(),
+                "phase": "extract", "step": "pass1_structured", "status": "success",
+                "details": f"Pass 1 done for {_shorten_url(url)} ({source_type})",
+                "credits_used": {"claude_in": usage["input_tokens"], "claude_out": usage["output_tokens"],
+                                 "cache_read": usage.get("cache_read_input_tokens", 0)}
+            })
+        except Exception as e:
+            logger.warning(f"[Product {product_id}]   Pass 1 failed for {_shorten_url(url)}: {e}")
+            append_log(product_id, {
+                "timestamp": datetime.now().isoformat(),
+                "phase": "extract", "step": "pass1_structured", "status": "error",
+                "details": f"Pass 1 failed for {_shorten_url(url)}: {e}"
+            })
+
+        # ── Pass 2: Content Extraction ────────────────────────────────────
+        # Uses the same system preamble + page_content as Pass 1 → cache HIT on the markdown
+        logger.info(f"[Product {product_id}]   Pass 2: Content extraction from {_shorten_url(url)}...")
+        update_step(product_id, "extracting", f"Pass 2: Content from {_shorten_url(url)}...")
+
+        pass2_user = f"""Extract technical content and description MARKERS from the page content above.
+
+1. SHORT DESCRIPTION (markers only):
+   The brief product summary, usually 1-2 sentences near the top of the product page.
+   Return ONLY the first ~50 characters as short_description_start
+   and the last ~50 characters as short_description_end.
+   These markers will be used to locate the full text in the raw page content.
+   Do NOT return the full description text.
+
+2. MARKETING DESCRIPTION (markers only):
+   The longer marketing/promotional text describing product features and benefits.
+   Return ONLY the first ~50 characters as marketing_description_start
+   and the last ~50 characters as marketing_description_end.
+   These markers will be used to locate the full text in the raw page content.
+   Do NOT return the full description text.
+
+3. FEATURES:
+   A list of product features/highlights. Often presented as bullet points on the page.
+   Extract each feature as a separate string. Keep original language.
+
+4. TECHNICAL SPECIFICATIONS:
+   ALL key-value pairs from specification/technical data tables on the page.
+   Common examples: motor power, voltage, RPM, cutting width, tank capacity, noise level,
+   blade length, cable length, speed settings, battery info, etc.
+   For each spec: name (exactly as shown), value (exactly as shown), unit (if separate).
+   Set confidence to "{confidence_level}" and source_url to "{url}".
+
+5. WARRANTY:
+   Look for warranty terms: "garancija", "Garantie", "warranty", "jamstvo", "garanzia".
+   Extract duration (e.g., "2 years", "24 mesecev"), type, and any conditions.
+
+RULES:
+- DO NOT fabricate content. Only extract what is actually on the page.
+- For descriptions, return EXACT text from the page as markers (copy-paste, not paraphrased).
+- Keep original language text (Slovenian, German, English, etc.) — do NOT translate.
+- If a field is not present on the page, leave it empty."""
+
+        try:
+            content_extraction, usage = await aclassify_with_schema(
+                prompt=pass2_user,
+                system=extraction_preamble,
+                schema=ContentExtraction,
+                model="haiku",
+                return_usage=True,
+                cached_content=page_content,
+                max_tokens=4096,  # Reduced: descriptions use markers now, not full text
+            )
+            outcome.content = content_extraction
+
+            # Track cost (with cache metrics)
+            if cost_tracker:
+                cost_tracker.add_llm_usage(usage, phase="extract_pass2")
+
+            spec_count = len(content_extraction.technical_specs)
+            feat_count = len(content_extraction.features)
+            logger.info(f"[Product {product_id}]   Pass 2 done: {spec_count} specs, {feat_count} features")
+
+            append_log(product_id, {
+                "timestamp": datetime.now().isoformat(),
+                "phase": "extract", "step": "pass2_content", "status": "success",
+                "details": f"Pass 2 done for {_shorten_url(url)}: {spec_count} tech specs, {feat_count} features, warranty={bool(content_extraction.warranty_duration)}",
+                "credits_used": {"claude_in": usage["input_tokens"], "claude_out": usage["output_tokens"],
+                                 "cache_read": usage.get("cache_read_input_tokens", 0)}
+            })
+        except Exception as e:
+            logger.warning(f"[Product {product_id}]   Pass 2 failed for {_shorten_url(url)}: {e}")
+            append_log(product_id, {
+                "timestamp": datetime.now().isoformat(),
+                "phase": "extract", "step": "pass2_content", "status": "error",
+                "details": f"Pass 2 failed for {_shorten_url(url)}: {e}"
+            })
+
+        # Mark page as extracted in cache (even if one pass failed)
+        mark_page_extracted(product_id, url)
+
+    except Exception as e:
+        logger.warning(f"[Product {product_id}]   Scrape failed for {_shorten_url(url)}: {e}, retrying...")
+        # Retry once
+        try:
+            update_step(product_id, "extracting", f"Retrying {_shorten_url(url)}...")
+            await asyncio.sleep(3)
+            markdown, from_cache = await fetch_page(firecrawl, url)
+
+            # Track retry scrape cost
+            track_scrape(cost_tracker, from_cache, "extract_scrape_retry")
+
+            if markdown:
+                outcome.images.extend(_extract_all_image_urls(markdown, url))
+                outcome.pdf_links.extend(_extract_pdf_links(markdown, url))
+                append_log(product_id, {
+                    "timestamp": datetime.now().isoformat(),
+                    "phase": "extract", "step": "retry_success", "status": "success",
+                    "details": f"Retry scrape succeeded for {_shorten_url(url)}"
+                })
+        except Exception as retry_e:
+            append_log(product_id, {
+                "timestamp": datetime.now().isoformat(),
+                "phase": "extract", "step": "scrape_error", "status": "error",
+                "details": f"Failed {_shorten_url(url)} after retry: {retry_e}"
+            })
+
+    return outcome
+
+
 # ─── Merge Helpers ────────────────────────────────────────────────────────────
 
 def _pick_best_field(fields: List[EnrichedField]) -> EnrichedField:
@@ -1100,6 +1041,80 @@ def _merge_warranty(
     return warranty
 
 
+# ─── Post-Extraction Sub-Tasks ────────────────────────────────────────────────
+
+async def _finish_images_and_color(
+    merged: EnrichedProduct,
+    unique_images: List[str],
+    product_name: str,
+    product_id: int,
+    cost_tracker=None,
+) -> None:
+    """Filter images, settle the primary image, then fill color from it (in place)."""
+    # ── Deterministic Image Filtering (no AI) ─────────────────────────────
+    if unique_images:
+        update_step(product_id, "extracting", f"🖼️ Filtering {len(unique_images)} images (HTTP check)...")
+        cleaned_images = await _filter_images_deterministic(unique_images, product_id)
+        merged.image_urls = cleaned_images
+    else:
+        merged.image_urls = []
+
+    # Validate primary image
+    if merged.image_url and merged.image_url.value:
+        image_url_str = str(merged.image_url.value).lower()
+        if not _is_valid_image_url(image_url_str) or (merged.image_urls and str(merged.image_url.value) not in merged.image_urls):
+            merged.image_url.value = None
+            merged.image_url.confidence = 'not_found'
+
+    # If no primary image but cleaned images exist, use first one
+    if (not merged.image_url or not merged.image_url.value) and merged.image_urls:
+        merged.image_url = EnrichedField(
+            value=merged.image_urls[0],
+            confidence="third_party",
+            notes="Auto-selected from verified product images"
+        )
+
+    # ── Gap Fill: Color (Gemini Vision — single call) ─────────────────────
+    if (merged.color is None or
+            merged.color.value is None or
+            merged.color.confidence == 'not_found'):
+        image_for_color = None
+        if merged.image_url and merged.image_url.value:
+            image_for_color = str(merged.image_url.value)
+
+        if image_for_color:
+            logger.info(f"[Product {product_id}]   🔍 Calling Gemini Vision for color detection...")
+            update_step(product_id, "extracting", "🔍 Gemini Vision: detecting color...")
+            color_result = await asyncio.to_thread(_fill_color_gemini, image_for_color, product_id, cost_tracker)
+            if color_result:
+                merged.color = color_result
+            else:
+                color_result = _fill_color_from_name(product_name, product_id)
+                if color_result:
+                    merged.color = color_result
+        else:
+            color_result = _fill_color_from_name(product_name, product_id)
+            if color_result:
+                merged.color = color_result
+
+
+async def _finish_country_of_origin(
+    merged: EnrichedProduct,
+    brand: str | None,
+    ean: str,
+    product_id: int,
+    cost_tracker=None,
+) -> None:
+    """Fill country of origin via brand lookup if extraction didn't find it (in place)."""
+    if (merged.country_of_origin is None or
+            merged.country_of_origin.value is None or
+            merged.country_of_origin.confidence == 'not_found'):
+        update_step(product_id, "extracting", "Searching for country of origin...")
+        coo_result = await _fill_country_of_origin(brand, ean, product_id, cost_tracker)
+        if coo_result:
+            merged.country_of_origin = coo_result
+
+
 # ─── Deterministic Image Filtering ───────────────────────────────────────────
 
 async def _filter_images_deterministic(
@@ -1273,17 +1288,30 @@ def _fill_color_from_name(product_name: str, product_id: int) -> EnrichedField |
     return None
 
 
+@dataclass
+class _CooSearch:
+    """One brand's COO search, shared by every product that joined it. Its
+    spend and log entry go to the first product that consumes it (claimed)."""
+    result: EnrichedField | None = None
+    credits: Dict[str, int] = field(default_factory=dict)
+    usage: dict | None = None
+    error: str | None = None
+    claimed: bool = False
+
+
 async def _fill_country_of_origin(brand: str | None, ean: str, product_id: int, cost_tracker=None) -> EnrichedField | None:
     """Specialized search for country of origin. Checks brand_coo_cache first."""
-    if not brand:
+    if not brand or not brand.strip():
         return None
+    brand = brand.strip()
+    brand_key = brand.lower()  # brand_coo_cache key and single-flight key
 
     # ── Check brand COO cache first ──────────────────────────────────────
     try:
         conn = get_db_connection()
         cached = conn.execute(
             "SELECT country_of_origin, confidence FROM brand_coo_cache WHERE brand = ?",
-            (brand,)
+            (brand_key,)
         ).fetchone()
         conn.close()
 
@@ -1303,18 +1331,64 @@ async def _fill_country_of_origin(brand: str | None, ean: str, product_id: int,
         logger.warning(f"[Product {product_id}]   COO cache lookup failed: {cache_err}")
 
     # ── Cache miss — search via Tavily + Claude ──────────────────────────
+    # Products of the same brand missing the cache at the same time share one
+    # search. The first of them to get the answer is charged and logged for
+    # it — normally the one that started it, unless that run was cancelled —
+    # the others record what it spent as saved.
+    search, _ = await get_single_flight("coo").do(
+        brand_key, lambda: _search_country_of_origin(brand, brand_key, ean)
+    )
+    result = search.result.model_copy() if search.result else None
+    if search.claimed:
+        if cost_tracker:
+            cost_tracker.add_shared_call("extract_coo", search.credits, search.usage)
+        append_log(product_id, {
+            "timestamp": datetime.now().isoformat(),
+            "phase": "extract", "step": "country_of_origin_shared", "status": "success" if result else "warning",
+            "details": f"COO from concurrent lookup: {brand} → {result.value if result else 'not found'}"
+        })
+        return result
+    search.claimed = True
+
+    if cost_tracker:
+        if search.credits.get("tavily"):
+            cost_tracker.add_api_call("tavily", credits=search.credits["tavily"], phase="extract_coo")
+        if search.usage:
+            cost_tracker.add_llm_usage(search.usage, phase="extract_coo")
+    if search.error:
+        append_log(product_id, {
+            "timestamp": datetime.now().isoformat(),
+            "phase": "extract", "step": "country_of_origin_search", "status": "error",
+            "details": search.error
+        })
+    elif search.usage:
+        append_log(product_id, {
+            "timestamp": datetime.now().isoformat(),
+            "phase": "extract", "step": "country_of_origin_search", "status": "success",
+            "details": f"COO: {result.value} ({result.confidence})" if result else "COO: not found",
+            "credits_used": {
+                "tavily": search.credits.get("tavily", 0),
+                "claude_in": search.usage["input_tokens"], "claude_out": search.usage["output_tokens"],
+            }
+        })
+    return result
+
+
+async def _search_country_of_origin(brand: str, brand_key: str, ean: str) -> _CooSearch:
+    """Tavily search + Claude call for a brand's country of origin; caches the
+    answer under brand_key. Runs as a shared task, so it records nothing on a
+    product — the caller that claims the returned _CooSearch does."""
+    search = _CooSearch()
     tavily_key = os.getenv("TAVILY_API_KEY")
     if not tavily_key:
-        return None
+        return search
 
     try:
         client = TavilyClient(api_key=tavily_key)
         query = f"{brand} country of origin manufacturing"
-        response = client.search(query=query, max_results=5)
-
-        # Track Tavily cost
-        if cost_tracker:
-            cost_tracker.add_api_call("tavily", credits=1, phase="extract_coo")
+        async with get_rate_limiter("tavily").throttle():
+            response = await asyncio.to_thread(client.search, query=query, max_results=5)
+        search.credits["tavily"] = 1
 
         snippets = "\n".join([
             f"- {r['title']}: {r.get('content', '')[:300]}"
@@ -1322,13 +1396,13 @@ async def _fill_country_of_origin(brand: str | None, ean: str, product_id: int,
         ])
 
         if not snippets:
-            return None
+            return search
 
         system_prompt = """Determine the country of origin (manufacturing country) for this product.
 If you find it, set confidence to "third_party" if from a reliable source, "inferred" if guessing from brand info.
 If you cannot determine, return value as null."""
 
-        result, usage = classify_with_schema(
+        result, search.usage = await aclassify_with_schema(
             prompt=f"Brand: {brand}\nEAN: {ean}\n\nSearch results:\n{snippets}",
             system=system_prompt,
             schema=EnrichedField,
@@ -1336,42 +1410,23 @@ If you cannot determine, return value as null."""
             return_usage=True
         )
 
-        # Track Claude cost (with cache metrics)
-        if cost_tracker:
-            cost_tracker.add_llm_call(
-                usage["model"], usage["input_tokens"], usage["output_tokens"],
-                phase="extract_coo",
-                cache_creation_input_tokens=usage.get("cache_creation_input_tokens", 0),
-                cache_read_input_tokens=usage.get("cache_read_input_tokens", 0),
-            )
-
-        append_log(product_id, {
-            "timestamp": datetime.now().isoformat(),
-            "phase": "extract", "step": "country_of_origin_search", "status": "success",
-            "details": f"COO: {result.value} ({result.confidence})",
-            "credits_used": {"tavily": 1, "claude_in": usage["input_tokens"], "claude_out": usage["output_tokens"]}
-        })
-
         # ── Write to brand COO cache ─────────────────────────────────────
         if result.value:
+            search.result = result
             try:
                 conn = get_db_connection()
                 conn.execute(
                     "INSERT OR REPLACE INTO brand_coo_cache (brand, country_of_origin, confidence) VALUES (?, ?, ?)",
-                    (brand, result.value, result.confidence)
+                    (brand_key, result.value, result.confidence)
                 )
                 conn.commit()
                 conn.close()
-                logger.info(f"[Product {product_id}]   COO cached: {brand} → {result.value}")
+                logger.info(f"  COO cached: {brand} → {result.value}")
             except Exception as cache_write_err:
-                logger.warning(f"[Product {product_id}]   COO cache write failed: {cache_write_err}")
+                logger.warning(f"  COO cache write failed for {brand}: {cache_write_err}")
 
-        return result if result.value else None
+        return search
 
     except Exception as e:
-        append_log(product_id, {
-            "timestamp": datetime.now().isoformat(),
-            "phase": "extract", "step": "country_of_origin_search", "status": "error",
-            "details": str(e)
-        })
-        return None
+        search.error = str(e)
+        return search
@@ -1,26 +1,48 @@
 """
 Pipeline Node: Gap Fill (Phase 4.5)
 
-Fills critical data gaps using cached third-party pages from the scraped_pages table.
-Only runs if validation identified critical missing fields AND third-party pages are cached.
+Fills critical data gaps from third-party pages found by the search phase.
+Extraction no longer scrapes these pages up front: they are fetched here, on
+demand, and only when critical fields are missing.
 
 Strategy:
   1. Load extraction_result, identify critical gaps
-  2. If no gaps or no cached third-party pages -> return immediately (zero cost)
-  3. Run a single targeted LLM call per third-party page using GapFillExtraction schema
-  4. Merge gap-filled data into extraction_result (never overwrite existing data)
-  5. Normalize any gap-filled dimensions
-  6. Early exit: stop checking pages once all gaps are filled
-
-Tools: Claude Haiku 4.5 (1 call per page, targeted extraction)
+  2. If no gaps or no third-party candidates -> return immediately (zero cost)
+  3. Fetch candidate pages one at a time in search order (page cache / Firecrawl)
+  4. Run a single targeted LLM call per page using GapFillExtraction schema
+  5. Early exit: stop fetching pages once all gaps are filled
+  6. Merge gap-filled data into extraction_result (never overwrite existing data)
+  7. Normalize any gap-filled dimensions
+
+With GAP_FILL_PREFETCH on, extract_node starts scraping the candidates in the
+background so a product with gaps doesn't wait on Firecrawl here. Prefetches
+still waiting for a rate limiter slot are cancelled when they aren't needed.
+
+With GAP_FILL_PARALLEL on, steps 3-4 run for all candidates at once: results
+are checked as they land and the remaining pages are cancelled once every gap
+is covered. Results are still merged in search order, so ties resolve the
+same way as in the sequential loop.
+
+Tools: Firecrawl (up to 3 scrapes), Claude Haiku 4.5 (1 call per page, targeted extraction)
+
+Config:
+    GAP_FILL_PREFETCH — scrape third-party candidates during extraction (default: false)
+    GAP_FILL_PARALLEL — fetch + extract all candidate pages concurrently (default: false)
 """
 
+import os
 import json
+import asyncio
 import logging
 from datetime import datetime
-from db import get_db_connection, update_step, append_log, get_scraped_pages, mark_page_gap_filled
-from utils.llm import classify_with_schema
+from firecrawl import FirecrawlApp
+from db import (
+    get_db_connection, update_step, append_log, get_scraped_pages,
+    save_scraped_page, mark_page_gap_filled,
+)
+from utils.llm import aclassify_with_schema
 from utils.normalization import normalize_dimension_set
+from utils.scrape import fetch_page, track_scrape
 from schemas import (
     EnrichedProduct, ProductClassification, EnrichedField,
     GapFillExtraction, WarrantyInfo,
@@ -28,6 +50,12 @@ from schemas import (
 
 logger = logging.getLogger("pipeline.gap_fill")
 
+GAP_FILL_PREFETCH = os.getenv("GAP_FILL_PREFETCH", "false").lower() == "true"
+GAP_FILL_PARALLEL = os.getenv("GAP_FILL_PARALLEL", "false").lower() == "true"
+
+# Third-party pages considered per product
+GAP_FILL_MAX_PAGES = 3
+
 
 # ─── Critical Gap Definitions ────────────────────────────────────────────────
 # Only these fields trigger gap-fill. Others (net dims, marketing desc,
@@ -206,11 +234,255 @@ def _merge_gap_fill(
     return filled
 
 
+# ─── Third-Party Page Fetching ───────────────────────────────────────────────
+
+def _third_party_candidates(search_results: list[dict], exclude: set[str]) -> list[str]:
+    """Third-party URLs from the search results, in search order, skipping
+    pages that main extraction already used."""
+    urls = [
+        r['url'] for r in search_results
+        if r.get('source_type') == 'third_party' and r['url'] not in exclude
+    ]
+    return list(dict.fromkeys(urls))[:GAP_FILL_MAX_PAGES]
+
+
+async def _fetch_third_party_page(
+    firecrawl: FirecrawlApp,
+    url: str,
+    product_id: int,
+    cost_tracker=None,
+    on_start=None,
+) -> str | None:
+    """Scrape a third-party page and record it in scraped_pages. Returns the
+    markdown, or None if the scrape failed or the page was empty."""
+    try:
+        markdown, from_cache = await fetch_page(firecrawl, url, on_start=on_start)
+
+        track_scrape(cost_tracker, from_cache, "gap_fill_scrape")
+
+        save_scraped_page(product_id, url, 'third_party', markdown if markdown else None, success=bool(markdown))
+
+        append_log(product_id, {
+            "timestamp": datetime.now().isoformat(),
+            "phase": "gap_fill", "step": "scrape", "status": "success" if markdown else "warning",
+            "details": f"Fetched {url[:60]} ({len(markdown)} chars)" if markdown else f"No content from {url[:60]}"
+        })
+        return markdown or None
+    except Exception as e:
+        save_scraped_page(product_id, url, 'third_party', None, success=False)
+        logger.warning(f"[Product {product_id}]   Third-party scrape failed for {url[:50]}: {e}")
+        append_log(product_id, {
+            "timestamp": datetime.now().isoformat(),
+            "phase": "gap_fill", "step": "scrape", "status": "error",
+            "details": f"Scrape failed for {url[:60]}: {e}"
+        })
+        return None
+
+
+class _PageFetch:
+    """A third-party scrape running as its own task (prefetch or on-demand).
+    started is set once it holds a Firecrawl slot — from then on it is
+    spending a credit, so it is awaited rather than cancelled."""
+
+    def __init__(self, firecrawl: FirecrawlApp, url: str, product_id: int, cost_tracker):
+        self.started = False
+        self.task = asyncio.create_task(
+            _fetch_third_party_page(firecrawl, url, product_id, cost_tracker, on_start=self._on_start)
+        )
+
+    def _on_start(self):
+        self.started = True
+
+
+# product_id → {url: _PageFetch}; a finished prefetch removes itself (its page
+# is then in scraped_pages), gap_fill_node takes over whatever is still running.
+_prefetches: dict[int, dict[str, _PageFetch]] = {}
+
+
+def prefetch_third_party_pages(
+    product_id: int,
+    firecrawl: FirecrawlApp,
+    search_results: list[dict],
+    exclude: set[str],
+    cost_tracker=None,
+):
+    """Start background scrapes of the gap-fill candidates (no-op unless
+    GAP_FILL_PREFETCH is on). Must be called from the pipeline event loop."""
+    if not GAP_FILL_PREFETCH:
+        return
+    urls = _third_party_candidates(search_results, exclude)
+    if not urls:
+        return
+
+    pending = _prefetches.setdefault(product_id, {})
+    for url in urls:
+        if url in pending:
+            continue
+        prefetch = _PageFetch(firecrawl, url, product_id, cost_tracker)
+        pending[url] = prefetch
+
+        def _done(_task, url=url, prefetch=prefetch):
+            entries = _prefetches.get(product_id)
+            if entries and entries.get(url) is prefetch:
+                del entries[url]
+                if not entries:
+                    del _prefetches[product_id]
+        prefetch.task.add_done_callback(_done)
+
+    logger.info(f"[Product {product_id}]   Prefetching {len(urls)} third-party page(s) for gap fill")
+
+
+def discard_prefetches(product_id: int):
+    """Cancel and forget any prefetches still registered for product_id —
+    called when a run ends, so a run that never reached gap_fill (error,
+    crash) doesn't leave its scrapes behind."""
+    prefetches = _prefetches.pop(product_id, None)
+    if not prefetches:
+        return
+    for prefetch in prefetches.values():
+        prefetch.task.cancel()
+    logger.info(f"[Product {product_id}]   Discarded {len(prefetches)} unused prefetch(es)")
+
+
+async def _settle_prefetches(product_id: int, prefetches: dict[str, _PageFetch]):
+    """Cancel page fetches that haven't reached Firecrawl yet and wait for the
+    rest, so every credit spent is tracked before costs are saved."""
+    cancelled = 0
+    running = []
+    for prefetch in prefetches.values():
+        if prefetch.task.done():
+            continue
+        if prefetch.started:
+            running.append(prefetch.task)
+        else:
+            prefetch.task.cancel()
+            cancelled += 1
+    if cancelled:
+        logger.info(f"[Product {product_id}]   Cancelled {cancelled} unused third-party page fetch(es)")
+    if running:
+        await asyncio.gather(*running, return_exceptions=True)
+
+
+# ─── Gap Fill Extraction ─────────────────────────────────────────────────────
+
+def _build_gap_fill_system(classification: ProductClassification, ean: str) -> str:
+    """Static system prompt — identical across all pages → cached after first call."""
+    return f"""You are a product data extraction assistant.
+Product: {classification.brand} {classification.model_number} (EAN: {ean})
+You will receive scraped third-party page content and instructions to extract specific missing fields.
+If a field is not found on the page, leave it as the default (null/empty)."""
+
+
+async def _gap_fill_page(
+    product_id: int,
+    url: str,
+    markdown: str,
+    gaps: list[str],
+    system: str,
+    cost_tracker=None,
+) -> GapFillExtraction | None:
+    """One targeted GapFillExtraction call on a page. Returns None on failure."""
+    page_content = markdown[:30000]  # Same truncation as main extract
+    confidence_level = "third_party"
+
+    gap_prompt = _build_gap_fill_prompt(gaps, confidence_level, url)
+
+    # User message: page content + extraction instructions (varies per page)
+    user_message = f"""PAGE CONTENT (Source: {url}):
+
+{page_content}
+
+---
+
+{gap_prompt}"""
+
+    try:
+        result, usage = await aclassify_with_schema(
+            prompt=user_message,
+            system=system,
+            schema=GapFillExtraction,
+            model="haiku",
+            return_usage=True,
+            max_tokens=2048,
+        )
+    except Exception as e:
+        logger.warning(f"[Product {product_id}]   Gap fill failed for {url[:50]}: {e}")
+        append_log(product_id, {
+            "timestamp": datetime.now().isoformat(),
+            "phase": "gap_fill", "step": "extract", "status": "error",
+            "details": f"Gap fill failed for {url[:50]}: {e}"
+        })
+        return None
+
+    if cost_tracker:
+        cost_tracker.add_llm_usage(usage, phase="gap_fill")
+
+    mark_page_gap_filled(product_id, url)
+
+    # Summarize what was found
+    found_fields = []
+    if result.net_weight.value is not None:
+        found_fields.append(f"net_weight={result.net_weight.value}")
+    if result.packaged_weight.value is not None:
+        found_fields.append(f"pkg_weight={result.packaged_weight.value}")
+    if result.packaged_height.value is not None:
+        found_fields.append("pkg_dims")
+    if result.warranty_duration:
+        found_fields.append(f"warranty={result.warranty_duration}")
+    if result.short_description:
+        found_fields.append("short_desc")
+
+    found_summary = ", ".join(found_fields) if found_fields else "nothing new"
+
+    logger.info(f"[Product {product_id}]   Gap fill from {url[:50]}: {found_summary}")
+    append_log(product_id, {
+        "timestamp": datetime.now().isoformat(),
+        "phase": "gap_fill", "step": "extract", "status": "success",
+        "details": f"Gap fill from {url[:60]}: {found_summary}",
+        "credits_used": {"claude_in": usage["input_tokens"], "claude_out": usage["output_tokens"]}
+    })
+    return result
+
+
+async def _fill_pages_concurrently(product_id: int, candidates: list[str], gaps: list[str], fill_page) -> list[GapFillExtraction]:
+    """
+    Run fill_page for every candidate at once. Results are checked as they
+    land; once the results so far cover every gap, the pages still running
+    are cancelled. Returns results in candidate (search) order, which is the
+    preference order _merge_gap_fill resolves ties with.
+    """
+    update_step(product_id, "gap_filling", f"Checking {len(candidates)} pages in parallel...")
+    tasks = {asyncio.create_task(fill_page(url)): i for i, url in enumerate(candidates)}
+    results: dict[int, GapFillExtraction] = {}
+    pending = set(tasks)
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                if result is not None:
+                    results[tasks[task]] = result
+
+            if pending and _all_gaps_filled(gaps, list(results.values())):
+                logger.info(
+                    f"[Product {product_id}]   All gaps filled, cancelling {len(pending)} remaining page(s)"
+                )
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    return [results[i] for i in sorted(results)]
+
+
 async def gap_fill_node(state: dict) -> dict:
     """
     LangGraph node: Phase 4.5 -- Gap Fill.
-    Reads cached third-party pages and does targeted extraction for missing critical fields.
-    Only runs if there are critical gaps AND cached third-party pages exist.
+    Fetches third-party pages on demand and does targeted extraction for missing critical fields.
+    Only runs if there are critical gaps AND the search found third-party pages.
     """
     product_id = state["product_id"]
     cost_tracker = state.get("cost_tracker")
@@ -234,10 +506,15 @@ async def gap_fill_node(state: dict) -> dict:
     model = EnrichedProduct.model_validate(extraction_data)
     classification = ProductClassification.model_validate_json(product['classification_result'])
 
+    # Take over any background prefetches before reading scraped_pages: a
+    # prefetch that already finished has saved its page there.
+    prefetches = _prefetches.pop(product_id, {})
+
     # Step 1: Identify critical gaps
     gaps = _identify_gaps(model)
 
     if not gaps:
+        await _settle_prefetches(product_id, prefetches)
         logger.info(f"[Product {product_id}]   No critical gaps found, skipping gap fill")
         append_log(product_id, {
             "timestamp": datetime.now().isoformat(),
@@ -249,28 +526,65 @@ async def gap_fill_node(state: dict) -> dict:
 
     logger.info(f"[Product {product_id}]   Critical gaps found: {', '.join(gaps)}")
 
-    # Step 2: Get cached third-party pages
-    third_party_pages = get_scraped_pages(product_id, source_type='third_party', only_unextracted=True)
-
-    if not third_party_pages:
-        logger.info(f"[Product {product_id}]   No cached third-party pages available for gap fill")
+    # Step 2: Third-party candidates from the search results, minus pages that
+    # main extraction (or an earlier gap fill) already used
+    search_results = json.loads(product['search_result']).get('results', []) if product['search_result'] else []
+    scraped = get_scraped_pages(product_id)
+    used = {p['url'] for p in scraped if p['extracted'] or p['gap_filled']}
+    # A page whose stored version is gone (markdown None) is scraped again
+    cached = {
+        p['url']: p['markdown'] for p in scraped
+        if p['source_type'] == 'third_party' and p['url'] not in used and p['markdown']
+    }
+    candidates = _third_party_candidates(search_results, used)
+    # Pages recorded by a previous run but no longer in the search results
+    candidates = [u for u in cached if u not in candidates] + candidates
+
+    fc_api_key = os.getenv("FIRECRAWL_API_KEY")
+    if not fc_api_key:
+        candidates = [u for u in candidates if u in cached or u in prefetches]
+
+    if not candidates:
+        await _settle_prefetches(product_id, prefetches)
+        logger.info(f"[Product {product_id}]   No third-party pages available for gap fill")
         append_log(product_id, {
             "timestamp": datetime.now().isoformat(),
             "phase": "gap_fill", "step": "check", "status": "warning",
-            "details": f"Gaps found ({', '.join(gaps)}) but no third-party pages cached"
+            "details": f"Gaps found ({', '.join(gaps)}) but no third-party pages available"
         })
         update_step(product_id, "gap_filling", "No third-party pages to check")
         return {}
 
-    update_step(product_id, "gap_filling", f"Filling {len(gaps)} gaps from {len(third_party_pages)} pages...")
+    update_step(product_id, "gap_filling", f"Filling {len(gaps)} gaps from up to {len(candidates)} pages...")
 
     append_log(product_id, {
         "timestamp": datetime.now().isoformat(),
         "phase": "gap_fill", "step": "start", "status": "success",
-        "details": f"Gaps: {', '.join(gaps)} | Pages available: {len(third_party_pages)}"
+        "details": f"Gaps: {', '.join(gaps)} | Pages available: {len(candidates)}"
     })
 
-    # Step 3: Run targeted extraction on each third-party page
+    firecrawl = FirecrawlApp(api_key=fc_api_key) if fc_api_key else None
+
+    async def load_page(url: str) -> str | None:
+        """Markdown for a candidate: already recorded, prefetched, or scraped now.
+        The scrape runs as its own task (shielded), so cancelling a page in
+        parallel mode leaves it to _settle_prefetches."""
+        if url in cached:
+            return cached[url]
+        fetch = prefetches.get(url)
+        if fetch is None:
+            if not GAP_FILL_PARALLEL:
+                update_step(product_id, "gap_filling", f"Fetching {url[:50]}...")
+            fetch = prefetches[url] = _PageFetch(firecrawl, url, product_id, cost_tracker)
+        return await asyncio.shield(fetch.task)
+
+    async def fill_page(url: str) -> GapFillExtraction | None:
+        markdown = await load_page(url)
+        if not markdown or len(markdown) < 100:
+            return None
+        return await _gap_fill_page(product_id, url, markdown, gaps, gap_fill_system, cost_tracker)
+
+    # Step 3: Fetch pages and run targeted extraction on each
     #
     # Caching strategy: Mode A (system prompt cached across pages).
     # The static system prompt + JSON schema is identical for every page in this
@@ -279,90 +593,24 @@ async def gap_fill_node(state: dict) -> dict:
     # AVOIDS the 1.25x cache-write premium that Mode B would charge on 10-30K
     # tokens of markdown per page with no subsequent read.
     gap_fill_results: list[GapFillExtraction] = []
+    gap_fill_system = _build_gap_fill_system(classification, product['ean'])
 
-    # Static system prompt — identical across all pages → cached after first call
-    gap_fill_system = f"""You are a product data extraction assistant.
-Product: {classification.brand} {classification.model_number} (EAN: {product['ean']})
-You will receive scraped third-party page content and instructions to extract specific missing fields.
-If a field is not found on the page, leave it as the default (null/empty)."""
-
-    for page in third_party_pages:
-        url = page['url']
-        markdown = page['markdown']
-
-        if not markdown or len(markdown) < 100:
-            continue
-
-        page_content = markdown[:30000]  # Same truncation as main extract
-        confidence_level = "third_party"
-
-        gap_prompt = _build_gap_fill_prompt(gaps, confidence_level, url)
-
-        # User message: page content + extraction instructions (varies per page)
-        user_message = f"""PAGE CONTENT (Source: {url}):
-
-{page_content}
-
----
-
-{gap_prompt}"""
-
-        try:
-            result, usage = classify_with_schema(
-                prompt=user_message,
-                system=gap_fill_system,
-                schema=GapFillExtraction,
-                model="haiku",
-                return_usage=True,
-                max_tokens=2048,
-            )
-            gap_fill_results.append(result)
-
-            if cost_tracker:
-                cost_tracker.add_llm_call(
-                    usage["model"], usage["input_tokens"], usage["output_tokens"],
-                    phase="gap_fill",
-                    cache_creation_input_tokens=usage.get("cache_creation_input_tokens", 0),
-                    cache_read_input_tokens=usage.get("cache_read_input_tokens", 0),
-                )
-
-            mark_page_gap_filled(product_id, url)
-
-            # Summarize what was found
-            found_fields = []
-            if result.net_weight.value is not None:
-                found_fields.append(f"net_weight={result.net_weight.value}")
-            if result.packaged_weight.value is not None:
-                found_fields.append(f"pkg_weight={result.packaged_weight.value}")
-            if result.packaged_height.value is not None:
-                found_fields.append("pkg_dims")
-            if result.warranty_duration:
-                found_fields.append(f"warranty={result.warranty_duration}")
-            if result.short_description:
-                found_fields.append("short_desc")
-
-            found_summary = ", ".join(found_fields) if found_fields else "nothing new"
-
-            logger.info(f"[Product {product_id}]   Gap fill from {url[:50]}: {found_summary}")
-            append_log(product_id, {
-                "timestamp": datetime.now().isoformat(),
-                "phase": "gap_fill", "step": "extract", "status": "success",
-                "details": f"Gap fill from {url[:60]}: {found_summary}",
-                "credits_used": {"claude_in": usage["input_tokens"], "claude_out": usage["output_tokens"]}
-            })
-
-            # Early exit: if all gaps are now filled, stop processing more pages
-            if _all_gaps_filled(gaps, gap_fill_results):
-                logger.info(f"[Product {product_id}]   All gaps filled, stopping early")
-                break
-
-        except Exception as e:
-            logger.warning(f"[Product {product_id}]   Gap fill failed for {url[:50]}: {e}")
-            append_log(product_id, {
-                "timestamp": datetime.now().isoformat(),
-                "phase": "gap_fill", "step": "extract", "status": "error",
-                "details": f"Gap fill failed for {url[:50]}: {e}"
-            })
+    try:
+        if GAP_FILL_PARALLEL:
+            gap_fill_results = await _fill_pages_concurrently(product_id, candidates, gaps, fill_page)
+        else:
+            for url in candidates:
+                result = await fill_page(url)
+                if result is None:
+                    continue
+                gap_fill_results.append(result)
+
+                # Early exit: if all gaps are now filled, stop fetching more pages
+                if _all_gaps_filled(gaps, gap_fill_results):
+                    logger.info(f"[Product {product_id}]   All gaps filled, stopping early")
+                    break
+    finally:
+        await _settle_prefetches(product_id, prefetches)
 
     # Step 4: Merge gap-filled data into existing extraction result
     if gap_fill_results:
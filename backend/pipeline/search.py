@@ -2,20 +2,181 @@
 Pipeline Node: Search (Phase 2)
 Agent role: Find product pages via web search, classify URLs by source type.
 Tools: Tavily Search, Claude Haiku 4.5
+Search results are served from the persistent search cache when possible.
+All planned queries are issued concurrently; see _run_search_plan.
 """
 
 import os
 import json
+import asyncio
 import logging
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Awaitable, Callable, Optional
 from tavily import TavilyClient
-from db import get_db_connection, update_step, append_log
-from utils.llm import classify_with_schema
+from db import get_db_connection, aflush_writes, update_step, append_log
+from utils.llm import aclassify_with_schema
+from utils.rate_limiter import get_rate_limiter
+from utils.search_cache import cached_search
 from schemas import SearchResultList, ProductClassification
 
 logger = logging.getLogger("pipeline.search")
 
 
+async def _tavily_search(client: TavilyClient, query: str, max_results: int,
+                         include_domains: list[str] | None = None, on_start=None) -> list:
+    """Rate-limited Tavily search, run off the event loop. Returns the result list.
+    on_start is called once a limiter slot is held, right before the request."""
+    kwargs = {"query": query, "max_results": max_results}
+    if include_domains:
+        kwargs["include_domains"] = include_domains
+    async with get_rate_limiter("tavily").throttle():
+        if on_start:
+            on_start()
+        response = await asyncio.to_thread(client.search, **kwargs)
+    return response.get('results', [])
+
+
+def _track_search(cost_tracker, service: str, credits: int, from_cache: bool, phase: str):
+    """Record a provider search — or a search cache hit, which costs nothing."""
+    if not cost_tracker:
+        return
+    if from_cache:
+        cost_tracker.add_cache_hit(service, phase=phase, credits=credits)
+    else:
+        cost_tracker.add_api_call(service, credits=credits, phase=phase)
+
+
+# ─── Concurrent Query Plan ────────────────────────────────────────────────────
+
+@dataclass
+class _PlannedQuery:
+    """One provider search in the plan. fetch(on_start) performs the provider
+    call and calls on_start once it holds a rate limiter slot."""
+    query: str
+    max_results: int
+    include_domains: Optional[list]
+    fetch: Callable[[Callable[[], None]], Awaitable[list]]
+    service: str
+    credits: int
+    phase: str
+    step: str
+    manufacturer_domain: Optional[str] = None
+
+    @property
+    def is_manufacturer(self) -> bool:
+        return self.manufacturer_domain is not None
+
+
+def _search_cutoff(plan: list[_PlannedQuery], results: dict[int, list]) -> int:
+    """
+    Index from which planned queries are no longer needed, decided on the
+    completed prefix of the plan exactly as the old sequential loop did:
+    manufacturer hits → only two general queries; stop after the general
+    query that brings the running total to 6 results.
+    """
+    cutoff = len(plan)
+    total = 0
+    for i, q in enumerate(plan):
+        if i not in results:
+            break
+        total += len(results[i])
+        if q.is_manufacturer:
+            if results[i]:
+                cutoff = min(cutoff, i + 3)
+        elif total >= 6:
+            return min(cutoff, i + 1)
+    return cutoff
+
+
+async def _run_search_plan(product_id: int, plan: list[_PlannedQuery], provider: str, cost_tracker) -> list:
+    """
+    Issue all planned queries at once (each waits its turn on the provider
+    limiter) and merge their results in plan order — manufacturer first.
+
+    Once the cutoff is known, queries still queued on the limiter are
+    cancelled. Queries already sent to the provider are left to finish so
+    their credits are tracked and their results cached, but results past the
+    cutoff are not merged.
+    """
+    started = [False] * len(plan)
+
+    async def run(i: int, q: _PlannedQuery):
+        def on_start():
+            started[i] = True
+        logger.info(
+            f"[Product {product_id}]   "
+            + (f"Phase 1 (manufacturer): '{q.query}' on {q.manufacturer_domain}" if q.is_manufacturer
+               else f"Phase 2 (general): '{q.query}'")
+        )
+        return await cached_search(provider, q.query, q.max_results, q.include_domains, lambda: q.fetch(on_start))
+
+    tasks = [asyncio.create_task(run(i, q)) for i, q in enumerate(plan)]
+    index = {task: i for i, task in enumerate(tasks)}
+    results: dict[int, list] = {}
+    cutoff = len(plan)
+    pending = set(tasks)
+
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.cancelled():
+                continue
+            i = index[task]
+            q = plan[i]
+            if task.exception() is not None:
+                results[i] = []
+                _log_query_failure(product_id, q, task.exception())
+                continue
+            results[i], from_cache = task.result()
+            _track_search(cost_tracker, q.service, q.credits, from_cache, q.phase)
+            _log_query_success(product_id, q, len(results[i]), from_cache)
+
+        new_cutoff = _search_cutoff(plan, results)
+        if new_cutoff < cutoff:
+            cutoff = new_cutoff
+            skipped = [t for t in tasks[cutoff:] if t in pending and not started[index[t]]]
+            for t in skipped:
+                t.cancel()
+            if skipped:
+                logger.info(f"[Product {product_id}]   Enough results — cancelled {len(skipped)} queued search(es)")
+
+    merged = []
+    for i in range(cutoff):
+        merged.extend(results.get(i, []))
+    return merged
+
+
+def _log_query_success(product_id: int, q: _PlannedQuery, num_results: int, from_cache: bool):
+    cached = " (cached)" if from_cache else ""
+    if q.is_manufacturer:
+        details = f"Manufacturer search on {q.manufacturer_domain} → {num_results} results{cached}"
+        logger.info(f"[Product {product_id}]   → {num_results} manufacturer results")
+    else:
+        details = f"Query '{q.query}' → {num_results} results{cached}"
+        logger.info(f"[Product {product_id}]   → {num_results} results for '{q.query}'")
+    append_log(product_id, {
+        "timestamp": datetime.now().isoformat(),
+        "phase": "search", "step": q.step, "status": "success",
+        "details": details,
+        "credits_used": {q.service: 0 if from_cache else q.credits}
+    })
+
+
+def _log_query_failure(product_id: int, q: _PlannedQuery, e: BaseException):
+    if q.is_manufacturer:
+        logger.warning(f"[Product {product_id}]   Manufacturer search failed ({q.manufacturer_domain}): {e}")
+        status, details = "warning", f"Manufacturer search failed: {str(e)}"
+    else:
+        logger.warning(f"[Product {product_id}]   Search failed for '{q.query}': {e}")
+        status, details = "error", f"Query '{q.query}' failed: {str(e)}"
+    append_log(product_id, {
+        "timestamp": datetime.now().isoformat(),
+        "phase": "search", "step": q.step, "status": status,
+        "details": details
+    })
+
+
 async def search_node(state: dict) -> dict:
     """
     LangGraph node: Phase 2 — Search.
@@ -64,7 +225,7 @@ async def search_node(state: dict) -> dict:
     # Determine search provider
     search_provider = os.getenv("SEARCH_PROVIDER", "tavily").lower()
 
-    all_results = []
+    plan: list[_PlannedQuery] = []
 
     # ─── Provider: Tavily ─────────────────────────────────────────────────────
     if search_provider == "tavily":
@@ -74,68 +235,21 @@ async def search_node(state: dict) -> dict:
 
         client = TavilyClient(api_key=tavily_key)
 
-        # ── Phase 1: Manufacturer-targeted search ──────────────────────────
+        # Phase 1: manufacturer-targeted search
         if manufacturer_domain:
-            update_step(product_id, "searching", f"Searching manufacturer site: {manufacturer_domain}...")
-            try:
-                logger.info(f"[Product {product_id}]   Phase 1 (manufacturer): '{mfr_query}' on {manufacturer_domain}")
-                mfr_response = client.search(
-                    query=mfr_query,
-                    max_results=5,
-                    include_domains=[manufacturer_domain]
-                )
-                mfr_results = mfr_response.get('results', [])
-                all_results.extend(mfr_results)
-
-                if cost_tracker:
-                    cost_tracker.add_api_call("tavily", credits=1, phase="search_manufacturer")
-
-                append_log(product_id, {
-                    "timestamp": datetime.now().isoformat(),
-                    "phase": "search", "step": "tavily_manufacturer", "status": "success",
-                    "details": f"Manufacturer search on {manufacturer_domain} → {len(mfr_results)} results",
-                    "credits_used": {"tavily": 1}
-                })
-                logger.info(f"[Product {product_id}]   → {len(mfr_results)} manufacturer results")
-            except Exception as e:
-                logger.warning(f"[Product {product_id}]   Manufacturer search failed ({manufacturer_domain}): {e}")
-                append_log(product_id, {
-                    "timestamp": datetime.now().isoformat(),
-                    "phase": "search", "step": "tavily_manufacturer", "status": "warning",
-                    "details": f"Manufacturer search failed: {str(e)}"
-                })
-
-        # ── Phase 2: General search ────────────────────────────────────────
-        # Reduce general queries if Phase 1 already found results
-        max_general_queries = 2 if (manufacturer_domain and all_results) else 3
-        for q in queries[:max_general_queries]:
-            update_step(product_id, "searching", f"Searching (Tavily): {q[:50]}...")
-            try:
-                logger.info(f"[Product {product_id}]   Phase 2 (general): '{q}'")
-                response = client.search(query=q, max_results=7)
-                num_results = len(response.get('results', []))
-                logger.info(f"[Product {product_id}]   → {num_results} results")
-                all_results.extend(response.get('results', []))
-
-                if cost_tracker:
-                    cost_tracker.add_api_call("tavily", credits=1, phase="search")
-
-                append_log(product_id, {
-                    "timestamp": datetime.now().isoformat(),
-                    "phase": "search", "step": "tavily_search", "status": "success",
-                    "details": f"Query '{q}' → {num_results} results",
-                    "credits_used": {"tavily": 1}
-                })
-
-                if len(all_results) >= 6:
-                    break
-            except Exception as e:
-                logger.warning(f"[Product {product_id}]   Search failed for '{q}': {e}")
-                append_log(product_id, {
-                    "timestamp": datetime.now().isoformat(),
-                    "phase": "search", "step": "tavily_search", "status": "error",
-                    "details": f"Query '{q}' failed: {str(e)}"
-                })
+            plan.append(_PlannedQuery(
+                query=mfr_query, max_results=5, include_domains=[manufacturer_domain],
+                fetch=lambda on_start: _tavily_search(client, mfr_query, 5, [manufacturer_domain], on_start),
+                service="tavily", credits=1, phase="search_manufacturer", step="tavily_manufacturer",
+                manufacturer_domain=manufacturer_domain,
+            ))
+        # Phase 2: general search
+        for q in queries[:3]:
+            plan.append(_PlannedQuery(
+                query=q, max_results=7, include_domains=None,
+                fetch=lambda on_start, q=q: _tavily_search(client, q, 7, on_start=on_start),
+                service="tavily", credits=1, phase="search", step="tavily_search",
+            ))
 
     # ─── Provider: Firecrawl ──────────────────────────────────────────────────
     elif search_provider == "firecrawl":
@@ -174,70 +288,42 @@ async def search_node(state: dict) -> dict:
                 results.append({'url': url, 'title': title, 'content': desc[:200]})
             return results
 
-        # ── Phase 1: Manufacturer-targeted search ──────────────────────────
+        async def _firecrawl_search(query: str, limit: int, on_start=None) -> list:
+            """Rate-limited Firecrawl search, run off the event loop."""
+            async with get_rate_limiter("firecrawl_search").throttle():
+                if on_start:
+                    on_start()
+                response = await asyncio.to_thread(app.search, query, limit=limit)
+            return _parse_firecrawl_results(response)
+
+        # Phase 1: manufacturer-targeted search
         if manufacturer_domain:
-            update_step(product_id, "searching", f"Searching manufacturer site: {manufacturer_domain}...")
-            try:
-                site_query = f"site:{manufacturer_domain} {mfr_query}"
-                logger.info(f"[Product {product_id}]   Phase 1 (manufacturer): '{site_query}'")
-                mfr_response = app.search(site_query, limit=5)
-                mfr_results = _parse_firecrawl_results(mfr_response)
-                all_results.extend(mfr_results)
-
-                if cost_tracker:
-                    cost_tracker.add_api_call("firecrawl", credits=2, phase="search_manufacturer")
-
-                append_log(product_id, {
-                    "timestamp": datetime.now().isoformat(),
-                    "phase": "search", "step": "firecrawl_manufacturer", "status": "success",
-                    "details": f"Manufacturer search on {manufacturer_domain} → {len(mfr_results)} results",
-                    "credits_used": {"firecrawl": 2}
-                })
-                logger.info(f"[Product {product_id}]   → {len(mfr_results)} manufacturer results")
-            except Exception as e:
-                logger.warning(f"[Product {product_id}]   Manufacturer search failed ({manufacturer_domain}): {e}")
-                append_log(product_id, {
-                    "timestamp": datetime.now().isoformat(),
-                    "phase": "search", "step": "firecrawl_manufacturer", "status": "warning",
-                    "details": f"Manufacturer search failed: {str(e)}"
-                })
-
-        # ── Phase 2: General search ────────────────────────────────────────
-        max_general_queries = 2 if (manufacturer_domain and all_results) else 3
-        for q in queries[:max_general_queries]:
-            update_step(product_id, "searching", f"Searching (Firecrawl): {q[:50]}...")
-            try:
-                logger.info(f"[Product {product_id}]   Phase 2 (general): '{q}'")
-                response = app.search(q, limit=7)
-                results_list = _parse_firecrawl_results(response)
-                num_results = len(results_list)
-                logger.info(f"[Product {product_id}]   → {num_results} results")
-                all_results.extend(results_list)
-
-                if cost_tracker:
-                    cost_tracker.add_api_call("firecrawl", credits=2, phase="search_query")
-
-                append_log(product_id, {
-                    "timestamp": datetime.now().isoformat(),
-                    "phase": "search", "step": "firecrawl_search", "status": "success",
-                    "details": f"Query '{q}' → {num_results} results",
-                    "credits_used": {"firecrawl": 2}
-                })
-
-                if len(all_results) >= 6:
-                    break
-
-            except Exception as e:
-                logger.warning(f"[Product {product_id}]   Firecrawl search failed for '{q}': {e}")
-                append_log(product_id, {
-                    "timestamp": datetime.now().isoformat(),
-                    "phase": "search", "step": "firecrawl_search", "status": "error",
-                    "details": f"Query '{q}' failed: {str(e)}"
-                })
+            site_query = f"site:{manufacturer_domain} {mfr_query}"
+            plan.append(_PlannedQuery(
+                query=site_query, max_results=5, include_domains=None,
+                fetch=lambda on_start: _firecrawl_search(site_query, 5, on_start),
+                service="firecrawl", credits=2, phase="search_manufacturer", step="firecrawl_manufacturer",
+                manufacturer_domain=manufacturer_domain,
+            ))
+        # Phase 2: general search
+        for q in queries[:3]:
+            plan.append(_PlannedQuery(
+                query=q, max_results=7, include_domains=None,
+                fetch=lambda on_start, q=q: _firecrawl_search(q, 7, on_start),
+                service="firecrawl", credits=2, phase="search_query", step="firecrawl_search",
+            ))
 
     else:
         return {"error": f"Unknown SEARCH_PROVIDER: {search_provider}"}
 
+    provider_label = "Tavily" if search_provider == "tavily" else "Firecrawl"
+    update_step(
+        product_id, "searching",
+        f"Searching ({provider_label}): {len(plan)} queries"
+        + (f" incl. manufacturer site {manufacturer_domain}" if manufacturer_domain else "") + "..."
+    )
+    all_results = await _run_search_plan(product_id, plan, search_provider, cost_tracker)
+
     # Deduplicate
     seen_urls = set()
     unique_results = []
@@ -254,6 +340,7 @@ async def search_node(state: dict) -> dict:
             "phase": "search", "step": "no_results", "status": "warning",
             "details": "No search results found"
         })
+        await aflush_writes()  # queued step updates land before current_step is set here
         conn = get_db_connection()
         conn.execute(
             "UPDATE products SET search_result = ?, current_step = 'No results found', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
@@ -287,7 +374,7 @@ Search results to classify:
         user_prompt += f"- {r['url']} | {r['title']}\n"
 
     try:
-        classified_list, usage = classify_with_schema(
+        classified_list, usage = await aclassify_with_schema(
             prompt=user_prompt,
             system=system_prompt,
             schema=SearchResultList,
@@ -297,12 +384,7 @@ Search results to classify:
 
         # Track Claude cost (with cache metrics)
         if cost_tracker:
-            cost_tracker.add_llm_call(
-                usage["model"], usage["input_tokens"], usage["output_tokens"],
-                phase="search",
-                cache_creation_input_tokens=usage.get("cache_creation_input_tokens", 0),
-                cache_read_input_tokens=usage.get("cache_read_input_tokens", 0),
-            )
+            cost_tracker.add_llm_usage(usage, phase="search")
 
         type_counts = {}
         for r in classified_list.results:
@@ -319,6 +401,7 @@ Search results to classify:
 
         # Save results
         result_json = classified_list.model_dump_json()
+        await aflush_writes()  # queued step updates land before current_step is set here
         conn = get_db_connection()
         conn.execute(
             "UPDATE products SET search_result = ?, current_step = 'Search complete', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
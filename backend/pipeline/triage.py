@@ -7,8 +7,8 @@ Tools: Claude Haiku 4.5
 import json
 import logging
 from datetime import datetime
-from db import get_db_connection, update_step, append_log
-from utils.llm import classify_with_schema
+from db import get_db_connection, aflush_writes, update_step, append_log
+from utils.llm import aclassify_with_schema
 from schemas import ProductClassification
 
 logger = logging.getLogger("pipeline.triage")
@@ -68,7 +68,7 @@ Existing Weight: {product.get('weight', 'None')}"""
     update_step(product_id, "classifying", "Running classification model...")
 
     try:
-        classification, usage = classify_with_schema(
+        classification, usage = await aclassify_with_schema(
             prompt=user_prompt,
             system=system_prompt,
             schema=ProductClassification,
@@ -78,14 +78,10 @@ Existing Weight: {product.get('weight', 'None')}"""
 
         # Track cost (with cache metrics)
         if cost_tracker:
-            cost_tracker.add_llm_call(
-                usage["model"], usage["input_tokens"], usage["output_tokens"],
-                phase="triage",
-                cache_creation_input_tokens=usage.get("cache_creation_input_tokens", 0),
-                cache_read_input_tokens=usage.get("cache_read_input_tokens", 0),
-            )
-
-        # Save to DB
+            cost_tracker.add_llm_usage(usage, phase="triage")
+
+        # Save to DB (queued step updates land first)
+        await aflush_writes()
         conn = get_db_connection()
         conn.execute("""
             UPDATE products 
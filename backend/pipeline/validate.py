@@ -16,8 +16,8 @@ import json
 import re
 import logging
 from datetime import datetime
-from db import get_db_connection, update_step, append_log
-from utils.llm import classify_with_schema
+from db import get_db_connection, aflush_writes, update_step, append_log, transaction, require_job_lease
+from utils.llm import aclassify_with_schema
 from utils.normalization import normalize_dimension_set
 from schemas import (
     EnrichedProduct, ProductClassification,
@@ -207,7 +207,7 @@ Data Summary:
 Check this data for quality issues."""
 
     try:
-        report, usage = classify_with_schema(
+        report, usage = await aclassify_with_schema(
             prompt=user_prompt,
             system=system_prompt,
             schema=ValidationReport,
@@ -217,12 +217,7 @@ Check this data for quality issues."""
 
         # Track cost (with cache metrics)
         if cost_tracker:
-            cost_tracker.add_llm_call(
-                usage["model"], usage["input_tokens"], usage["output_tokens"],
-                phase="validate",
-                cache_creation_input_tokens=usage.get("cache_creation_input_tokens", 0),
-                cache_read_input_tokens=usage.get("cache_read_input_tokens", 0),
-            )
+            cost_tracker.add_llm_usage(usage, phase="validate")
 
         logger.info(f"[Product {product_id}]   ✓ Quality: {report.overall_quality}, {len(report.issues)} issues")
         append_log(product_id, {
@@ -254,13 +249,14 @@ Check this data for quality issues."""
     # "good" and "acceptable" → done. Only "needs_review" → needs_review.
     final_status = "done" if report.overall_quality in ("good", "acceptable") else "needs_review"
 
-    conn = get_db_connection()
-    conn.execute(
-        "UPDATE products SET validation_result = ?, status = ?, current_step = NULL, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-        (final_result.model_dump_json(), final_status, product_id)
-    )
-    conn.commit()
-    conn.close()
+    # Queued step updates must land before the final status, not after it
+    await aflush_writes()
+    with transaction() as conn:
+        require_job_lease(conn)  # a run whose job moved to another worker writes nothing
+        conn.execute(
+            "UPDATE products SET validation_result = ?, status = ?, current_step = NULL, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (final_result.model_dump_json(), final_status, product_id)
+        )
 
     logger.info(f"[Product {product_id}]   ✓ Final status: {final_status}")
     logger.info(f"[Product {product_id}] ■ PIPELINE COMPLETE — {final_status}")
@@ -0,0 +1,79 @@
+"""
+Pipeline Runtime — one long-lived event loop for all pipeline work
+
+Batch workers and single-phase endpoints (/classify, /search, /extract,
+/validate) all run their coroutines on the same loop, owned by a dedicated
+daemon thread. Async clients, connection pools and limiters bound to that loop
+are therefore reused across products instead of being thrown away with a
+per-call loop.
+
+The FastAPI loop stays free for API requests and SSE streams; coroutines are
+handed over with asyncio.run_coroutine_threadsafe.
+
+Usage:
+    future = pipeline_runtime.submit(triage_node(state))   # fire and forget
+    result = pipeline_runtime.run(some_coro())              # block for result
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine
+
+logger = logging.getLogger("pipeline.runtime")
+
+
+class PipelineRuntime:
+    """Daemon thread that owns the persistent pipeline event loop."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def start(self) -> asyncio.AbstractEventLoop:
+        """Start the runtime thread (idempotent) and return its loop."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run_loop, name="pipeline-runtime", daemon=True)
+                self._thread.start()
+        self._started.wait()
+        return self._loop
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self.start()
+
+    def _run_loop(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        logger.info("Pipeline runtime loop started")
+        self._started.set()
+        loop.run_forever()
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule a coroutine on the pipeline loop. Thread-safe.
+        Unhandled exceptions are logged so fire-and-forget callers don't lose them."""
+        future = asyncio.run_coroutine_threadsafe(coro, self.start())
+        future.add_done_callback(self._log_failure)
+        return future
+
+    def run(self, coro: Coroutine, timeout: float | None = None) -> Any:
+        """Run a coroutine on the pipeline loop and block until it finishes.
+        Must not be called from the pipeline loop itself."""
+        return asyncio.run_coroutine_threadsafe(coro, self.start()).result(timeout)
+
+    @staticmethod
+    def _log_failure(future: Future):
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            logger.error(f"Pipeline task failed: {exc!r}")
+
+
+# Singleton
+pipeline_runtime = PipelineRuntime()
@@ -0,0 +1,394 @@
+"""
+Batch Scheduler — concurrent enrichment on a shared event loop
+
+Replaces the old sequential process_batch loop. A fixed pool of async workers
+claims jobs from the durable `jobs` table (see db.py) and runs
+enrichment_pipeline.ainvoke for many products at once on one long-lived event
+loop (the shared pipeline runtime, see runtime.py), so waits on Firecrawl / Tavily / Claude
+overlap across products. Because the queue lives in SQLite, a batch survives
+process restarts: expired leases are re-queued instead of leaving products
+stuck in 'enriching'.
+
+Per-product SSE semantics are unchanged: "Queued for processing..." is set by
+the API before submit, then the pipeline publishes its own step/status events,
+and the final DB status is re-published when a run ends.
+
+Config:
+    MAX_CONCURRENT_PRODUCTS — products enriched at the same time (default: 2)
+    JOB_LEASE_SECONDS       — lease length; heartbeats renew it every 1/3 (default: 60)
+    JOB_POLL_SECONDS        — idle worker poll interval for new jobs (default: 2)
+    JOB_MAX_ATTEMPTS        — runs per job (failed runs and expired leases both
+                              count) before it is marked failed (default: 3)
+    EMBEDDED_WORKERS        — run workers inside the API process (default: true);
+                              set to false when running `python -m worker` separately
+"""
+
+import os
+import asyncio
+import logging
+import time
+import socket
+import threading
+from datetime import datetime
+from typing import Iterable, Set
+
+from db import (
+    get_db_connection, aflush_writes, update_step, append_log, transaction, mark_processed, rollup_day,
+    enqueue_jobs, claim_next_job, release_job, heartbeat_job, finish_job,
+    set_job_lease, require_job_lease, LeaseLost,
+    requeue_expired_jobs, enqueue_orphaned_products, get_job_counts, get_writer_stats,
+)
+from events import event_bus
+from runtime import pipeline_runtime
+
+logger = logging.getLogger("pipeline.scheduler")
+
+
+def _publish_final_status(product_id: int):
+    """Read current status from DB and publish SSE event.
+    Needed because pipeline nodes write terminal status directly to DB."""
+    conn = get_db_connection()
+    row = conn.execute("SELECT status, current_step FROM products WHERE id = ?", (product_id,)).fetchone()
+    conn.close()
+    if row:
+        event_bus.publish_product_event(product_id, {
+            "type": "status",
+            "status": row["status"],
+            "current_step": row["current_step"],
+        })
+
+
+def _record_failure(product_id: int, error: str):
+    """Error log entry, then the terminal 'error' status. Blocking — called
+    via asyncio.to_thread so it doesn't stall other runs on the loop."""
+    append_log(product_id, {
+        "timestamp": datetime.now().isoformat(),
+        "phase": "pipeline", "step": "error", "status": "error",
+        "details": error
+    })
+    # Failed runs may never reach save_costs — count them as processed here
+    with transaction() as conn:
+        require_job_lease(conn)
+        conn.execute(
+            "UPDATE products SET status = 'error', current_step = NULL, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (product_id,)
+        )
+        mark_processed(rollup_day(), product_id)
+
+
+async def run_enrichment(product_id: int) -> bool:
+    """
+    Invokes the LangGraph enrichment pipeline for a single product.
+    Returns True on success, False if the run ended in the error state.
+    """
+    from graph import enrichment_pipeline, ProductState
+    from utils.cost_tracker import CostTracker
+
+    try:
+        # Load product name for logging
+        conn = get_db_connection()
+        product_row = conn.execute("SELECT product_name FROM products WHERE id = ?", (product_id,)).fetchone()
+        product_name = product_row['product_name'] if product_row else f"ID:{product_id}"
+        conn.close()
+
+        logger.info(f"")
+        logger.info(f"{'='*60}")
+        logger.info(f"[Product {product_id}] ▶ PIPELINE START — {product_name}")
+        logger.info(f"{'='*60}")
+
+        # Set initial status (publishes SSE event via thread-safe event bus)
+        update_step(product_id, "enriching", "Initializing pipeline...")
+
+        # Build initial state with a fresh cost tracker for this run
+        initial_state: ProductState = {
+            "product_id": product_id,
+            "has_brand": False,
+            "has_search_results": False,
+            "error": None,
+            "cost_tracker": CostTracker(product_id),
+        }
+
+        result = await enrichment_pipeline.ainvoke(initial_state)
+
+        if result.get("error"):
+            raise Exception(result["error"])
+
+        # Publish final status for SSE clients.
+        # Pipeline nodes (e.g. validate) write terminal status directly to DB
+        # without calling update_step(), so we read it back and publish here.
+        _publish_final_status(product_id)
+
+        logger.info(f"[Product {product_id}] ✓ PIPELINE COMPLETE — {product_name}")
+        logger.info(f"{'='*60}")
+        return True
+
+    except LeaseLost:
+        raise  # another worker owns the job now — record nothing
+
+    except Exception as e:
+        logger.error(f"[Product {product_id}] ✗ PIPELINE FAILED — {e}")
+        # Queued step updates must land before the error status, not after it
+        await aflush_writes()
+        await asyncio.to_thread(_record_failure, product_id, str(e))
+
+        # Publish error event
+        event_bus.publish_product_event(product_id, {
+            "type": "status",
+            "status": "error",
+            "current_step": None,
+        })
+        return False
+
+    finally:
+        from pipeline.gap_fill import discard_prefetches
+        discard_prefetches(product_id)
+
+
+class BatchScheduler:
+    """
+    Fixed-size async worker pool for enrichment runs, fed by the jobs table.
+
+    Workers run on the pipeline runtime loop so the FastAPI loop stays free
+    for SSE streams and API requests. submit() is thread-safe and can be called
+    from request handlers; it writes jobs to the DB and wakes idle workers.
+
+    Each worker claims a job with a lease, heartbeats while the pipeline runs,
+    and marks the job done at the end (a failed run is re-queued while it has
+    attempts left). Leases that stop heartbeating (process crash, restart,
+    deploy) are swept back to 'queued' on startup and periodically, so a batch
+    survives restarts without losing products; a worker that finds its lease
+    gone cancels its run, and the run's terminal writes check the lease, so a
+    product is never finished by two runs.
+    """
+
+    def __init__(self, max_workers: int, lease_seconds: float = 60.0, poll_seconds: float = 2.0,
+                 run_workers: bool = True):
+        self.max_workers = max(1, max_workers)
+        self.run_workers = run_workers
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._in_flight: Set[int] = set()
+        self._claiming = 0  # claims in progress — stop() waits for these too
+        self._completed = 0
+        self._failed = 0
+        self._batch_active = False
+
+    def start(self):
+        """Recover stale jobs, then start the workers on the pipeline runtime loop (idempotent).
+        No-op when workers run in separate processes (see worker.py)."""
+        if not self.run_workers:
+            return
+        # Separate from self._lock: workers take self._lock on the runtime
+        # loop, which must not block while we wait for _start_workers().
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            self.recover()
+            self._loop = pipeline_runtime.start()
+            pipeline_runtime.run(self._start_workers())
+
+    def recover(self):
+        """Re-queue jobs with expired leases and products orphaned in 'enriching'."""
+        requeued, failed = requeue_expired_jobs()
+        orphaned = enqueue_orphaned_products()
+        for pid in requeued + failed:
+            _publish_final_status(pid)
+        if requeued or failed or orphaned:
+            logger.info(
+                f"Job recovery: {len(requeued)} expired lease(s) re-queued, "
+                f"{len(failed)} failed (max attempts), {len(orphaned)} orphaned product(s) queued"
+            )
+
+    async def _start_workers(self):
+        self._wakeup = asyncio.Event()
+        for worker_id in range(self.max_workers):
+            self._loop.create_task(self._worker(worker_id))
+        self._loop.create_task(self._sweeper())
+        logger.info(f"Batch scheduler started with {self.max_workers} worker(s) as {self.worker_id}")
+
+    def submit(self, product_ids: Iterable[int]) -> int:
+        """Queue products for enrichment. Returns how many were newly queued."""
+        self.start()
+        queued = enqueue_jobs(list(dict.fromkeys(product_ids)))
+        if queued and self.run_workers:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        return len(queued)
+
+    def stop(self, timeout: float | None = None) -> bool:
+        """Stop claiming new jobs and wait for in-flight runs to finish.
+        Returns False if runs were still going when the timeout hit (their
+        leases expire and the jobs are re-queued by the next sweep)."""
+        self._stopping.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._in_flight and not self._claiming:
+                    return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.5)
+
+    async def _wait_for_work(self):
+        """Sleep until submit() wakes us or the poll interval elapses
+        (the poll picks up jobs queued by other processes / the sweeper)."""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _worker(self, worker_id: int):
+        while not self._stopping.is_set():
+            job = await self._claim(worker_id)
+            if job is None:
+                with self._lock:
+                    drained = self._batch_active and not self._in_flight
+                    if drained:
+                        self._batch_active = False
+                if drained:
+                    self._log_limiter_waits()
+                await self._wait_for_work()
+                continue
+
+            await self._run_job(worker_id, job)
+
+    async def _claim(self, worker_id: int) -> dict | None:
+        """Claim the next job. A claim is counted until its job is in flight,
+        and a job claimed after stop() was called goes straight back to the queue."""
+        with self._lock:
+            self._claiming += 1
+        job = None
+        try:
+            job = await asyncio.to_thread(claim_next_job, self.worker_id, self.lease_seconds)
+            if job is not None and self._stopping.is_set():
+                await asyncio.to_thread(release_job, job["id"], self.worker_id)
+                job = None
+        except Exception as e:
+            logger.error(f"Worker {worker_id} failed to claim a job: {e}")
+        finally:
+            with self._lock:
+                self._claiming -= 1
+                if job is not None:
+                    self._in_flight.add(job["product_id"])
+                    self._batch_active = True
+        return job
+
+    async def _run_job(self, worker_id: int, job: dict):
+        product_id = job["product_id"]
+        if job["attempts"] > 1:
+            logger.info(f"[Product {product_id}] Retrying job {job['id']} (attempt {job['attempts']}/{job['max_attempts']})")
+
+        run = asyncio.create_task(self._run_leased(job))
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"], product_id, run))
+        ok = False
+        error = None
+        lease_lost = False
+        try:
+            ok = await run
+            if not ok:
+                error = "Pipeline failed"
+        except LeaseLost:
+            lease_lost = True
+        except asyncio.CancelledError:
+            # The heartbeat cancels the run when the lease is lost; any other
+            # cancellation is ours and propagates
+            if not (heartbeat.done() and not heartbeat.cancelled()):
+                raise
+            lease_lost = True
+        except Exception as e:
+            error = str(e)
+            logger.error(f"[Product {product_id}] Worker {worker_id} crashed: {e}")
+        finally:
+            heartbeat.cancel()
+            status = None
+            if lease_lost:
+                logger.warning(f"[Product {product_id}] Run discarded — job {job['id']} was handed to another worker")
+            else:
+                status = await asyncio.to_thread(finish_job, job["id"], self.worker_id, ok, error)
+            with self._lock:
+                self._in_flight.discard(product_id)
+                if ok:
+                    self._completed += 1
+                elif status == "failed":
+                    self._failed += 1
+            if status == "queued":
+                logger.info(f"[Product {product_id}] Job {job['id']} re-queued after a failed run")
+                _publish_final_status(product_id)
+                self._wakeup.set()
+
+    async def _run_leased(self, job: dict) -> bool:
+        """run_enrichment bound to the job's lease: its terminal writes only
+        land while this worker still holds it (see db.require_job_lease)."""
+        set_job_lease(job["id"], self.worker_id)  # this task's context only
+        return await run_enrichment(job["product_id"])
+
+    async def _heartbeat(self, job_id: int, product_id: int, run: asyncio.Task):
+        """Keep the job's lease alive while the pipeline runs. If the lease is
+        lost the job may already be running elsewhere, so the run is cancelled."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if not await asyncio.to_thread(heartbeat_job, job_id, self.worker_id, self.lease_seconds):
+                    logger.warning(f"[Product {product_id}] Lost lease on job {job_id} — cancelling the run")
+                    run.cancel()
+                    return
+            except Exception as e:
+                logger.warning(f"[Product {product_id}] Heartbeat failed for job {job_id}: {e}")
+
+    async def _sweeper(self):
+        """Periodically recover jobs whose worker stopped heartbeating."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 2)
+            try:
+                requeued, failed = await asyncio.to_thread(requeue_expired_jobs)
+            except Exception as e:
+                logger.warning(f"Job sweep failed: {e}")
+                continue
+            for pid in requeued + failed:
+                _publish_final_status(pid)
+            if requeued:
+                logger.info(f"Job sweep: re-queued {len(requeued)} job(s) with expired leases")
+                self._wakeup.set()
+            if failed:
+                logger.warning(f"Job sweep: {len(failed)} job(s) failed after max attempts")
+
+    def _log_limiter_waits(self):
+        """When a batch drains, log which providers callers spent time waiting on."""
+        from utils.rate_limiter import get_rate_limiter_stats
+        waits = [s for s in get_rate_limiter_stats() if s["total_wait_s"] > 0]
+        if waits:
+            summary = ", ".join(f"{s['name']}={s['total_wait_s']:.1f}s" for s in waits)
+            logger.info(f"Batch drained — rate limiter wait totals: {summary}")
+
+    def stats(self) -> dict:
+        """Queue depth and in-flight counts for the dashboard."""
+        jobs = get_job_counts()
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "worker_id": self.worker_id,
+                "running": self._loop is not None and not self._stopping.is_set(),
+                "embedded_workers": self.run_workers,
+                "queue_depth": jobs["queued"],
+                "in_flight": len(self._in_flight),
+                "in_flight_ids": sorted(self._in_flight),
+                "completed": self._completed,
+                "failed": self._failed,
+                "jobs": jobs,
+                "db_writer": get_writer_stats(),
+            }
+
+
+# Singleton
+batch_scheduler = BatchScheduler(
+    int(os.getenv("MAX_CONCURRENT_PRODUCTS", "2")),
+    lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", "60")),
+    poll_seconds=float(os.getenv("JOB_POLL_SECONDS", "2")),
+    run_workers=os.getenv("EMBEDDED_WORKERS", "true").lower() == "true",
+)
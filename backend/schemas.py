@@ -255,6 +255,7 @@ class ProductResponse(ProductBase):
     cost_data: Optional[str] = None
     created_at: str
     updated_at: str
+    row_version: Optional[int] = None
 
     class Config:
         from_attributes = True
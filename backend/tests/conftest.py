@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """Point db.py at an empty, initialized database for the test."""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "products.db"))
+    db.init_db()
+    yield db
+    db.flush_writes()
+    db.close_thread_connection()
+
+
+def add_product(name: str = "Drill", ean: str = "4006381333931", status: str = "pending") -> int:
+    conn = db.get_db_connection()
+    cur = conn.execute(
+        "INSERT INTO products (ean, ean_normalized, product_name, status) VALUES (?, ?, ?, ?)",
+        (ean, db.normalize_ean(ean), name, status)
+    )
+    conn.commit()
+    conn.close()
+    return cur.lastrowid
+
+
+def fetch_one(sql: str, params: tuple = ()) -> dict | None:
+    conn = db.get_db_connection()
+    row = conn.execute(sql, params).fetchone()
+    conn.close()
+    return dict(row) if row else None
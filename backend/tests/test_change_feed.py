@@ -0,0 +1,92 @@
+from conftest import add_product
+
+
+def _execute(db, sql: str, params: tuple = ()):
+    conn = db.get_db_connection()
+    conn.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+
+def _drain(db, since: int, limit: int) -> tuple[list[int], list[int], int]:
+    """Page through the feed; returns (changed ids, deleted ids, final cursor)."""
+    changed, deleted = [], []
+    while True:
+        rows, gone, since, has_more = db.list_product_changes(since, fields=["id"], limit=limit)
+        changed += [r["id"] for r in rows]
+        deleted += gone
+        if not has_more:
+            return changed, deleted, since
+
+
+def test_inserts_and_updates_advance_the_cursor(fresh_db):
+    a, b = add_product("A"), add_product("B")
+    rows, deleted, cursor, has_more = fresh_db.list_product_changes(0)
+    assert [r["id"] for r in rows] == [a, b] and deleted == [] and not has_more
+
+    fresh_db.update_step(a, "enriching", "Searching...")
+    rows, _, next_cursor, _ = fresh_db.list_product_changes(cursor)
+    assert [r["id"] for r in rows] == [a]
+    assert next_cursor > cursor
+
+    assert fresh_db.list_product_changes(next_cursor)[:3] == ([], [], next_cursor)
+
+
+def test_deletes_are_reported_as_tombstones(fresh_db):
+    a, b = add_product("A"), add_product("B")
+    _, _, cursor, _ = fresh_db.list_product_changes(0)
+
+    _execute(fresh_db, "DELETE FROM products WHERE id = ?", (a,))
+    fresh_db.update_step(b, "enriching", "x")
+    rows, deleted, _, _ = fresh_db.list_product_changes(cursor)
+    assert deleted == [a]
+    assert [r["id"] for r in rows] == [b]
+
+
+def test_versions_are_unique_and_monotonic_across_deletes(fresh_db):
+    ids = [add_product(f"P{i}") for i in range(5)]
+    _execute(fresh_db, "DELETE FROM products WHERE id = ?", (ids[-1],))
+    newer = add_product("P5")
+
+    conn = fresh_db.get_db_connection()
+    versions = [r[0] for r in conn.execute(
+        "SELECT row_version FROM products UNION ALL SELECT row_version FROM product_tombstones"
+    ).fetchall()]
+    newest = conn.execute("SELECT row_version FROM products WHERE id = ?", (newer,)).fetchone()[0]
+    conn.close()
+    assert len(versions) == len(set(versions))
+    assert newest == max(versions)
+
+
+def test_paging_mixes_rows_and_tombstones_in_change_order(fresh_db):
+    ids = [add_product(f"P{i}") for i in range(7)]
+    for pid in ids[::2]:
+        _execute(fresh_db, "DELETE FROM products WHERE id = ?", (pid,))
+    for pid in ids[1::2]:
+        fresh_db.update_step(pid, "enriching", "x")
+
+    changed, deleted, cursor = _drain(fresh_db, 0, limit=2)
+    assert changed == ids[1::2]
+    assert deleted == ids[::2]
+    assert fresh_db.list_product_changes(cursor)[:2] == ([], [])
+
+
+def test_init_db_replaces_legacy_triggers_and_keeps_counting(fresh_db):
+    a = add_product("A")
+    _execute(fresh_db, "DROP TRIGGER trg_products_row_version_insert")
+    _execute(fresh_db, """
+        CREATE TRIGGER trg_products_row_version_insert AFTER INSERT ON products
+        BEGIN
+            UPDATE products SET row_version = (SELECT COALESCE(MAX(row_version), 0) + 1 FROM products)
+            WHERE id = NEW.id;
+        END
+    """)
+    fresh_db.init_db()  # startup again on a DB with the old trigger
+    b = add_product("B")
+    rows, _, _, _ = fresh_db.list_product_changes(0)
+    assert [r["id"] for r in rows] == [a, b]
+    assert rows[1]["row_version"] > rows[0]["row_version"]
+    conn = fresh_db.get_db_connection()
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'trg_products_row_version_insert'").fetchone()[0]
+    conn.close()
+    assert "change_seq" in sql and "MAX(row_version)" not in sql
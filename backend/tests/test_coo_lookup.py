@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from conftest import add_product
+
+extract = pytest.importorskip("pipeline.extract")
+from schemas import EnrichedField  # noqa: E402
+from utils.cost_tracker import CostTracker  # noqa: E402
+
+USAGE = {"model": "claude_haiku", "input_tokens": 100, "output_tokens": 20}
+
+
+@pytest.fixture
+def search(fresh_db, monkeypatch):
+    """Replace the Tavily + Claude search; it finishes when `release` is set."""
+    state = {"calls": [], "release": None}
+
+    async def fake_search(brand, brand_key, ean):
+        state["calls"].append(brand_key)
+        await state["release"].wait()
+        return extract._CooSearch(
+            result=EnrichedField(value="Germany", confidence="third_party"),
+            credits={"tavily": 1}, usage=USAGE,
+        )
+
+    monkeypatch.setattr(extract, "_search_country_of_origin", fake_search)
+    return state
+
+
+def _steps(db, pid: int) -> list[str]:
+    return [e["step"] for e in db.get_enrichment_log(pid)]
+
+
+def test_spend_goes_to_the_leader_and_joiners_record_savings(fresh_db, search):
+    a, b = add_product("A"), add_product("B")
+    ta, tb = CostTracker(a), CostTracker(b)
+
+    async def scenario():
+        search["release"] = asyncio.Event()
+        first = asyncio.create_task(extract._fill_country_of_origin("Bosch", "1", a, ta))
+        second = asyncio.create_task(extract._fill_country_of_origin(" BOSCH ", "2", b, tb))
+        await asyncio.sleep(0.01)
+        search["release"].set()
+        return await asyncio.gather(first, second)
+
+    results = asyncio.run(scenario())
+    assert [r.value for r in results] == ["Germany", "Germany"]
+    assert search["calls"] == ["bosch"]
+    assert ([c.service for c in ta.api_calls], len(ta.llm_calls), ta.cache_hits) == (["tavily"], 1, [])
+    assert (tb.api_calls, tb.llm_calls, len(tb.cache_hits)) == ([], [], 2)
+    assert "country_of_origin_search" in _steps(fresh_db, a)
+    assert "country_of_origin_shared" in _steps(fresh_db, b)
+
+
+def test_spend_follows_the_result_when_the_leader_is_cancelled(fresh_db, search):
+    a, b = add_product("A"), add_product("B")
+    ta, tb = CostTracker(a), CostTracker(b)
+
+    async def scenario():
+        search["release"] = asyncio.Event()
+        first = asyncio.create_task(extract._fill_country_of_origin("Bosch", "1", a, ta))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(extract._fill_country_of_origin("bosch", "2", b, tb))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0)
+        search["release"].set()
+        return await second
+
+    assert asyncio.run(scenario()).value == "Germany"
+    assert (ta.api_calls, ta.llm_calls) == ([], [])
+    assert ([c.service for c in tb.api_calls], len(tb.llm_calls), tb.cache_hits) == (["tavily"], 1, [])
+    assert "country_of_origin_search" not in _steps(fresh_db, a)
+    assert "country_of_origin_search" in _steps(fresh_db, b)
+
+
+def test_cache_is_read_with_the_normalized_brand(fresh_db, search):
+    conn = fresh_db.get_db_connection()
+    conn.execute("INSERT INTO brand_coo_cache (brand, country_of_origin, confidence) VALUES ('makita', 'Japan', 'third_party')")
+    conn.commit()
+    conn.close()
+    pid = add_product("A")
+
+    result = asyncio.run(extract._fill_country_of_origin("  Makita ", "1", pid, CostTracker(pid)))
+    assert result.value == "Japan"
+    assert search["calls"] == []
@@ -0,0 +1,62 @@
+import json
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from conftest import add_product, fetch_one
+
+
+@pytest.fixture
+def tz(monkeypatch):
+    """Run the test with the process in another local time zone."""
+    def set_tz(name: str):
+        monkeypatch.setenv("TZ", name)
+        time.tzset()
+    yield set_tz
+    monkeypatch.undo()
+    time.tzset()
+
+
+def _execute(db, sql: str, params: tuple = ()):
+    conn = db.get_db_connection()
+    conn.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+
+def test_rollup_day_is_the_utc_date(fresh_db, tz):
+    tz("Etc/GMT+10")  # UTC-10
+    assert fresh_db.rollup_day(datetime(2026, 1, 1, 20, 0)) == "2026-01-02"
+    assert fresh_db.rollup_day(datetime(2026, 1, 1, 20, 0, tzinfo=timezone.utc)) == "2026-01-01"
+    assert fresh_db.rollup_day() == datetime.now(timezone.utc).date().isoformat()
+
+
+def test_daily_stats_read_the_utc_day(fresh_db, tz):
+    from utils.cost_tracker import get_daily_stats
+
+    tz("Etc/GMT-14")  # UTC+14: the local date is ahead of UTC most of the day
+    pid = add_product()
+    fresh_db.add_cost_rollups(fresh_db.rollup_day(), [
+        {"service": "*", "phase": "*", "cost": 0.5, "input_tokens": 10, "output_tokens": 5, "credits": 0},
+    ])
+    fresh_db.mark_processed(fresh_db.rollup_day(), pid)
+
+    stats = get_daily_stats()
+    assert stats["processed_today"] == 1
+    assert stats["total_cost_today_usd"] == 0.5
+
+
+def test_backfill_buckets_by_utc_day(fresh_db, tz):
+    tz("Etc/GMT-10")  # UTC+10
+    pid = add_product(status="done")
+    summary = {"completed_at": "2026-01-02T08:00:00", "total_cost_usd": 0.25}  # local → 2026-01-01 UTC
+    _execute(fresh_db, "UPDATE products SET updated_at = '2026-01-01 23:30:00', cost_data = ? WHERE id = ?",
+             (json.dumps(summary), pid))
+    _execute(fresh_db, "DELETE FROM processed_products")
+    _execute(fresh_db, "DELETE FROM cost_rollups")
+
+    fresh_db.init_db()
+    assert fetch_one("SELECT day FROM processed_products WHERE product_id = ?", (pid,))["day"] == "2026-01-01"
+    assert fetch_one("SELECT day, cost FROM cost_rollups WHERE service = '*' AND phase = '*'") == \
+        {"day": "2026-01-01", "cost": 0.25}
@@ -0,0 +1,165 @@
+import asyncio
+import threading
+
+import pytest
+
+from conftest import add_product, fetch_one
+
+
+@pytest.fixture
+def opened(fresh_db, monkeypatch):
+    """Count connections opened from here on."""
+    fresh_db.close_thread_connection()
+    count = [0]
+    open_connection = fresh_db._open_connection
+
+    def counted():
+        count[0] += 1
+        return open_connection()
+
+    monkeypatch.setattr(fresh_db, "_open_connection", counted)
+    return count
+
+
+def _name(pid: int) -> str:
+    return fetch_one("SELECT product_name FROM products WHERE id = ?", (pid,))["product_name"]
+
+
+def test_thread_reuses_one_connection(fresh_db, opened):
+    for _ in range(5):
+        conn = fresh_db.get_db_connection()
+        conn.execute("SELECT 1").fetchone()
+        conn.close()
+    assert opened[0] == 1
+
+
+def test_threads_get_their_own_connection(fresh_db, opened):
+    def query():
+        conn = fresh_db.get_db_connection()
+        conn.execute("SELECT 1").fetchone()
+        conn.close()
+        fresh_db.close_thread_connection()
+
+    threads = [threading.Thread(target=query) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert opened[0] == 3
+
+
+def test_close_rolls_back_uncommitted_writes(fresh_db):
+    pid = add_product("Drill")
+    conn = fresh_db.get_db_connection()
+    conn.execute("UPDATE products SET product_name = 'Saw' WHERE id = ?", (pid,))
+    conn.close()
+    assert _name(pid) == "Drill"
+
+
+def test_context_manager_closes_without_committing(fresh_db):
+    pid = add_product("Drill")
+    with fresh_db.get_db_connection() as conn:
+        conn.execute("UPDATE products SET product_name = 'Saw' WHERE id = ?", (pid,))
+    assert _name(pid) == "Drill"
+
+
+def test_transaction_commits_once_at_the_outermost_block(fresh_db):
+    pid = add_product("Drill")
+    with fresh_db.transaction():
+        with fresh_db.transaction() as conn:
+            conn.execute("UPDATE products SET product_name = 'Saw' WHERE id = ?", (pid,))
+            conn.commit()  # deferred to the outer block
+        helper = fresh_db.get_db_connection()
+        assert helper.in_transaction
+        helper.execute("UPDATE products SET brand = 'Makita' WHERE id = ?", (pid,))
+        helper.commit()
+        helper.close()  # must not roll back the open block
+    row = fetch_one("SELECT product_name, brand FROM products WHERE id = ?", (pid,))
+    assert (row["product_name"], row["brand"]) == ("Saw", "Makita")
+
+
+def test_transaction_rolls_back_when_the_block_raises(fresh_db):
+    pid = add_product("Drill")
+    with pytest.raises(ValueError):
+        with fresh_db.transaction() as conn:
+            conn.execute("UPDATE products SET product_name = 'Saw' WHERE id = ?", (pid,))
+            fresh_db.append_log(pid, {"phase": "test", "step": "x", "status": "success"})
+            raise ValueError
+    assert _name(pid) == "Drill"
+    assert fresh_db.get_enrichment_log(pid) == []
+
+
+def test_event_loop_tasks_share_a_small_pool(fresh_db, opened):
+    pids = [add_product(f"P{i}") for i in range(50)]
+    opened[0] = 0
+
+    async def touch(pid: int):
+        await asyncio.sleep(0)
+        conn = fresh_db.get_db_connection()
+        conn.execute("UPDATE products SET current_step = 'x' WHERE id = ?", (pid,))
+        conn.commit()
+        conn.close()
+        await asyncio.sleep(0)
+        with fresh_db.transaction() as conn:
+            conn.execute("UPDATE products SET status = 'done' WHERE id = ?", (pid,))
+
+    async def run_all():
+        await asyncio.gather(*(touch(pid) for pid in pids))
+
+    asyncio.run(run_all())
+    assert opened[0] <= 2
+    assert fresh_db.get_status_counts() == {"done": len(pids)}
+
+
+def test_tasks_never_share_a_transaction(fresh_db):
+    a, b = add_product("A"), add_product("B")
+    written, closed = asyncio.Event(), asyncio.Event()
+    seen = {}
+
+    async def abandoned():
+        conn = fresh_db.get_db_connection()
+        conn.execute("UPDATE products SET product_name = 'A2' WHERE id = ?", (a,))
+        written.set()
+        await asyncio.sleep(0)  # another task runs with this write uncommitted
+        conn.close()  # rolls back only this task's write
+        closed.set()
+
+    async def other():
+        await written.wait()
+        conn = fresh_db.get_db_connection()
+        seen["a"] = conn.execute("SELECT product_name FROM products WHERE id = ?", (a,)).fetchone()[0]
+        conn.close()  # must not touch the other task's open write
+        await closed.wait()
+        with fresh_db.transaction() as conn:
+            conn.execute("UPDATE products SET product_name = 'B2' WHERE id = ?", (b,))
+
+    async def run_both():
+        await asyncio.gather(abandoned(), other())
+
+    asyncio.run(asyncio.wait_for(run_both(), timeout=10))
+    assert seen["a"] == "A"
+    assert (_name(a), _name(b)) == ("A", "B2")
+
+
+def test_await_inside_transaction_is_rolled_back(fresh_db):
+    pid = add_product("Drill")
+
+    async def bad():
+        with fresh_db.transaction() as conn:
+            conn.execute("UPDATE products SET product_name = 'Saw' WHERE id = ?", (pid,))
+            await asyncio.sleep(0)
+
+    with pytest.raises(RuntimeError, match="await inside db.transaction"):
+        asyncio.run(bad())
+    assert _name(pid) == "Drill"
+
+
+def test_pooled_connection_returns_to_the_pool_on_close(fresh_db, opened):
+    async def scenario():
+        for _ in range(3):
+            with fresh_db.get_db_connection() as conn:
+                conn.execute("SELECT 1").fetchone()
+        return len(fresh_db._loop_pool().idle)
+
+    assert asyncio.run(scenario()) == 1
+    assert opened[0] == 1
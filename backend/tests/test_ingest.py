@@ -0,0 +1,79 @@
+import io
+import json
+
+import pytest
+
+from conftest import add_product, fetch_one
+
+
+def _csv(*lines: str) -> io.BytesIO:
+    return io.BytesIO(("EAN,Name,Brand\n" + "\n".join(lines) + "\n").encode())
+
+
+def _products(db) -> list[dict]:
+    conn = db.get_db_connection()
+    rows = conn.execute("SELECT ean, product_name, brand, status FROM products ORDER BY id").fetchall()
+    conn.close()
+    return [dict(r) for r in rows]
+
+
+@pytest.fixture
+def ingest_file(fresh_db):
+    from utils.ingest import ingest_file
+    return ingest_file
+
+
+def test_skip_drops_repeats_in_the_file_and_the_catalog(fresh_db, ingest_file):
+    add_product("Drill", ean="4006381333931")
+    stats = ingest_file(_csv(
+        "4006381333931,Drill v2,Bosch",     # already in the catalog
+        "012345678905,Saw,Makita",
+        "0012345678905,Saw (EAN-13),Makita",  # same barcode, zero-padded
+        "SKU-1,Hammer,",                     # not a barcode: never deduped
+        "SKU-1,Hammer,",
+    ), "feed.csv")
+
+    assert (stats["inserted"], stats["updated"], stats["duplicates"]) == (3, 0, 2)
+    assert [p["product_name"] for p in _products(fresh_db)] == ["Drill", "Saw", "Hammer", "Hammer"]
+
+
+def test_update_overwrites_the_existing_product_and_last_row_wins(fresh_db, ingest_file):
+    pid = add_product("Drill", ean="4006381333931", status="done")
+    stats = ingest_file(_csv(
+        "4006381333931,Drill v2,Bosch",
+        "4006381333931,Drill v3,Bosch",
+        "012345678905,Saw,Makita",
+    ), "feed.csv", mode="update")
+
+    assert (stats["inserted"], stats["updated"], stats["duplicates"]) == (1, 1, 1)
+    row = fetch_one("SELECT product_name, brand, status, original_data FROM products WHERE id = ?", (pid,))
+    assert (row["product_name"], row["brand"], row["status"]) == ("Drill v3", "Bosch", "done")
+    assert json.loads(row["original_data"])["Name"] == "Drill v3"
+
+
+def test_duplicate_inserts_every_row(fresh_db, ingest_file):
+    add_product("Drill", ean="4006381333931")
+    stats = ingest_file(_csv(
+        "4006381333931,Drill v2,Bosch",
+        "4006381333931,Drill v3,Bosch",
+    ), "feed.csv", mode="duplicate")
+
+    assert (stats["inserted"], stats["updated"], stats["duplicates"]) == (2, 0, 0)
+    assert len(_products(fresh_db)) == 3
+
+
+def test_repeats_across_batches_are_deduped(fresh_db, ingest_file):
+    progress = []
+    stats = ingest_file(_csv(
+        "4006381333931,Drill,Bosch",
+        "012345678905,Saw,Makita",
+        "4006381333931,Drill again,Bosch",
+    ), "feed.csv", on_progress=progress.append, batch_size=2)
+
+    assert (stats["inserted"], stats["duplicates"]) == (2, 1)
+    assert [p["done"] for p in progress] == [False, True]
+
+
+def test_unknown_mode_is_rejected(fresh_db, ingest_file):
+    with pytest.raises(ValueError, match="Unknown upload mode"):
+        ingest_file(_csv("4006381333931,Drill,Bosch"), "feed.csv", mode="merge")
@@ -0,0 +1,210 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+import pytest
+
+from conftest import add_product, fetch_one
+
+
+def _job(db, job_id: int) -> dict:
+    return fetch_one("SELECT * FROM jobs WHERE id = ?", (job_id,))
+
+
+def _expire(db, job_id: int):
+    conn = db.get_db_connection()
+    conn.execute("UPDATE jobs SET lease_expires_at = ? WHERE id = ?", (time.time() - 1, job_id))
+    conn.commit()
+    conn.close()
+
+
+def test_enqueue_skips_products_with_an_active_job(fresh_db):
+    pid = add_product()
+    assert fresh_db.enqueue_jobs([pid]) == [pid]
+    assert fresh_db.enqueue_jobs([pid]) == []
+    assert fresh_db.get_job_counts()["queued"] == 1
+
+
+def test_concurrent_claims_never_share_a_job(fresh_db):
+    pids = [add_product(f"P{i}") for i in range(40)]
+    fresh_db.enqueue_jobs(pids)
+    claimed: list[int] = []
+    lock = threading.Lock()
+
+    def claim_all(worker: str):
+        while (job := fresh_db.claim_next_job(worker, 60)) is not None:
+            with lock:
+                claimed.append(job["id"])
+        fresh_db.close_thread_connection()
+
+    threads = [threading.Thread(target=claim_all, args=(f"w{i}",)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(claimed) == len(pids)
+    assert len(set(claimed)) == len(pids)
+    assert fresh_db.get_job_counts()["running"] == len(pids)
+
+
+def test_expired_lease_is_requeued_while_attempts_remain(fresh_db):
+    pid = add_product()
+    fresh_db.enqueue_jobs([pid])
+    job = fresh_db.claim_next_job("w1", 60)
+    _expire(fresh_db, job["id"])
+
+    assert fresh_db.requeue_expired_jobs() == ([pid], [])
+    row = _job(fresh_db, job["id"])
+    assert (row["status"], row["worker_id"], row["attempts"]) == ("queued", None, 1)
+    assert fetch_one("SELECT status FROM products WHERE id = ?", (pid,))["status"] == "enriching"
+    # The old worker can no longer heartbeat or finish it
+    assert not fresh_db.heartbeat_job(job["id"], "w1", 60)
+    assert fresh_db.finish_job(job["id"], "w1", True) is None
+
+
+def test_expired_lease_fails_the_job_after_max_attempts(fresh_db):
+    pid = add_product()
+    fresh_db.enqueue_jobs([pid])
+    for _ in range(fresh_db.JOB_MAX_ATTEMPTS):
+        job = fresh_db.claim_next_job("w1", 60)
+        _expire(fresh_db, job["id"])
+        requeued, failed = fresh_db.requeue_expired_jobs()
+
+    assert (requeued, failed) == ([], [pid])
+    assert _job(fresh_db, job["id"])["status"] == "failed"
+    assert fetch_one("SELECT status FROM products WHERE id = ?", (pid,))["status"] == "error"
+    assert fresh_db.claim_next_job("w1", 60) is None
+
+
+def test_failed_run_is_requeued_until_max_attempts(fresh_db):
+    pid = add_product()
+    fresh_db.enqueue_jobs([pid])
+    statuses = []
+    for _ in range(fresh_db.JOB_MAX_ATTEMPTS):
+        job = fresh_db.claim_next_job("w1", 60)
+        statuses.append(fresh_db.finish_job(job["id"], "w1", False, "Pipeline failed"))
+
+    assert statuses == ["queued"] * (fresh_db.JOB_MAX_ATTEMPTS - 1) + ["failed"]
+    assert _job(fresh_db, job["id"])["last_error"] == "Pipeline failed"
+
+
+def test_release_does_not_count_as_an_attempt(fresh_db):
+    pid = add_product()
+    fresh_db.enqueue_jobs([pid])
+    job = fresh_db.claim_next_job("w1", 60)
+    fresh_db.release_job(job["id"], "w1")
+
+    row = _job(fresh_db, job["id"])
+    assert (row["status"], row["worker_id"], row["attempts"]) == ("queued", None, 0)
+
+
+def test_terminal_writes_are_rejected_after_the_lease_is_lost(fresh_db):
+    pid = add_product()
+    fresh_db.enqueue_jobs([pid])
+    job = fresh_db.claim_next_job("w1", 60)
+
+    def finish_run():
+        fresh_db.set_job_lease(job["id"], "w1")
+        with fresh_db.transaction() as conn:
+            fresh_db.require_job_lease(conn)
+            conn.execute("UPDATE products SET status = 'done' WHERE id = ?", (pid,))
+
+    _expire(fresh_db, job["id"])
+    fresh_db.requeue_expired_jobs()
+    with pytest.raises(fresh_db.LeaseLost):
+        contextvars.copy_context().run(finish_run)
+    assert fetch_one("SELECT status FROM products WHERE id = ?", (pid,))["status"] == "enriching"
+
+    # Outside a job run the guard is a no-op
+    with fresh_db.transaction() as conn:
+        fresh_db.require_job_lease(conn)
+
+
+# ─── Scheduler ────────────────────────────────────────────────────────────────
+
+@pytest.fixture
+def scheduler_module(fresh_db):
+    import scheduler
+    return scheduler
+
+
+def _scheduler(scheduler_module, **kwargs):
+    sched = scheduler_module.BatchScheduler(1, run_workers=False, **kwargs)
+    sched._wakeup = asyncio.Event()
+    return sched
+
+
+def test_job_claimed_after_stop_goes_back_to_the_queue(fresh_db, scheduler_module):
+    pid = add_product()
+    fresh_db.enqueue_jobs([pid])
+    sched = _scheduler(scheduler_module)
+    sched._stopping.set()
+
+    assert asyncio.run(sched._claim(0)) is None
+    row = fetch_one("SELECT status, attempts FROM jobs WHERE product_id = ?", (pid,))
+    assert (row["status"], row["attempts"]) == ("queued", 0)
+    assert sched.stop(timeout=0)
+
+
+def test_lost_lease_cancels_the_run_and_leaves_the_job_alone(fresh_db, scheduler_module, monkeypatch):
+    pid = add_product()
+    fresh_db.enqueue_jobs([pid])
+    sched = _scheduler(scheduler_module, lease_seconds=0.3)
+    run_cancelled = threading.Event()
+
+    async def slow_run(product_id):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            run_cancelled.set()
+            raise
+        return True
+
+    monkeypatch.setattr(scheduler_module, "run_enrichment", slow_run)
+
+    async def scenario():
+        job = await sched._claim(0)
+        # The sweeper on another worker takes the job while our run is going
+        _expire(fresh_db, job["id"])
+        await asyncio.to_thread(fresh_db.requeue_expired_jobs)
+        await asyncio.wait_for(sched._run_job(0, job), timeout=2)
+        return job
+
+    job = asyncio.run(scenario())
+    assert run_cancelled.is_set()
+    row = _job(fresh_db, job["id"])
+    assert (row["status"], row["worker_id"]) == ("queued", None)
+    assert sched.stats()["failed"] == 0 and not sched._in_flight
+
+
+def test_failed_run_requeues_the_job_and_wakes_workers(fresh_db, scheduler_module, monkeypatch):
+    pid = add_product()
+    fresh_db.enqueue_jobs([pid])
+    sched = _scheduler(scheduler_module)
+
+    async def failing_run(product_id):
+        return False
+
+    monkeypatch.setattr(scheduler_module, "run_enrichment", failing_run)
+
+    async def scenario():
+        job = await sched._claim(0)
+        await sched._run_job(0, job)
+        return job
+
+    job = asyncio.run(scenario())
+    assert _job(fresh_db, job["id"])["status"] == "queued"
+    assert sched._wakeup.is_set()
+    assert sched.stats()["failed"] == 0
+
+
+def test_record_failure_marks_the_product_errored_and_processed(fresh_db, scheduler_module):
+    pid = add_product()
+    scheduler_module._record_failure(pid, "Pipeline failed")
+
+    row = fetch_one("SELECT status, current_step FROM products WHERE id = ?", (pid,))
+    assert (row["status"], row["current_step"]) == ("error", None)
+    assert fetch_one("SELECT COUNT(*) AS n FROM processed_products WHERE product_id = ?", (pid,))["n"] == 1
+    assert fresh_db.get_enrichment_log(pid)[-1]["step"] == "error"
@@ -0,0 +1,74 @@
+import time
+
+from conftest import add_product, fetch_one
+
+
+def _urls(db) -> list[str]:
+    conn = db.get_db_connection()
+    rows = conn.execute("SELECT url FROM page_cache ORDER BY url").fetchall()
+    conn.close()
+    return [r["url"] for r in rows]
+
+
+def _touch(db, url: str, at: float):
+    conn = db.get_db_connection()
+    conn.execute("UPDATE page_cache SET fetched_at = ?, last_hit_at = NULL WHERE url = ?", (at, url))
+    conn.commit()
+    conn.close()
+
+
+def test_refresh_keeps_the_version_a_product_used(fresh_db):
+    a, b = add_product("A"), add_product("B")
+    fresh_db.save_cached_page("https://x.test/p", "old page")
+    fresh_db.save_scraped_page(a, "https://x.test/p", "third_party", "old page")
+
+    fresh_db.save_cached_page("https://x.test/p", "new page")  # TTL refresh
+    fresh_db.save_scraped_page(b, "https://x.test/p", "third_party", "new page")
+
+    assert [p["markdown"] for p in fresh_db.get_scraped_pages(a)] == ["old page"]
+    assert [p["markdown"] for p in fresh_db.get_scraped_pages(b)] == ["new page"]
+    # b references the cache; only a keeps its own copy
+    assert fetch_one("SELECT markdown FROM scraped_pages WHERE product_id = ?", (b,))["markdown"] is None
+
+
+def test_product_saving_a_stale_version_keeps_its_own_copy(fresh_db):
+    pid = add_product()
+    fresh_db.save_cached_page("https://x.test/p", "new page")  # refreshed by another product meanwhile
+    fresh_db.save_scraped_page(pid, "https://x.test/p", "third_party", "old page")
+
+    assert [p["markdown"] for p in fresh_db.get_scraped_pages(pid)] == ["old page"]
+
+
+def test_missing_version_reads_as_none(fresh_db):
+    pid = add_product()
+    fresh_db.save_cached_page("https://x.test/p", "old page")
+    fresh_db.save_scraped_page(pid, "https://x.test/p", "third_party", "old page")
+    conn = fresh_db.get_db_connection()
+    conn.execute("UPDATE page_cache SET content_hash = 'other', markdown = 'other' WHERE url = 'https://x.test/p'")
+    conn.commit()
+    conn.close()
+
+    assert [p["markdown"] for p in fresh_db.get_scraped_pages(pid)] == [None]
+
+
+def test_size_cap_evicts_least_recently_used_unreferenced_pages(fresh_db):
+    pid = add_product()
+    now = time.time()
+    for i, url in enumerate(["a", "b", "c", "d"]):
+        fresh_db.save_cached_page(url, "x" * 100)
+        _touch(fresh_db, url, now - 100 + i)  # a oldest, d newest
+    fresh_db.save_scraped_page(pid, "a", "third_party", "x" * 100)
+
+    # 300 bytes: a is referenced, so the oldest unreferenced page (b) goes
+    assert fresh_db.prune_page_cache(3600, max_total_bytes=300) == 1
+    assert _urls(fresh_db) == ["a", "c", "d"]
+
+    fresh_db.save_cached_page("e", "x" * 100, max_total_bytes=300)
+    assert _urls(fresh_db) == ["a", "d", "e"]
+
+
+def test_no_cap_keeps_everything(fresh_db):
+    for url in ["a", "b", "c"]:
+        fresh_db.save_cached_page(url, "x" * 100)
+    assert fresh_db.prune_page_cache(3600) == 0
+    assert _urls(fresh_db) == ["a", "b", "c"]
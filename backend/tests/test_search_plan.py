@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+search = pytest.importorskip("pipeline.search")
+from utils.cost_tracker import CostTracker  # noqa: E402
+
+from conftest import add_product  # noqa: E402
+
+
+def _query(name: str, fetch=None, manufacturer: bool = False):
+    return search._PlannedQuery(
+        query=name, max_results=7, include_domains=["bosch.com"] if manufacturer else None,
+        fetch=fetch, service="tavily", credits=1, phase="search", step="tavily_search",
+        manufacturer_domain="bosch.com" if manufacturer else None,
+    )
+
+
+def _results(n: int) -> list:
+    return [{"url": f"https://x.test/{i}"} for i in range(n)]
+
+
+MANUFACTURER_PLAN = [_query("mfr", manufacturer=True), _query("q1"), _query("q2"), _query("q3")]
+
+
+def test_manufacturer_hit_keeps_two_general_queries():
+    results = {0: _results(1), 1: _results(1)}
+    assert search._search_cutoff(MANUFACTURER_PLAN, results) == 3
+
+
+def test_manufacturer_miss_keeps_all_general_queries():
+    results = {0: [], 1: _results(2), 2: _results(2), 3: _results(1)}
+    assert search._search_cutoff(MANUFACTURER_PLAN, results) == 4
+
+
+def test_cutoff_at_the_query_that_reaches_six_results():
+    plan = [_query("q1"), _query("q2"), _query("q3")]
+    assert search._search_cutoff(plan, {0: _results(4)}) == 3
+    assert search._search_cutoff(plan, {0: _results(4), 1: _results(2)}) == 2
+    assert search._search_cutoff(plan, {0: _results(7)}) == 1
+
+
+def test_out_of_order_completion_does_not_cut_early():
+    plan = [_query("q1"), _query("q2"), _query("q3")]
+    # q2 alone has enough results, but q1 may still change the outcome
+    assert search._search_cutoff(plan, {1: _results(9)}) == 3
+    assert search._search_cutoff(plan, {1: _results(9), 2: _results(9)}) == 3
+
+
+def test_plan_cancels_queued_queries_past_the_cutoff(fresh_db):
+    pid = add_product()
+    tracker = CostTracker(pid)
+    q3_cancelled = []
+
+    def fetcher(n: int, delay: float):
+        async def fetch(on_start):
+            on_start()
+            await asyncio.sleep(delay)
+            return _results(n)
+        return fetch
+
+    async def queued(on_start):
+        try:
+            await asyncio.sleep(5)  # still waiting for a limiter slot
+        except asyncio.CancelledError:
+            q3_cancelled.append(True)
+            raise
+
+    plan = [
+        _query("plan mfr", fetcher(0, 0), manufacturer=True),
+        _query("plan q1", fetcher(4, 0.05)),
+        _query("plan q2", fetcher(3, 0)),  # finishes before q1
+        _query("plan q3", queued),
+    ]
+    merged = asyncio.run(asyncio.wait_for(search._run_search_plan(pid, plan, "tavily", tracker), timeout=2))
+
+    assert len(merged) == 7
+    assert q3_cancelled == [True]
+    assert [c.credits for c in tracker.api_calls] == [1, 1, 1]
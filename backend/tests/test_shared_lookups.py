@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+scrape = pytest.importorskip("utils.scrape")
+from utils import ean_lookup, search_cache  # noqa: E402
+from utils.cost_tracker import CostTracker  # noqa: E402
+
+USAGE = {"model": "claude_haiku", "input_tokens": 100, "output_tokens": 20}
+
+
+async def _leader_cancelled(call, release: asyncio.Event):
+    """Start call() twice, cancel the first caller mid-flight, return the second's result."""
+    first = asyncio.create_task(call(0))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(call(1))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    return await second
+
+
+async def _both(call, release: asyncio.Event):
+    tasks = [asyncio.create_task(call(i)) for i in range(2)]
+    await asyncio.sleep(0.01)
+    release.set()
+    return await asyncio.gather(*tasks)
+
+
+@pytest.fixture
+def fake_scrape(fresh_db, monkeypatch):
+    release = {}
+
+    async def fake(firecrawl, url, on_start=None):
+        await release["event"].wait()
+        return scrape._Scrape("page")
+
+    monkeypatch.setattr(scrape, "_scrape", fake)
+    return release
+
+
+@pytest.mark.parametrize("cancel_leader", [False, True])
+def test_scrape_credit_goes_to_the_first_consumer(fake_scrape, cancel_leader):
+    trackers = [CostTracker(1), CostTracker(2)]
+
+    async def call(i):
+        markdown, from_cache = await scrape.fetch_page(None, "https://x.test/p")
+        scrape.track_scrape(trackers[i], from_cache, "extract_scrape")
+        return markdown
+
+    async def scenario():
+        fake_scrape["event"] = asyncio.Event()
+        run = _leader_cancelled if cancel_leader else _both
+        return await run(call, fake_scrape["event"])
+
+    asyncio.run(scenario())
+    charged, joined = (trackers[1], trackers[0]) if cancel_leader else trackers
+    assert [c.service for c in charged.api_calls] == ["firecrawl"] and charged.cache_hits == []
+    assert joined.api_calls == []
+    assert len(joined.cache_hits) == (0 if cancel_leader else 1)
+
+
+@pytest.fixture
+def fake_lookup(monkeypatch):
+    release = {}
+
+    async def fake(ean):
+        await release["event"].wait()
+        return ean_lookup._Lookup(
+            result={"brand": "Bosch", "product_name": "Drill", "category": None},
+            from_cache=False, credits={"firecrawl": 1}, usage=USAGE,
+        )
+
+    monkeypatch.setattr(ean_lookup, "_lookup_ean", fake)
+    return release
+
+
+@pytest.mark.parametrize("cancel_leader", [False, True])
+def test_ean_lookup_spend_goes_to_the_first_consumer(fake_lookup, cancel_leader):
+    trackers = [CostTracker(1), CostTracker(2)]
+
+    async def scenario():
+        fake_lookup["event"] = asyncio.Event()
+        run = _leader_cancelled if cancel_leader else _both
+        return await run(lambda i: ean_lookup.lookup_ean("4006381333931", trackers[i]), fake_lookup["event"])
+
+    asyncio.run(scenario())
+    charged, joined = (trackers[1], trackers[0]) if cancel_leader else trackers
+    assert ([c.service for c in charged.api_calls], len(charged.llm_calls)) == (["firecrawl"], 1)
+    assert charged.cache_hits == []
+    assert (joined.api_calls, joined.llm_calls) == ([], [])
+    assert len(joined.cache_hits) == (0 if cancel_leader else 2)
+
+
+def test_search_credit_goes_to_the_first_consumer(fresh_db):
+    async def scenario():
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return [{"url": "https://x.test"}]
+
+        async def call(i):
+            return await search_cache.cached_search("tavily", "drill", 7, None, fetch)
+
+        return await _leader_cancelled(call, release)
+
+    results, from_cache = asyncio.run(scenario())
+    assert (results, from_cache) == ([{"url": "https://x.test"}], False)
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    group = SingleFlight("test")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def scenario():
+        return await asyncio.gather(*(group.do("key", fetch) for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert results == [("value", False)] + [("value", True)] * 4
+    assert len(calls) == 1
+    assert group.stats() == {"name": "test", "in_flight": 0, "calls": 1, "coalesced": 4}
+
+
+def test_finished_calls_are_not_reused():
+    group = SingleFlight("test")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return len(calls)
+
+    async def scenario():
+        return [await group.do("key", fetch), await group.do("key", fetch)]
+
+    assert asyncio.run(scenario()) == [(1, False), (2, False)]
+
+
+def test_errors_reach_every_caller():
+    group = SingleFlight("test")
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def scenario():
+        return await asyncio.gather(*(group.do("key", fetch) for _ in range(3)), return_exceptions=True)
+
+    assert [type(r) for r in asyncio.run(scenario())] == [ValueError] * 3
+
+
+def test_cancelled_caller_leaves_the_call_running_for_others():
+    group = SingleFlight("test")
+
+    async def scenario():
+        done = asyncio.Event()
+
+        async def fetch():
+            await done.wait()
+            return "value"
+
+        leader = asyncio.create_task(group.do("key", fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(group.do("key", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        done.set()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(scenario()) == ("value", True)
+
+
+def test_call_is_cancelled_once_every_caller_is():
+    group = SingleFlight("test")
+    cancelled = []
+
+    async def fetch():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def scenario():
+        callers = [asyncio.create_task(group.do("key", fetch)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert cancelled == [1]
+    assert group.stats()["in_flight"] == 0
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from conftest import add_product, fetch_one
+
+
+@pytest.fixture
+def write_behind(fresh_db, monkeypatch):
+    monkeypatch.setattr(fresh_db, "DB_WRITE_BEHIND", True)
+    yield fresh_db
+    fresh_db.flush_writes()
+
+
+@pytest.fixture
+def events(fresh_db):
+    """Capture published product events."""
+    from events import event_bus
+    captured = []
+    event_bus.set_forwarder(lambda product_id, event: captured.append((product_id, event["type"])))
+    yield captured
+    event_bus.set_forwarder(None)
+
+
+def _step(pid: int) -> str:
+    return fetch_one("SELECT current_step FROM products WHERE id = ?", (pid,))["current_step"]
+
+
+def test_queued_writes_land_on_flush(write_behind):
+    pid = add_product()
+    write_behind.update_step(pid, "enriching", "Searching...")
+    write_behind.append_log(pid, {"phase": "search", "step": "query", "status": "success"})
+    assert write_behind.flush_writes(timeout=5)
+
+    assert _step(pid) == "Searching..."
+    assert [e["step"] for e in write_behind.get_enrichment_log(pid)] == ["query"]
+    assert write_behind.get_writer_stats()["failed"] == 0
+
+
+def test_thread_reads_its_own_queued_writes(write_behind):
+    pid = add_product()
+    write_behind.update_step(pid, "enriching", "Extracting...")
+    # No explicit flush: the next get_db_connection() on this thread waits for it
+    assert _step(pid) == "Extracting..."
+
+
+def test_writes_keep_their_order(write_behind):
+    pid = add_product()
+    for i in range(50):
+        write_behind.update_step(pid, "enriching", f"step {i}")
+        write_behind.append_log(pid, {"phase": "test", "step": f"s{i}", "status": "success"})
+    write_behind.flush_writes(timeout=5)
+
+    assert _step(pid) == "step 49"
+    assert [e["step"] for e in write_behind.get_enrichment_log(pid)] == [f"s{i}" for i in range(50)]
+
+
+def test_writes_inside_a_transaction_bypass_the_queue(write_behind):
+    pid = add_product()
+    with pytest.raises(ValueError):
+        with write_behind.transaction():
+            write_behind.update_step(pid, "done", "x")
+            raise ValueError
+    write_behind.flush_writes(timeout=5)
+    assert _step(pid) is None  # rolled back with the block, never queued
+
+
+def test_aflush_writes_waits_without_blocking_the_loop(write_behind):
+    pid = add_product()
+
+    async def scenario():
+        write_behind.update_step(pid, "enriching", "Validating...")
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        task = asyncio.create_task(ticker())
+        await write_behind.aflush_writes()
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(scenario()) > 0
+    assert _step(pid) == "Validating..."
+
+
+def test_events_from_a_transaction_wait_for_the_commit(fresh_db, events):
+    pid = add_product()
+    with fresh_db.transaction():
+        fresh_db.update_step(pid, "enriching", "Saving...")
+        fresh_db.append_log(pid, {"phase": "pipeline", "step": "cost_summary", "status": "success"})
+        assert events == []
+    assert events == [(pid, "status"), (pid, "log")]
+
+
+def test_events_from_a_rolled_back_transaction_are_dropped(fresh_db, events):
+    pid = add_product()
+    with pytest.raises(ValueError):
+        with fresh_db.transaction():
+            fresh_db.append_log(pid, {"phase": "pipeline", "step": "x", "status": "success"})
+            raise ValueError
+    fresh_db.append_log(pid, {"phase": "pipeline", "step": "y", "status": "success"})
+    assert events == [(pid, "log")]
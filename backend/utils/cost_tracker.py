@@ -16,7 +16,7 @@ import os
 import json
 import logging
 from dataclasses import dataclass, field
-from datetime import datetime, date
+from datetime import datetime
 from typing import Dict, List, Optional
 
 logger = logging.getLogger("pipeline.cost_tracker")
@@ -84,71 +84,45 @@ def set_limits(new_limits: dict) -> dict:
 
 def get_daily_stats() -> dict:
     """
-    Get today's processing stats from the database.
+    Get today's processing stats from the cost_rollups table (a few rows per
+    day). "Today" is the UTC day (db.rollup_day). processed_today counts distinct
+    products whose run finished today, failed runs included; re-runs count once.
     Returns counts, cost totals, and limit info.
     """
-    from db import get_db_connection
+    from db import get_status_counts, get_cost_rollups, get_cost_rollup_totals, rollup_day
 
-    conn = get_db_connection()
-    today = date.today().isoformat()
-
-    # Products processed today
-    processed_today = conn.execute(
-        "SELECT COUNT(*) as c FROM products WHERE date(updated_at) = ? AND status IN ('done', 'needs_review', 'error')",
-        (today,)
-    ).fetchone()['c']
-
-    # Currently processing
-    currently_processing = conn.execute(
-        "SELECT COUNT(*) as c FROM products WHERE status IN ('enriching', 'classifying', 'searching', 'extracting', 'validating')"
-    ).fetchone()['c']
-
-    # Total products
-    total_products = conn.execute("SELECT COUNT(*) as c FROM products").fetchone()['c']
-
-    # Aggregate cost data from today's completed products
-    cost_rows = conn.execute(
-        "SELECT cost_data FROM products WHERE date(updated_at) = ? AND cost_data IS NOT NULL",
-        (today,)
-    ).fetchall()
+    today = rollup_day()
+    status_counts = get_status_counts()
+    processed_today = 0
 
     total_cost_today = 0.0
     total_input_tokens_today = 0
     total_output_tokens_today = 0
     service_costs_today: Dict[str, float] = {}
 
-    for row in cost_rows:
-        try:
-            cd = json.loads(row['cost_data'])
-            total_cost_today += cd.get('total_cost_usd', 0)
-            total_input_tokens_today += cd.get('total_input_tokens', 0)
-            total_output_tokens_today += cd.get('total_output_tokens', 0)
-            for svc, cost in cd.get('cost_by_service', {}).items():
-                service_costs_today[svc] = service_costs_today.get(svc, 0) + cost
-        except (json.JSONDecodeError, TypeError):
-            pass
-
-    # All-time aggregate cost data
-    all_cost_rows = conn.execute(
-        "SELECT cost_data FROM products WHERE cost_data IS NOT NULL"
-    ).fetchall()
-
-    total_cost_all_time = 0.0
-    total_products_with_cost = len(all_cost_rows)
-    cost_per_product_list = []
-
-    for row in all_cost_rows:
-        try:
-            cd = json.loads(row['cost_data'])
-            cost = cd.get('total_cost_usd', 0)
-            total_cost_all_time += cost
-            cost_per_product_list.append(cost)
-        except (json.JSONDecodeError, TypeError):
-            pass
+    for row in get_cost_rollups(today):
+        if row["service"] == "*" and row["phase"] == "processed":
+            processed_today = row["products"]
+        elif row["service"] == "*":
+            # Per-run totals row
+            total_cost_today = row["cost"]
+            total_input_tokens_today = row["input_tokens"]
+            total_output_tokens_today = row["output_tokens"]
+        else:
+            service_costs_today[row["service"]] = service_costs_today.get(row["service"], 0) + row["cost"]
 
-    avg_cost_per_product = (total_cost_all_time / total_products_with_cost) if total_products_with_cost > 0 else 0
+    # Currently processing
+    currently_processing = sum(
+        status_counts.get(s, 0)
+        for s in ("enriching", "classifying", "searching", "extracting", "validating")
+    )
 
-    conn.close()
+    # All-time aggregate cost data
+    totals = get_cost_rollup_totals()
+    total_cost_all_time = totals["cost"]
+    # Rollups record spend per run, so the all-time average is per run
+    total_runs_with_cost = totals["products"]
+    avg_cost_per_run = (total_cost_all_time / total_runs_with_cost) if total_runs_with_cost > 0 else 0
 
     limits = get_limits()
 
@@ -162,10 +136,10 @@ def get_daily_stats() -> dict:
         "service_costs_today": {k: round(v, 4) for k, v in service_costs_today.items()},
 
         # All-time stats
-        "total_products": total_products,
-        "total_products_with_cost": total_products_with_cost,
+        "total_products": sum(status_counts.values()),
+        "total_runs_with_cost": total_runs_with_cost,
         "total_cost_all_time_usd": round(total_cost_all_time, 4),
-        "avg_cost_per_product_usd": round(avg_cost_per_product, 4),
+        "avg_cost_per_run_usd": round(avg_cost_per_run, 4),
 
         # Limits
         "daily_product_limit": limits["daily_product_limit"],
@@ -206,6 +180,37 @@ def check_can_process(requested_count: int) -> tuple:
     return True, "OK"
 
 
+def cost_rollup_rows(summary: dict) -> List[dict]:
+    """
+    Break a CostTracker summary (live or stored cost_data) into cost_rollups
+    rows: one per (service, phase) plus a '*' / '*' row with the run totals.
+    """
+    buckets: Dict[tuple, dict] = {}
+
+    def bucket(service: str, phase: str) -> dict:
+        return buckets.setdefault((service, phase), {
+            "service": service, "phase": phase,
+            "cost": 0.0, "input_tokens": 0, "output_tokens": 0, "credits": 0,
+        })
+
+    for call in summary.get("llm_calls", []):
+        b = bucket(call.get("model", "unknown"), call.get("phase", "unknown"))
+        b["cost"] += call.get("cost_usd", 0)
+        b["input_tokens"] += call.get("input_tokens", 0)
+        b["output_tokens"] += call.get("output_tokens", 0)
+    for call in summary.get("api_calls", []):
+        b = bucket(call.get("service", "unknown"), call.get("phase", "unknown"))
+        b["cost"] += call.get("cost_usd", 0)
+        b["credits"] += call.get("credits", 0)
+
+    totals = bucket("*", "*")
+    totals["cost"] = summary.get("total_cost_usd", 0)
+    totals["input_tokens"] = summary.get("total_input_tokens", 0)
+    totals["output_tokens"] = summary.get("total_output_tokens", 0)
+    totals["credits"] = sum((summary.get("total_api_credits") or {}).values())
+    return list(buckets.values())
+
+
 # ─── CostTracker Class ───────────────────────────────────────────────────────
 
 
@@ -256,6 +261,32 @@ class APICall:
         }
 
 
+@dataclass
+class CacheHit:
+    """Record of a call served from a local cache instead of the provider."""
+    service: str
+    phase: str
+    saved_credits: int = 0
+    saved_input_tokens: int = 0
+    saved_output_tokens: int = 0
+    saved_cost_usd: float = 0.0
+    timestamp: str = ""
+
+    def to_dict(self) -> dict:
+        d = {
+            "service": self.service,
+            "phase": self.phase,
+            "saved_cost_usd": round(self.saved_cost_usd, 6),
+            "timestamp": self.timestamp,
+        }
+        if self.saved_credits:
+            d["saved_credits"] = self.saved_credits
+        if self.saved_input_tokens or self.saved_output_tokens:
+            d["saved_input_tokens"] = self.saved_input_tokens
+            d["saved_output_tokens"] = self.saved_output_tokens
+        return d
+
+
 class CostTracker:
     """
     Accumulates all API costs for a single product's enrichment run.
@@ -266,6 +297,7 @@ class CostTracker:
         self.product_id = product_id
         self.llm_calls: List[LLMCall] = []
         self.api_calls: List[APICall] = []
+        self.cache_hits: List[CacheHit] = []
         self.started_at = datetime.now().isoformat()
 
     def add_llm_call(
@@ -322,6 +354,28 @@ class CostTracker:
         )
         return cost
 
+    def add_llm_usage(self, usage: dict, phase: str = "unknown") -> float:
+        """
+        Record a classify_with_schema usage dict. Responses replayed from the
+        LLM response cache are recorded as cache hits (saved tokens), not spend.
+        """
+        if usage.get("response_cache_hit"):
+            return self.add_cache_hit(
+                usage["model"], phase=phase,
+                input_tokens=(
+                    usage["input_tokens"]
+                    + usage.get("cache_creation_input_tokens", 0)
+                    + usage.get("cache_read_input_tokens", 0)
+                ),
+                output_tokens=usage["output_tokens"],
+            )
+        return self.add_llm_call(
+            usage["model"], usage["input_tokens"], usage["output_tokens"],
+            phase=phase,
+            cache_creation_input_tokens=usage.get("cache_creation_input_tokens", 0),
+            cache_read_input_tokens=usage.get("cache_read_input_tokens", 0),
+        )
+
     def add_api_call(
         self,
         service: str,
@@ -351,6 +405,65 @@ class CostTracker:
         )
         return cost
 
+    def add_cache_hit(
+        self,
+        service: str,
+        phase: str = "unknown",
+        credits: int = 0,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+    ) -> float:
+        """
+        Record a call that was served from cache (no provider cost).
+        Kept separate from api_calls/llm_calls so totals stay real spend.
+        Returns the cost that was saved in USD.
+        """
+        pricing = PRICING.get(service, {})
+        saved = (
+            credits * pricing.get("cost_per_credit", 0.0)
+            + (input_tokens / 1_000_000) * pricing.get("input_per_million", 0.0)
+            + (output_tokens / 1_000_000) * pricing.get("output_per_million", 0.0)
+        )
+
+        hit = CacheHit(
+            service=service,
+            phase=phase,
+            saved_credits=credits,
+            saved_input_tokens=input_tokens,
+            saved_output_tokens=output_tokens,
+            saved_cost_usd=saved,
+            timestamp=datetime.now().isoformat(),
+        )
+        self.cache_hits.append(hit)
+
+        logger.debug(
+            f"[Product {self.product_id}] ♻ {service} cache hit | "
+            f"saved ${saved:.5f} ({phase})"
+        )
+        return saved
+
+    def add_shared_call(self, phase: str, credits: Dict[str, int], usage: dict | None = None) -> float:
+        """
+        Record a shared lookup this run was not charged for (utils/singleflight.py):
+        what the run charged for it actually spent — provider credits and the
+        Claude call — is recorded here as cache hits. Returns the saved cost in USD.
+        """
+        saved = 0.0
+        for service, count in credits.items():
+            if count:
+                saved += self.add_cache_hit(service, phase=phase, credits=count)
+        if usage and not usage.get("response_cache_hit"):
+            saved += self.add_cache_hit(
+                usage["model"], phase=phase,
+                input_tokens=(
+                    usage["input_tokens"]
+                    + usage.get("cache_creation_input_tokens", 0)
+                    + usage.get("cache_read_input_tokens", 0)
+                ),
+                output_tokens=usage["output_tokens"],
+            )
+        return saved
+
     @property
     def total_cost(self) -> float:
         return sum(c.cost_usd for c in self.llm_calls) + sum(c.cost_usd for c in self.api_calls)
@@ -378,6 +491,13 @@ class CostTracker:
             credits[c.service] = credits.get(c.service, 0) + c.credits
         return credits
 
+    @property
+    def cache_hits_by_service(self) -> Dict[str, int]:
+        hits: Dict[str, int] = {}
+        for h in self.cache_hits:
+            hits[h.service] = hits.get(h.service, 0) + 1
+        return hits
+
     def get_cost_by_phase(self) -> Dict[str, float]:
         by_phase: Dict[str, float] = {}
         for c in self.llm_calls:
@@ -414,10 +534,14 @@ class CostTracker:
             "cost_by_service": self.get_cost_by_service(),
             "llm_calls_count": len(self.llm_calls),
             "api_calls_count": len(self.api_calls),
+            "cache_hits_count": len(self.cache_hits),
+            "cache_hits_by_service": self.cache_hits_by_service,
+            "cache_savings_usd": round(sum(h.saved_cost_usd for h in self.cache_hits), 6),
             "started_at": self.started_at,
             "completed_at": datetime.now().isoformat(),
             "llm_calls": [c.to_dict() for c in self.llm_calls],
             "api_calls": [c.to_dict() for c in self.api_calls],
+            "cache_hits": [h.to_dict() for h in self.cache_hits],
         }
 
     def to_json(self) -> str:
@@ -428,5 +552,6 @@ class CostTracker:
             f"CostTracker(product={self.product_id}, "
             f"total=${self.total_cost:.4f}, "
             f"llm_calls={len(self.llm_calls)}, "
-            f"api_calls={len(self.api_calls)})"
+            f"api_calls={len(self.api_calls)}, "
+            f"cache_hits={len(self.cache_hits)})"
         )
@@ -1,23 +1,63 @@
 """
 EAN Lookup utility — scrapes barcodelookup.com via Firecrawl.
 Returns brand, product name, and category.
+Concurrent lookups of the same EAN share one scrape + Claude call.
 """
 
 import os
+from dataclasses import dataclass, field
 from firecrawl import FirecrawlApp
-from utils.llm import classify_with_schema
+from utils.llm import aclassify_with_schema
+from utils.scrape import fetch_page, track_scrape
+from utils.singleflight import get_single_flight
 from schemas import BarcodeLookupResult
 
 
-async def lookup_ean(ean: str) -> dict | None:
+@dataclass
+class _Lookup:
+    """One EAN's lookup, shared by every caller that joined it. Records nothing
+    itself: the first caller to get it back is charged its spend (claimed),
+    later callers record that spend as saved."""
+    result: dict | None = None
+    from_cache: bool | None = None  # page came from the page cache (None: no page fetched)
+    credits: dict[str, int] = field(default_factory=dict)
+    usage: dict | None = None
+    claimed: bool = False
+
+
+async def lookup_ean(ean: str, cost_tracker=None) -> dict | None:
     """
-    Scrapes barcodelookup.com/{ean} via Firecrawl.
+    Scrapes barcodelookup.com/{ean} via Firecrawl (through the page cache).
     Returns {brand: str, product_name: str, category: str} or None.
+    If a cost_tracker is given, the scrape (or cache hit) and Claude call are recorded on it.
+    Concurrent callers share one lookup: the first to get the result is charged
+    for it (normally the one that started it, unless it was cancelled meanwhile),
+    the others record what it actually spent as cache hits.
     """
+    lookup, _ = await get_single_flight("ean_lookup").do(ean, lambda: _lookup_ean(ean))
+    result = dict(lookup.result) if lookup.result else None
+    if lookup.claimed:
+        if cost_tracker:
+            cost_tracker.add_shared_call("ean_lookup", lookup.credits, lookup.usage)
+        return result
+    lookup.claimed = True
+
+    if cost_tracker:
+        if lookup.from_cache is not None:
+            track_scrape(cost_tracker, lookup.from_cache, "ean_lookup")
+        if lookup.usage:
+            cost_tracker.add_llm_usage(lookup.usage, phase="ean_lookup")
+    return result
+
+
+async def _lookup_ean(ean: str) -> _Lookup:
+    """Page fetch + Claude call, run as the shared task; the caller that
+    claims the returned _Lookup records its spend."""
+    lookup = _Lookup()
     api_key = os.getenv("FIRECRAWL_API_KEY")
     if not api_key:
         print("Warning: FIRECRAWL_API_KEY not found. Skipping EAN lookup.")
-        return None
+        return lookup
 
     try:
         app = FirecrawlApp(api_key=api_key)
@@ -25,18 +65,13 @@ async def lookup_ean(ean: str) -> dict | None:
         url = f"https://www.barcodelookup.com/{ean}"
         print(f"Scraping {url} for EAN lookup...")
 
-        scraped = app.scrape(url, formats=['markdown'])
-
-        # Handle both Document object and dict response
-        markdown = ''
-        if hasattr(scraped, 'markdown') and scraped.markdown:
-            markdown = scraped.markdown
-        elif isinstance(scraped, dict):
-            markdown = scraped.get('markdown', '')
+        markdown, lookup.from_cache = await fetch_page(app, url)
+        if not lookup.from_cache:
+            lookup.credits["firecrawl"] = 1
 
         if not markdown:
             print("Firecrawl returned no markdown.")
-            return None
+            return lookup
 
         system_prompt = """Extract product information from this barcodelookup.com page content.
 Return ONLY valid JSON with these fields:
@@ -47,17 +82,17 @@ If the information is not found, set the field to null."""
 
         user_prompt = f"Extract product info from this content:\n\n{markdown[:15000]}"
 
-        result = classify_with_schema(
+        result, lookup.usage = await aclassify_with_schema(
             prompt=user_prompt,
             system=system_prompt,
-            schema=BarcodeLookupResult
+            schema=BarcodeLookupResult,
+            return_usage=True
         )
 
         if result.brand or result.product_name:
-            return result.model_dump()
-
-        return None
+            lookup.result = result.model_dump()
+        return lookup
 
     except Exception as e:
         print(f"EAN Lookup failed: {e}")
-        return None
+        return lookup
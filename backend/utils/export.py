@@ -0,0 +1,332 @@
+"""
+Product Export — streaming CSV / NDJSON / XLSX / Parquet export
+
+Products are read from the DB in id-keyset chunks and written out as they go,
+so memory stays flat and the first bytes leave before the whole catalog has
+been read:
+
+    csv / xlsx — two passes: the first collects the column set (spec columns
+                 vary per product), the second writes rows. XLSX uses
+                 openpyxl write-only mode into a temp file that is streamed out.
+                 Memory stays flat, but nothing is sent until the column pass
+                 (csv) or the whole workbook (xlsx) is done, so time-to-first-
+                 byte still grows with the catalog — use ndjson/parquet for that.
+    ndjson     — one JSON object per line, single pass
+    parquet    — typed columnar schema (dimension values as float64 + unit
+                 columns, specs as a list of structs), one row group per chunk.
+                 Needs the optional pyarrow package.
+
+Config:
+    EXPORT_CHUNK_SIZE — products read per DB query (default: 500)
+"""
+
+import io
+import os
+import importlib.util
+import csv
+import json
+import logging
+import tempfile
+from typing import Iterator
+
+from db import get_db_connection
+
+logger = logging.getLogger("pipeline.export")
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "500"))
+EXPORT_FORMATS = ("xlsx", "csv", "ndjson", "parquet")
+
+# Columns build_export_row reads
+_SOURCE_COLUMNS = "id, ean, product_name, status, classification_result, extraction_result, validation_result"
+
+NET_DIMENSIONS = ['height', 'width', 'length', 'depth', 'weight', 'diameter', 'volume']
+PKG_DIMENSIONS = ['height', 'width', 'length', 'depth', 'weight']
+
+
+def _text(value):
+    return str(value) if value is not None else None
+
+
+# ─── Row Building ─────────────────────────────────────────────────────────────
+
+def build_export_row(row: dict, flatten_specs: bool = True) -> dict:
+    """Flatten a product row into export columns. With flatten_specs=False the
+    technical specs come back as a "Specs" list instead of one column each."""
+    export_row = {
+        "ID": row['id'],
+        "EAN": row['ean'],
+        "Name": row['product_name'],
+        "Status": row['status'],
+    }
+
+    enriched_data = {}
+    if row.get('validation_result'):
+        try:
+            val_res = json.loads(row['validation_result'])
+            enriched_data = val_res.get('normalized_data', {})
+            export_row['Quality Status'] = val_res.get('report', {}).get('overall_quality', 'unknown')
+        except: pass
+    elif row.get('extraction_result'):
+        try:
+            enriched_data = json.loads(row['extraction_result'])
+            export_row['Quality Status'] = 'raw_extraction'
+        except: pass
+
+    # Classification
+    if row.get('classification_result'):
+        try:
+            cls_res = json.loads(row['classification_result'])
+            export_row['Type'] = cls_res.get('product_type')
+            export_row['Brand'] = cls_res.get('brand')
+        except: pass
+
+    # Helper to extract EnrichedField value/unit from a nested dict
+    def _field_val(data: dict, *path) -> tuple:
+        """Traverse nested dict and return (value, unit) tuple."""
+        obj = data
+        for key in path:
+            if isinstance(obj, dict) and key in obj:
+                obj = obj[key]
+            else:
+                return (None, None)
+        if isinstance(obj, dict):
+            return (obj.get('value'), obj.get('unit'))
+        return (None, None)
+
+    # Net dimensions
+    for dim_field in NET_DIMENSIONS:
+        val, unit = _field_val(enriched_data, 'dimensions', 'net', dim_field)
+        label = f"Net {dim_field.title()}"
+        export_row[label] = val
+        export_row[f"{label} Unit"] = unit
+
+    # Packaged dimensions
+    for dim_field in PKG_DIMENSIONS:
+        val, unit = _field_val(enriched_data, 'dimensions', 'packaged', dim_field)
+        label = f"Pkg {dim_field.title()}"
+        export_row[label] = val
+        export_row[f"{label} Unit"] = unit
+
+    # Color + COO
+    color_val, _ = _field_val(enriched_data, 'color')
+    export_row['Color'] = color_val
+    coo_val, _ = _field_val(enriched_data, 'country_of_origin')
+    export_row['Country Of Origin'] = coo_val
+
+    # Descriptions
+    desc = enriched_data.get('descriptions', {})
+    short_desc = desc.get('short_description', {})
+    if isinstance(short_desc, dict):
+        export_row['Short Description'] = short_desc.get('value')
+    mktg_desc = desc.get('marketing_description', {})
+    if isinstance(mktg_desc, dict):
+        export_row['Marketing Description'] = mktg_desc.get('value')
+    features = desc.get('features', [])
+    if features:
+        export_row['Features'] = "; ".join(features[:20])
+
+    # Technical Specs
+    tech = enriched_data.get('technical_data', {})
+    specs = tech.get('specs', [])
+    if specs:
+        export_row['Tech Specs Count'] = len(specs)
+        if not flatten_specs:
+            export_row['Specs'] = [
+                {"name": str(spec['name']), "value": _text(spec.get('value')), "unit": _text(spec.get('unit'))}
+                for spec in specs if isinstance(spec, dict) and spec.get('name')
+            ]
+        # Flatten first 30 specs as individual columns
+        for spec in (specs[:30] if flatten_specs else []):
+            if isinstance(spec, dict) and spec.get('name'):
+                col_name = f"Spec: {spec['name']}"
+                spec_val = spec.get('value', '')
+                spec_unit = spec.get('unit', '')
+                export_row[col_name] = f"{spec_val} {spec_unit}".strip() if spec_val else None
+
+    # Warranty
+    warranty = enriched_data.get('warranty', {})
+    war_dur = warranty.get('duration', {})
+    if isinstance(war_dur, dict):
+        export_row['Warranty Duration'] = war_dur.get('value')
+    export_row['Warranty Type'] = warranty.get('type')
+
+    # Documents
+    docs = enriched_data.get('documents', {})
+    doc_list = docs.get('documents', [])
+    if doc_list:
+        export_row['Documents Count'] = len(doc_list)
+        doc_urls = [d.get('url', '') for d in doc_list if isinstance(d, dict)]
+        export_row['Document URLs'] = "; ".join(doc_urls)
+
+    return export_row
+
+
+def iter_export_rows(flatten_specs: bool = True, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[dict]:
+    """All products as export rows, in id order, read chunk_size at a time."""
+    last_id = 0
+    while True:
+        conn = get_db_connection()
+        rows = conn.execute(
+            f"SELECT {_SOURCE_COLUMNS} FROM products WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, chunk_size)
+        ).fetchall()
+        conn.close()
+        if not rows:
+            return
+        for row in rows:
+            yield build_export_row(dict(row), flatten_specs=flatten_specs)
+        last_id = rows[-1]["id"]
+
+
+def _export_columns() -> list[str]:
+    """Union of export columns in first-seen order (what a DataFrame of all rows would have)."""
+    columns: dict[str, None] = {}
+    for row in iter_export_rows():
+        for key in row:
+            columns.setdefault(key, None)
+    return list(columns)
+
+
+def _chunked(rows: Iterator, size: int = EXPORT_CHUNK_SIZE) -> Iterator[list]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ─── Writers ──────────────────────────────────────────────────────────────────
+
+def stream_csv() -> Iterator[bytes]:
+    columns = _export_columns()
+    buffer = io.StringIO()
+    # Enrichment may add spec columns between the two passes; drop them
+    # instead of failing halfway through the download.
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    for chunk in _chunked(iter_export_rows()):
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def stream_ndjson() -> Iterator[bytes]:
+    for chunk in _chunked(iter_export_rows()):
+        yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in chunk).encode("utf-8")
+
+
+def stream_xlsx() -> Iterator[bytes]:
+    from openpyxl import Workbook
+
+    columns = _export_columns()
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(columns)
+    for row in iter_export_rows():
+        sheet.append([row.get(c) for c in columns])
+
+    # The xlsx zip is only complete after save(); write-only mode keeps rows on
+    # disk meanwhile, and the finished file is streamed out in blocks.
+    with tempfile.TemporaryFile() as tmp:
+        workbook.save(tmp)
+        tmp.seek(0)
+        while block := tmp.read(64 * 1024):
+            yield block
+
+
+class _DrainSink(io.RawIOBase):
+    """Write-only file object whose bytes are handed out by drain()."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    fields = [
+        ("ID", pa.int64()), ("EAN", pa.string()), ("Name", pa.string()), ("Status", pa.string()),
+        ("Quality Status", pa.string()), ("Type", pa.string()), ("Brand", pa.string()),
+    ]
+    for prefix, dims in (("Net", NET_DIMENSIONS), ("Pkg", PKG_DIMENSIONS)):
+        for dim in dims:
+            fields += [(f"{prefix} {dim.title()}", pa.float64()), (f"{prefix} {dim.title()} Unit", pa.string())]
+    fields += [
+        ("Color", pa.string()), ("Country Of Origin", pa.string()),
+        ("Short Description", pa.string()), ("Marketing Description", pa.string()), ("Features", pa.string()),
+        ("Tech Specs Count", pa.int64()),
+        ("Specs", pa.list_(pa.struct([("name", pa.string()), ("value", pa.string()), ("unit", pa.string())]))),
+        ("Warranty Duration", pa.string()), ("Warranty Type", pa.string()),
+        ("Documents Count", pa.int64()), ("Document URLs", pa.string()),
+    ]
+    return pa.schema(fields)
+
+
+def _parquet_value(value, arrow_type):
+    import pyarrow as pa
+
+    if value is None:
+        return None
+    if pa.types.is_floating(arrow_type):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None  # e.g. "approx. 3" — kept out of a numeric column
+    if pa.types.is_string(arrow_type):
+        return str(value)
+    return value
+
+
+def stream_parquet() -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema()
+    sink = _DrainSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for chunk in _chunked(iter_export_rows(flatten_specs=False)):
+            columns = {
+                field.name: [_parquet_value(row.get(field.name), field.type) for row in chunk]
+                for field in schema
+            }
+            writer.write_table(pa.table(columns, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def parquet_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+EXPORT_STREAMERS = {
+    "xlsx": (stream_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": (stream_csv, "text/csv; charset=utf-8"),
+    "ndjson": (stream_ndjson, "application/x-ndjson"),
+    "parquet": (stream_parquet, "application/vnd.apache.parquet"),
+}
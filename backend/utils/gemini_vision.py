@@ -12,6 +12,7 @@ import logging
 from typing import List, Dict, Optional
 from dotenv import load_dotenv
 from schemas import EnrichedField
+from utils.rate_limiter import get_rate_limiter
 
 load_dotenv()
 
@@ -56,10 +57,11 @@ Rules:
 
 Respond with ONLY the color name, nothing else."""
 
-        response = model.generate_content([
-            Part.from_uri(image_url, mime_type=_guess_mime(image_url)),
-            prompt
-        ])
+        with get_rate_limiter("gemini").throttle_sync():
+            response = model.generate_content([
+                Part.from_uri(image_url, mime_type=_guess_mime(image_url)),
+                prompt
+            ])
 
         color_text = response.text.strip().lower()
         color_text = re.sub(r'[^a-z/\s]', '', color_text).strip()
@@ -118,10 +120,11 @@ Examples of good descriptions:
 
 Respond with ONLY the description, nothing else."""
 
-            response = model.generate_content([
-                Part.from_uri(url, mime_type=_guess_mime(url)),
-                prompt
-            ])
+            with get_rate_limiter("gemini").throttle_sync():
+                response = model.generate_content([
+                    Part.from_uri(url, mime_type=_guess_mime(url)),
+                    prompt
+                ])
             description = response.text.strip()
             logger.info(f"  Image: {url[-50:]} → {description}")
             results.append({"url": url, "description": description})
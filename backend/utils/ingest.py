@@ -0,0 +1,223 @@
+"""
+Product Ingest — streaming CSV/XLSX upload into the products table
+
+Rows are read one at a time (csv.reader / openpyxl read-only mode) instead of
+loading the whole file into a DataFrame. The header is mapped to product
+columns once per file, and rows are inserted with executemany in batched
+transactions, so memory stays flat for 200k-row supplier feeds.
+
+Uploads are deduplicated on the normalized EAN (db.normalize_ean) according
+to the upload mode:
+    skip      — rows whose EAN is already in the catalog, or earlier in the
+                file, are dropped (default)
+    update    — the existing product's name/brand/weight/original_data are
+                overwritten (last row in the file wins); enrichment is kept
+    duplicate — every row is inserted, as before dedup existed
+
+ingest_file() is blocking — the upload endpoint runs it in a worker thread
+so the API event loop keeps serving requests and SSE streams meanwhile.
+
+Config:
+    INGEST_BATCH_SIZE — rows per INSERT batch / commit (default: 1000)
+"""
+
+import io
+import os
+import csv
+import json
+import logging
+from datetime import date, datetime, time
+from typing import IO, Callable, Iterator, Optional
+
+from db import transaction, normalize_ean
+
+logger = logging.getLogger("pipeline.ingest")
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+UPLOAD_MODES = ("skip", "update", "duplicate")
+
+# Accepted header names per product column, in lookup order
+COLUMN_ALIASES = {
+    "ean": ("EAN", "ean"),
+    "product_name": ("Name", "name", "Product Name", "naziv"),
+    "brand": ("Brand", "brand"),
+    "weight": ("Weight", "weight"),
+}
+
+
+# ─── Row Readers ──────────────────────────────────────────────────────────────
+
+def _csv_rows(stream: IO[bytes]) -> Iterator[list]:
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()  # leave the upload's file object open for its owner
+
+
+def _xlsx_rows(stream: IO[bytes]) -> Iterator[list]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        workbook.close()
+
+
+def _cell(value):
+    """Normalize a CSV/XLSX cell to a JSON-friendly value (blank → None)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)  # Excel stores EANs as floats
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    return value
+
+
+def _map_columns(headers: list[str]) -> dict[str, Optional[int]]:
+    """Header position for each product column (None if the file lacks it)."""
+    positions: dict[str, int] = {}
+    for i, header in enumerate(headers):
+        positions.setdefault(header, i)
+    return {
+        column: next((positions[a] for a in aliases if a in positions), None)
+        for column, aliases in COLUMN_ALIASES.items()
+    }
+
+
+# ─── Ingest ───────────────────────────────────────────────────────────────────
+
+def _existing_eans(conn, keys: list[str]) -> set[str]:
+    found: set[str] = set()
+    # Chunked to stay under SQLite's bound-parameter limit
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        rows = conn.execute(
+            f"SELECT DISTINCT ean_normalized FROM products WHERE ean_normalized IN ({','.join('?' * len(chunk))})",
+            chunk
+        ).fetchall()
+        found.update(r["ean_normalized"] for r in rows)
+    return found
+
+
+def _write_batch(batch: list[tuple], mode: str) -> dict:
+    """
+    Insert / update one batch in a single transaction. Rows are
+    (ean, ean_normalized, name, brand, weight, original_data).
+    Returns {"inserted", "updated", "duplicates"}.
+    """
+    counts = {"inserted": 0, "updated": 0, "duplicates": 0}
+
+    # Collapse repeats within the batch: first row wins for skip, last for update
+    keyed: dict[str, tuple] = {}
+    if mode != "duplicate":
+        for row in batch:
+            key = row[1]
+            if key is not None and (mode == "update" or key not in keyed):
+                keyed[key] = row
+
+    with transaction() as conn:
+        existing = _existing_eans(conn, list(keyed)) if keyed else set()
+        new_rows, updates = [], []
+        for row in batch:
+            key = row[1]
+            if mode == "duplicate" or key is None:
+                new_rows.append(row)
+            elif keyed[key] is not row:
+                counts["duplicates"] += 1
+            elif key in existing:
+                if mode == "update":
+                    updates.append(row)
+                else:
+                    counts["duplicates"] += 1
+            else:
+                new_rows.append(row)
+
+        conn.executemany("""
+            INSERT INTO products (ean, ean_normalized, product_name, brand, weight, original_data)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, new_rows)
+        if updates:
+            conn.executemany("""
+                UPDATE products
+                SET ean = ?, product_name = ?, brand = ?, weight = ?, original_data = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE ean_normalized = ?
+            """, [(ean, name, brand, weight, original, key) for ean, key, name, brand, weight, original in updates])
+
+    counts["inserted"] = len(new_rows)
+    counts["updated"] = len(updates)
+    return counts
+
+
+def ingest_file(
+    stream: IO[bytes],
+    filename: str,
+    on_progress: Optional[Callable[[dict], None]] = None,
+    mode: str = "skip",
+    batch_size: int = INGEST_BATCH_SIZE,
+) -> dict:
+    """
+    Stream a .csv or .xlsx upload into the products table.
+    Returns {"rows", "inserted", "updated", "duplicates", "skipped"} —
+    skipped counts rows with neither EAN nor name. on_progress gets the
+    same dict (plus "done") after every committed batch.
+    """
+    if mode not in UPLOAD_MODES:
+        raise ValueError(f"Unknown upload mode '{mode}' (expected one of {', '.join(UPLOAD_MODES)})")
+
+    rows = _xlsx_rows(stream) if filename.endswith(".xlsx") else _csv_rows(stream)
+
+    raw_headers = next(rows, None) or []
+    headers = [
+        str(h) if h not in (None, "") else f"Unnamed: {i}"
+        for i, h in enumerate(raw_headers)
+    ]
+    columns = _map_columns(headers)
+
+    def text(cells: list, column: str, default=None):
+        pos = columns[column]
+        value = cells[pos] if pos is not None and pos < len(cells) else None
+        return str(value) if value is not None else default
+
+    stats = {"rows": 0, "inserted": 0, "updated": 0, "duplicates": 0, "skipped": 0}
+
+    def report(done: bool):
+        if on_progress:
+            on_progress({**stats, "done": done})
+
+    batch: list[tuple] = []
+    for raw in rows:
+        cells = [_cell(v) for v in raw]
+        if all(v is None for v in cells):
+            continue  # blank line
+        stats["rows"] += 1
+
+        ean = text(cells, "ean", "UNKNOWN")
+        name = text(cells, "product_name", "UNKNOWN")
+        if ean == "UNKNOWN" and name == "UNKNOWN":
+            stats["skipped"] += 1
+            continue
+
+        original = dict(zip(headers, cells + [None] * (len(headers) - len(cells))))
+        batch.append((ean, normalize_ean(ean), name, text(cells, "brand"), text(cells, "weight"), json.dumps(original)))
+
+        if len(batch) >= batch_size:
+            for key, n in _write_batch(batch, mode).items():
+                stats[key] += n
+            batch = []
+            report(done=False)
+
+    if batch:
+        for key, n in _write_batch(batch, mode).items():
+            stats[key] += n
+    report(done=True)
+
+    logger.info(
+        f"Ingested {filename} ({mode}): {stats['inserted']} inserted, {stats['updated']} updated, "
+        f"{stats['duplicates']} duplicate EAN(s), {stats['skipped']} skipped ({stats['rows']} rows)"
+    )
+    return stats
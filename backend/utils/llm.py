@@ -9,15 +9,28 @@ v2: classify_with_schema now returns (result, usage_info) when return_usage=True
 v3: Added prompt caching support (cache_control) for cost optimization.
     - System prompts cached across products within 5-min TTL window.
     - cached_content param for sharing large content (scraped pages) between calls.
+v4: aclassify_with_schema — native async variant on a shared AsyncAnthropicVertex
+    client. Sync and async clients are long-lived singletons (connection keep-alive,
+    one credential lookup) instead of a new client per call.
+v5: Opt-in SQLite response cache (LLM_CACHE_ENABLED) with usage replay.
+v6: classify_with_schema is a thin sync wrapper that runs aclassify_with_schema
+    on the pipeline runtime loop.
 """
 
 import os
 import json
+import asyncio
+import hashlib
 import logging
+import threading
+import weakref
 from typing import Type, TypeVar, Tuple, Optional, List
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from anthropic import AnthropicVertex
+from anthropic import AnthropicVertex, AsyncAnthropicVertex
+from utils.rate_limiter import get_rate_limiter
+from db import get_cached_llm_response, save_cached_llm_response
+from runtime import pipeline_runtime
 
 load_dotenv()
 
@@ -45,53 +58,54 @@ def _get_vertex_config():
     return project_id, region
 
 
+_client: AnthropicVertex | None = None
+_client_lock = threading.Lock()
+
+# Async clients keep their HTTP connection pool on the event loop that opened
+# it, so there is one client per running loop. The pipeline runs on a single
+# long-lived loop, so in practice this is one client for the whole process.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncAnthropicVertex]" = weakref.WeakKeyDictionary()
+
+
 def get_raw_client() -> AnthropicVertex:
-    """Get an AnthropicVertex client instance."""
-    project_id, region = _get_vertex_config()
-    return AnthropicVertex(region=region, project_id=project_id)
+    """Get the shared AnthropicVertex client (created once, connections kept alive)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                project_id, region = _get_vertex_config()
+                _client = AnthropicVertex(region=region, project_id=project_id)
+    return _client
 
 
 # Backward-compat alias
 get_client = get_raw_client
 
 
-def classify_with_schema(
-    prompt: str,
-    system: str,
-    schema: Type[T],
-    model: str = "haiku",
-    return_usage: bool = False,
-    cached_content: Optional[str] = None,
-    max_tokens: int = 4096,
-) -> T | Tuple[T, dict]:
+def get_async_client() -> AsyncAnthropicVertex:
+    """Get the shared AsyncAnthropicVertex client for the running event loop.
+
+    The SDK's default HTTP client pools connections with keep-alive, so
+    concurrent calls reuse warm connections and one credential lookup.
     """
-    Calls Claude via AnthropicVertex and returns a validated Pydantic model instance.
-    Uses JSON mode with schema instruction appended to system prompt.
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        project_id, region = _get_vertex_config()
+        client = AsyncAnthropicVertex(region=region, project_id=project_id)
+        _async_clients[loop] = client
+    return client
 
-    Prompt caching is enabled automatically:
-    - The system prompt + JSON schema is cached across calls (Mode A).
-    - If cached_content is provided, that content goes into the system message
-      with cache_control, and the JSON schema moves to the user message (Mode B).
-      This is used for extraction where the same scraped page is sent to Claude
-      twice (Pass 1 for dimensions, Pass 2 for content).
 
-    Args:
-        prompt: User message content
-        system: System prompt (instructions)
-        schema: Pydantic model class for response validation
-        model: "haiku" (default, cheaper) or "sonnet" (for complex extraction)
-        return_usage: If True, returns (result, usage_dict) tuple
-        cached_content: Large content to cache in system message (e.g. scraped page markdown).
-                        When provided, the JSON schema moves to the user message so that
-                        the cached prefix (preamble + content) matches across calls.
-
-    Returns:
-        If return_usage=False: validated Pydantic model instance
-        If return_usage=True: tuple of (model_instance, usage_dict)
-            where usage_dict includes input_tokens, output_tokens, model,
-            cache_creation_input_tokens, and cache_read_input_tokens
-    """
-    client = get_raw_client()
+def _build_request(
+    prompt: str,
+    system: str,
+    schema: Type[T],
+    model: str,
+    cached_content: Optional[str],
+    max_tokens: int,
+) -> dict:
+    """Build messages.create() kwargs (shared by the sync and async variants)."""
     model_id = HAIKU_MODEL if model == "haiku" else SONNET_MODEL
 
     json_schema = schema.model_json_schema()
@@ -106,13 +120,6 @@ def classify_with_schema(
             {"type": "text", "text": cached_content, "cache_control": {"type": "ephemeral"}},
         ]
         user_content = f"{prompt}\n\n{schema_instruction}"
-
-        response = client.messages.create(
-            model=model_id,
-            max_tokens=max_tokens,
-            system=system_blocks,
-            messages=[{"role": "user", "content": user_content}],
-        )
     else:
         # Mode A: System prompt caching (triage, search, validate, COO)
         # System = instructions + schema (CACHED across products)
@@ -120,15 +127,31 @@ def classify_with_schema(
         system_blocks = [
             {"type": "text", "text": full_system, "cache_control": {"type": "ephemeral"}},
         ]
+        user_content = prompt
+
+    return {
+        "model": model_id,
+        "max_tokens": max_tokens,
+        "system": system_blocks,
+        "messages": [{"role": "user", "content": user_content}],
+    }
 
-        response = client.messages.create(
-            model=model_id,
-            max_tokens=max_tokens,
-            system=system_blocks,
-            messages=[{"role": "user", "content": prompt}],
-        )
 
-    content = response.content[0].text
+def _response_payload(response) -> dict:
+    """Plain-dict copy of the response text and usage (what the response cache stores)."""
+    return {
+        "text": response.content[0].text,
+        "input_tokens": response.usage.input_tokens,
+        "output_tokens": response.usage.output_tokens,
+        "cache_creation_input_tokens": getattr(response.usage, 'cache_creation_input_tokens', 0) or 0,
+        "cache_read_input_tokens": getattr(response.usage, 'cache_read_input_tokens', 0) or 0,
+    }
+
+
+def _parse_payload(payload: dict, schema: Type[T], model: str, return_usage: bool,
+                   from_cache: bool = False) -> T | Tuple[T, dict]:
+    """Validate the JSON response against the schema and collect usage info."""
+    content = payload["text"]
 
     # Clean markdown fences if present
     if "```json" in content:
@@ -139,22 +162,143 @@ def classify_with_schema(
     result = schema.model_validate_json(content)
 
     if return_usage:
-        # Extract cache metrics from response
-        cache_creation = getattr(response.usage, 'cache_creation_input_tokens', 0) or 0
-        cache_read = getattr(response.usage, 'cache_read_input_tokens', 0) or 0
+        cache_creation = payload["cache_creation_input_tokens"]
+        cache_read = payload["cache_read_input_tokens"]
 
         usage = {
-            "input_tokens": response.usage.input_tokens,
-            "output_tokens": response.usage.output_tokens,
+            "input_tokens": payload["input_tokens"],
+            "output_tokens": payload["output_tokens"],
             "model": "claude_haiku" if model == "haiku" else "claude_sonnet",
             "cache_creation_input_tokens": cache_creation,
             "cache_read_input_tokens": cache_read,
         }
 
-        if cache_read > 0:
+        if from_cache:
+            # Replayed usage of the original call — nothing was billed this time
+            usage["response_cache_hit"] = True
+        elif cache_read > 0:
             logger.info(f"  Cache HIT: {cache_read} tokens read from cache")
         elif cache_creation > 0:
             logger.info(f"  Cache WRITE: {cache_creation} tokens written to cache")
 
         return result, usage
     return result
+
+
+# ─── Response Cache ───────────────────────────────────────────────────────────
+# Opt-in (LLM_CACHE_ENABLED=true). Keyed by a hash of the full request — model,
+# system blocks (incl. cached_content), prompt, schema instruction, max_tokens —
+# so any change to the inputs is a miss. Stored in SQLite with LRU eviction by
+# total size (LLM_CACHE_MAX_MB).
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() == "true"
+LLM_CACHE_MAX_BYTES = int(float(os.getenv("LLM_CACHE_MAX_MB", "100")) * 1_048_576)
+
+
+def _cache_lookup(request: dict) -> Tuple[Optional[str], Optional[dict]]:
+    """Return (cache_key, cached_payload). Both None when the cache is disabled."""
+    if not LLM_CACHE_ENABLED:
+        return None, None
+    key = hashlib.sha256(json.dumps(request, sort_keys=True).encode("utf-8")).hexdigest()
+    payload = get_cached_llm_response(key)
+    if payload is not None:
+        logger.info(f"  ♻ LLM response cache HIT ({request['model']})")
+    return key, payload
+
+
+def _cache_store(key: Optional[str], request: dict, payload: dict):
+    if key is None:
+        return
+    try:
+        save_cached_llm_response(key, request["model"], payload, LLM_CACHE_MAX_BYTES)
+    except Exception as e:
+        logger.warning(f"  LLM response cache write failed: {e}")
+
+
+async def aclassify_with_schema(
+    prompt: str,
+    system: str,
+    schema: Type[T],
+    model: str = "haiku",
+    return_usage: bool = False,
+    cached_content: Optional[str] = None,
+    max_tokens: int = 4096,
+) -> T | Tuple[T, dict]:
+    """
+    Calls Claude via the shared AsyncAnthropicVertex client and returns a
+    validated Pydantic model instance. Doesn't block the event loop, so
+    concurrent products overlap their LLM waits.
+
+    Same arguments, prompt caching modes and return shape as classify_with_schema.
+    """
+    request = _build_request(prompt, system, schema, model, cached_content, max_tokens)
+    key, cached = None, None
+    if LLM_CACHE_ENABLED:
+        key, cached = await asyncio.to_thread(_cache_lookup, request)
+    if cached is not None:
+        return _parse_payload(cached, schema, model, return_usage, from_cache=True)
+
+    async with get_rate_limiter("llm").throttle():
+        response = await get_async_client().messages.create(**request)
+    payload = _response_payload(response)
+    parsed = _parse_payload(payload, schema, model, return_usage)
+    if key is not None:
+        await asyncio.to_thread(_cache_store, key, request, payload)
+    return parsed
+
+
+def classify_with_schema(
+    prompt: str,
+    system: str,
+    schema: Type[T],
+    model: str = "haiku",
+    return_usage: bool = False,
+    cached_content: Optional[str] = None,
+    max_tokens: int = 4096,
+) -> T | Tuple[T, dict]:
+    """
+    Calls Claude and returns a validated Pydantic model instance.
+    Uses JSON mode with schema instruction appended to system prompt.
+    The request itself is throttled by the shared "llm" rate limiter.
+
+    Sync wrapper for scripts and non-async callers: runs aclassify_with_schema
+    on the pipeline runtime loop and blocks until it finishes, so rate
+    limiting, the response cache and usage handling live in one place.
+    Pipeline nodes should await aclassify_with_schema directly (calling this
+    from the pipeline loop raises RuntimeError instead of deadlocking it).
+
+    Prompt caching is enabled automatically:
+    - The system prompt + JSON schema is cached across calls (Mode A).
+    - If cached_content is provided, that content goes into the system message
+      with cache_control, and the JSON schema moves to the user message (Mode B).
+      This is used for extraction where the same scraped page is sent to Claude
+      twice (Pass 1 for dimensions, Pass 2 for content).
+
+    Args:
+        prompt: User message content
+        system: System prompt (instructions)
+        schema: Pydantic model class for response validation
+        model: "haiku" (default, cheaper) or "sonnet" (for complex extraction)
+        return_usage: If True, returns (result, usage_dict) tuple
+        cached_content: Large content to cache in system message (e.g. scraped page markdown).
+                        When provided, the JSON schema moves to the user message so that
+                        the cached prefix (preamble + content) matches across calls.
+
+    Returns:
+        If return_usage=False: validated Pydantic model instance
+        If return_usage=True: tuple of (model_instance, usage_dict)
+            where usage_dict includes input_tokens, output_tokens, model,
+            cache_creation_input_tokens, and cache_read_input_tokens.
+            Responses served from the response cache carry the original
+            call's usage plus response_cache_hit=True.
+    """
+    try:
+        on_pipeline_loop = asyncio.get_running_loop() is pipeline_runtime.loop
+    except RuntimeError:  # no running event loop on this thread
+        on_pipeline_loop = False
+    if on_pipeline_loop:
+        raise RuntimeError("classify_with_schema called on the pipeline loop — await aclassify_with_schema instead")
+    return pipeline_runtime.run(aclassify_with_schema(
+        prompt, system, schema, model=model, return_usage=return_usage,
+        cached_content=cached_content, max_tokens=max_tokens,
+    ))
@@ -0,0 +1,226 @@
+"""
+Rate Limiter — process-wide per-provider throttling
+
+Every outbound call to Firecrawl, Tavily, Claude (Vertex) and Gemini goes
+through a named limiter that enforces both:
+  - an RPM budget (token bucket, refilled continuously), and
+  - a max in-flight cap (concurrent requests).
+
+Limiters are shared by all products in the process, which is what keeps a
+concurrent batch under provider quotas. State is guarded by a threading lock
+and waiting is done by polling, so the same limiter can be used from any
+thread or event loop (the pipeline runtime loop, worker threads running
+sync SDK calls, and the sync gemini helpers).
+
+Each limiter records how long callers waited for a slot, so the dashboard can
+show which provider is the bottleneck.
+
+Usage:
+    async with get_rate_limiter("firecrawl_scrape").throttle():
+        scraped = await asyncio.to_thread(firecrawl.scrape, url, formats=['markdown'])
+
+Config (env):
+    FIRECRAWL_TIER        — free | hobby | standard | growth (default: free)
+    TAVILY_MAX_RPM        — default 100
+    TAVILY_MAX_CONCURRENT — default 10
+    LLM_MAX_RPM           — Claude on Vertex, default 50
+    LLM_MAX_CONCURRENT    — default 5
+    GEMINI_MAX_RPM        — default 60
+    GEMINI_MAX_CONCURRENT — default 5
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict
+
+logger = logging.getLogger("pipeline.rate_limiter")
+
+
+# ─── Tier Presets ─────────────────────────────────────────────────────────────
+# Firecrawl plan limits: /scrape RPM, /search RPM, concurrent browsers.
+
+FIRECRAWL_TIERS = {
+    "free":     {"scrape_rpm": 10,   "search_rpm": 5,    "concurrent": 2},
+    "hobby":    {"scrape_rpm": 100,  "search_rpm": 50,   "concurrent": 5},
+    "standard": {"scrape_rpm": 500,  "search_rpm": 250,  "concurrent": 50},
+    "growth":   {"scrape_rpm": 5000, "search_rpm": 2500, "concurrent": 100},
+}
+
+# Don't log every short wait — only ones that are worth noticing
+_SLOW_WAIT_LOG_S = 1.0
+
+# Upper bound on a single poll sleep, so releases are picked up quickly
+_MAX_POLL_S = 0.25
+
+
+class AsyncRateLimiter:
+    """Token bucket (RPM) + in-flight cap for a single service."""
+
+    def __init__(self, name: str, max_concurrent: int, max_rpm: int):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_rpm = max(1, max_rpm)
+        self._lock = threading.Lock()
+        self._tokens = float(self.max_rpm)
+        self._last_refill = time.monotonic()
+        self._in_flight = 0
+        self._waiting = 0
+        # Wait-time accounting
+        self._acquired = 0
+        self._total_wait_s = 0.0
+        self._max_wait_s = 0.0
+
+    def _refill(self, now: float):
+        elapsed = now - self._last_refill
+        if elapsed > 0:
+            self._tokens = min(float(self.max_rpm), self._tokens + elapsed * self.max_rpm / 60.0)
+            self._last_refill = now
+
+    def _try_acquire(self) -> float:
+        """Take a slot if one is free. Returns 0 on success, else seconds to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self._in_flight >= self.max_concurrent:
+                return _MAX_POLL_S
+            if self._tokens < 1.0:
+                return min(_MAX_POLL_S, (1.0 - self._tokens) * 60.0 / self.max_rpm)
+            self._tokens -= 1.0
+            self._in_flight += 1
+            return 0.0
+
+    def _record_wait(self, waited: float):
+        with self._lock:
+            self._acquired += 1
+            self._total_wait_s += waited
+            self._max_wait_s = max(self._max_wait_s, waited)
+        if waited >= _SLOW_WAIT_LOG_S:
+            logger.info(f"  ⏳ {self.name}: waited {waited:.1f}s for a slot")
+
+    async def acquire(self):
+        """Wait for both a concurrency slot AND an RPM token."""
+        started = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+        try:
+            while True:
+                delay = self._try_acquire()
+                if delay == 0.0:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        self._record_wait(time.monotonic() - started)
+
+    def acquire_sync(self):
+        """Blocking variant of acquire() for sync call sites."""
+        started = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+        try:
+            while True:
+                delay = self._try_acquire()
+                if delay == 0.0:
+                    break
+                time.sleep(delay)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        self._record_wait(time.monotonic() - started)
+
+    def release(self):
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+
+    @asynccontextmanager
+    async def throttle(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextmanager
+    def throttle_sync(self):
+        self.acquire_sync()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            avg_wait = (self._total_wait_s / self._acquired) if self._acquired else 0.0
+            return {
+                "name": self.name,
+                "max_rpm": self.max_rpm,
+                "max_concurrent": self.max_concurrent,
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "requests": self._acquired,
+                "total_wait_s": round(self._total_wait_s, 3),
+                "avg_wait_ms": round(avg_wait * 1000, 1),
+                "max_wait_ms": round(self._max_wait_s * 1000, 1),
+            }
+
+
+# ─── Registry ─────────────────────────────────────────────────────────────────
+
+def create_rate_limiters() -> Dict[str, AsyncRateLimiter]:
+    """Build the limiter set from env config and the Firecrawl tier preset."""
+    tier_name = os.getenv("FIRECRAWL_TIER", "free").lower()
+    tier = FIRECRAWL_TIERS.get(tier_name)
+    if tier is None:
+        logger.warning(f"Unknown FIRECRAWL_TIER '{tier_name}', using 'free'")
+        tier = FIRECRAWL_TIERS["free"]
+
+    return {
+        "firecrawl_scrape": AsyncRateLimiter("firecrawl_scrape", tier["concurrent"], tier["scrape_rpm"]),
+        "firecrawl_search": AsyncRateLimiter("firecrawl_search", tier["concurrent"], tier["search_rpm"]),
+        "tavily": AsyncRateLimiter(
+            "tavily",
+            int(os.getenv("TAVILY_MAX_CONCURRENT", "10")),
+            int(os.getenv("TAVILY_MAX_RPM", "100")),
+        ),
+        "llm": AsyncRateLimiter(
+            "llm",
+            int(os.getenv("LLM_MAX_CONCURRENT", "5")),
+            int(os.getenv("LLM_MAX_RPM", "50")),
+        ),
+        "gemini": AsyncRateLimiter(
+            "gemini",
+            int(os.getenv("GEMINI_MAX_CONCURRENT", "5")),
+            int(os.getenv("GEMINI_MAX_RPM", "60")),
+        ),
+    }
+
+
+_limiters: Dict[str, AsyncRateLimiter] | None = None
+_registry_lock = threading.Lock()
+
+
+def get_rate_limiters() -> Dict[str, AsyncRateLimiter]:
+    """Return the process-wide limiter registry (created on first use)."""
+    global _limiters
+    if _limiters is None:
+        with _registry_lock:
+            if _limiters is None:
+                _limiters = create_rate_limiters()
+    return _limiters
+
+
+def get_rate_limiter(name: str) -> AsyncRateLimiter:
+    """Return a single named limiter. Raises KeyError for unknown services."""
+    return get_rate_limiters()[name]
+
+
+def get_rate_limiter_stats() -> list[dict]:
+    """Per-limiter usage and wait-time stats, slowest (most total wait) first."""
+    stats = [limiter.stats() for limiter in get_rate_limiters().values()]
+    stats.sort(key=lambda s: s["total_wait_s"], reverse=True)
+    return stats
@@ -0,0 +1,99 @@
+"""
+Scrape helper — Firecrawl scrapes through the global page cache
+
+Every pipeline scrape (extract_node, gap_fill_node, lookup_ean) goes through fetch_page():
+  1. Look the URL up in page_cache (shared by all products, kept across resets)
+  2. On a miss, scrape via Firecrawl (rate-limited, off the event loop)
+  3. Store the markdown + content hash so the next product/re-run is free
+
+Callers get (markdown, from_cache) back and pass it to track_scrape(), which
+records a cache hit instead of a Firecrawl credit in the CostTracker.
+
+Concurrent misses for the same URL share one scrape (utils/singleflight.py).
+The first caller to get the shared scrape back gets from_cache=False and is
+charged the credit — normally the one that started it, unless that caller was
+cancelled meanwhile; the others get from_cache=True.
+
+Config (env):
+    PAGE_CACHE_TTL_HOURS — how long a cached page is reused (default: 168 = 7 days,
+                           0 disables cache reads; pages are still stored)
+    PAGE_CACHE_MAX_MB    — size cap; least recently used pages no product
+                           references are evicted above it (default: 500, 0 = no cap)
+"""
+
+import os
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Tuple
+from firecrawl import FirecrawlApp
+from db import get_cached_page, save_cached_page
+from utils.rate_limiter import get_rate_limiter
+from utils.singleflight import get_single_flight
+
+logger = logging.getLogger("pipeline.scrape")
+
+PAGE_CACHE_TTL_SECONDS = float(os.getenv("PAGE_CACHE_TTL_HOURS", "168")) * 3600
+PAGE_CACHE_MAX_BYTES = int(float(os.getenv("PAGE_CACHE_MAX_MB", "500")) * 1_048_576)
+
+# Pages are capped before caching; no caller uses more than this
+MAX_PAGE_CHARS = 40000
+
+
+@dataclass
+class _Scrape:
+    """One URL's Firecrawl scrape, shared by every caller that joined it."""
+    markdown: str
+    claimed: bool = False  # set by the caller charged for it
+
+
+def _markdown_from_response(scraped) -> str:
+    """Handle both Document object and dict response."""
+    if hasattr(scraped, 'markdown') and scraped.markdown:
+        return scraped.markdown
+    if isinstance(scraped, dict):
+        return scraped.get('markdown') or ''
+    return ''
+
+
+async def fetch_page(firecrawl: FirecrawlApp, url: str, on_start=None) -> Tuple[str, bool]:
+    """
+    Return (markdown, from_cache) for a URL, capped at MAX_PAGE_CHARS.
+    Empty markdown is returned (and not cached) when the page has no content.
+    Scrape errors propagate to the caller. on_start is called once a limiter
+    slot is held, right before the Firecrawl request (not on a cache hit).
+    from_cache is False only for the one caller charged for the scrape; pass
+    it to track_scrape before awaiting anything else.
+    """
+    if PAGE_CACHE_TTL_SECONDS > 0:
+        cached = await asyncio.to_thread(get_cached_page, url, PAGE_CACHE_TTL_SECONDS)
+        if cached:
+            logger.info(f"  ♻ Page cache HIT: {url[:80]}")
+            return cached, True
+
+    scrape, _ = await get_single_flight("scrape").do(url, lambda: _scrape(firecrawl, url, on_start))
+    charged = not scrape.claimed
+    scrape.claimed = True
+    return scrape.markdown, not charged
+
+
+def track_scrape(cost_tracker, from_cache: bool, phase: str):
+    """Record a Firecrawl scrape — or a page cache hit, which costs nothing."""
+    if not cost_tracker:
+        return
+    if from_cache:
+        cost_tracker.add_cache_hit("firecrawl", phase=phase, credits=1)
+    else:
+        cost_tracker.add_api_call("firecrawl", credits=1, phase=phase)
+
+
+async def _scrape(firecrawl: FirecrawlApp, url: str, on_start=None) -> _Scrape:
+    async with get_rate_limiter("firecrawl_scrape").throttle():
+        if on_start:
+            on_start()
+        scraped = await asyncio.to_thread(firecrawl.scrape, url, formats=['markdown'])
+
+    markdown = _markdown_from_response(scraped)[:MAX_PAGE_CHARS]
+    if markdown:
+        await asyncio.to_thread(save_cached_page, url, markdown, PAGE_CACHE_MAX_BYTES)
+    return _Scrape(markdown)
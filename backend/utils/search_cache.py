@@ -0,0 +1,120 @@
+"""
+Search Cache — persistent Tavily / Firecrawl query cache
+
+search_node looks every query up here before calling the provider. Entries
+are keyed by (provider, normalized query, include_domains, max_results), so
+the same "{brand} {model} specifications" query from a re-run or a duplicate
+SKU is answered from SQLite at zero credits.
+
+Empty result lists are not cached (they are often transient). Concurrent
+misses for the same key share one provider call (utils/singleflight.py);
+the first caller to get its results back gets from_cache=False and is charged
+the credits, the others get from_cache=True.
+
+Hit/miss counters since process start are kept in memory for the dashboard;
+per-entry hit totals are stored in the table.
+
+Config (env):
+    SEARCH_CACHE_TTL_HOURS — how long results are reused (default: 24, 0 disables)
+"""
+
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from db import get_cached_search, save_cached_search, get_search_cache_stats
+from utils.singleflight import get_single_flight
+
+logger = logging.getLogger("pipeline.search_cache")
+
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_HOURS", "24")) * 3600
+
+_metrics_lock = threading.Lock()
+_metrics: Dict[str, Dict[str, int]] = {}
+
+
+@dataclass
+class _Fetch:
+    """One provider call, shared by every caller that joined it."""
+    results: List[dict]
+    claimed: bool = False  # set by the caller charged for it
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a query."""
+    return " ".join(query.lower().split())
+
+
+def search_cache_key(provider: str, query: str, max_results: int,
+                     include_domains: Optional[List[str]] = None) -> str:
+    key = {
+        "provider": provider,
+        "query": normalize_query(query),
+        "include_domains": sorted(d.lower() for d in include_domains) if include_domains else [],
+        "max_results": max_results,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _count(provider: str, outcome: str):
+    with _metrics_lock:
+        counts = _metrics.setdefault(provider, {"hits": 0, "misses": 0})
+        counts[outcome] += 1
+
+
+async def cached_search(
+    provider: str,
+    query: str,
+    max_results: int,
+    include_domains: Optional[List[str]],
+    fetch: Callable[[], Awaitable[List[dict]]],
+) -> Tuple[List[dict], bool]:
+    """
+    Return (results, from_cache). On a miss, awaits fetch() — which performs
+    the actual provider call and returns a normalized result list — and
+    stores its result. Provider errors propagate to the caller.
+    """
+    key = search_cache_key(provider, query, max_results, include_domains)
+
+    if SEARCH_CACHE_TTL_SECONDS > 0:
+        cached = await asyncio.to_thread(get_cached_search, key, SEARCH_CACHE_TTL_SECONDS)
+        if cached is not None:
+            _count(provider, "hits")
+            logger.info(f"  ♻ Search cache HIT ({provider}): '{query}'")
+            return cached, True
+
+    _count(provider, "misses")
+
+    async def fetch_and_store() -> _Fetch:
+        results = await fetch()
+        if results:
+            await asyncio.to_thread(save_cached_search, key, provider, query, include_domains, max_results, results)
+        return _Fetch(results)
+
+    call, _ = await get_single_flight("search").do(key, fetch_and_store)
+    if call.claimed:
+        return [dict(r) for r in call.results], True  # each caller gets its own result dicts
+    call.claimed = True
+    return call.results, False
+
+
+def get_search_cache_metrics() -> dict:
+    """Per-provider stored entries/hits plus hit/miss counts since startup."""
+    stored = get_search_cache_stats()
+    with _metrics_lock:
+        session = {p: dict(c) for p, c in _metrics.items()}
+    metrics = {}
+    for provider in sorted(set(stored) | set(session)):
+        counts = session.get(provider, {"hits": 0, "misses": 0})
+        lookups = counts["hits"] + counts["misses"]
+        metrics[provider] = {
+            **stored.get(provider, {"entries": 0, "hits": 0}),
+            "session_hits": counts["hits"],
+            "session_misses": counts["misses"],
+            "session_hit_rate_pct": round(counts["hits"] / lookups * 100, 1) if lookups else 0.0,
+        }
+    return metrics
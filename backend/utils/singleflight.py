@@ -0,0 +1,110 @@
+"""
+Single-Flight — coalesce identical in-flight lookups
+
+When a batch enriches many products from the same brand at once, they all
+miss the brand COO cache, the page cache or the search cache together and
+would each fire the same Tavily / Firecrawl / Claude request. A named
+SingleFlight group runs one call per key; concurrent callers with the same
+key await that call's result instead of starting their own.
+
+The shared call runs as its own task. A caller that is cancelled only stops
+waiting; the call itself is cancelled once no caller is waiting for it.
+Errors propagate to every caller. Nothing is kept after the call finishes —
+the persistent caches still cover later requests.
+
+Calls are grouped per event loop (in practice the pipeline runtime loop), so
+coalescing is per process: separate worker processes don't share calls.
+
+Usage:
+    (markdown, from_cache), shared = await get_single_flight("scrape").do(
+        url, lambda: _scrape(firecrawl, url)
+    )
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+logger = logging.getLogger("pipeline.singleflight")
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Keyed single-flight group: one in-flight call per key."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], _Call] = {}
+        self._started = 0
+        self._coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Return (result, shared). Runs fn() unless a call for key is already in
+        flight, in which case its result is awaited and shared is True.
+        """
+        loop = asyncio.get_running_loop()
+        call_key = (loop, key)
+        call = self._calls.get(call_key)
+        if call is not None and (call.task.done() or call.task.cancelling()):
+            call = None  # finished, or abandoned by its last caller — start a fresh call
+        shared = call is not None
+
+        if call is None:
+            call = _Call(loop.create_task(fn()))
+            self._calls[call_key] = call
+            self._started += 1
+
+            def _forget(_task, call=call):
+                if self._calls.get(call_key) is call:
+                    del self._calls[call_key]
+            call.task.add_done_callback(_forget)
+        else:
+            self._coalesced += 1
+            logger.info(f"  ⇉ Joined in-flight {self.name} call: {str(key)[:80]}")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "in_flight": len(self._calls),
+            "calls": self._started,
+            "coalesced": self._coalesced,
+        }
+
+
+# ─── Registry ─────────────────────────────────────────────────────────────────
+
+_groups: Dict[str, SingleFlight] = {}
+_registry_lock = threading.Lock()
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """Return the process-wide single-flight group for name (created on first use)."""
+    group = _groups.get(name)
+    if group is None:
+        with _registry_lock:
+            group = _groups.setdefault(name, SingleFlight(name))
+    return group
+
+
+def get_single_flight_stats() -> list[dict[str, Any]]:
+    """Calls started and callers coalesced per group, since process start."""
+    return [group.stats() for group in _groups.values()]
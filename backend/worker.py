@@ -0,0 +1,91 @@
+"""
+Worker — standalone enrichment worker process
+
+Claims enrichment jobs from the `jobs` table and runs the pipeline, separately
+from the uvicorn process that serves the API and SSE streams. Run any number
+of these, on one box or several sharing the same database:
+
+    cd backend
+    python -m worker                 # MAX_CONCURRENT_PRODUCTS workers
+    python -m worker --workers 4
+
+Set EMBEDDED_WORKERS=false for the API process so it only queues jobs.
+
+Status/log events can't reach SSE subscribers directly from here, so the event
+bus is pointed at the DB event outbox; the API process relays them. Outbox
+inserts go through the write-behind writer thread, off the pipeline loop.
+
+Stop with Ctrl-C / SIGTERM: the worker stops claiming jobs and waits for
+in-flight products to finish. A second signal exits immediately — the
+unfinished jobs' leases expire and another worker picks them up.
+"""
+
+import os
+import time
+import signal
+import logging
+import argparse
+
+from db import init_db, write_outbox_event, flush_writes
+from events import event_bus
+from scheduler import BatchScheduler
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s │ %(name)-20s │ %(message)s",
+    datefmt="%H:%M:%S",
+)
+# Quiet down noisy libraries
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logging.getLogger("httpcore").setLevel(logging.WARNING)
+logging.getLogger("anthropic").setLevel(logging.WARNING)
+logging.getLogger("google").setLevel(logging.WARNING)
+logging.getLogger("urllib3").setLevel(logging.WARNING)
+
+logger = logging.getLogger("pipeline.worker")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run enrichment jobs from the database.")
+    parser.add_argument(
+        "--workers", type=int,
+        default=int(os.getenv("MAX_CONCURRENT_PRODUCTS", "2")),
+        help="products enriched concurrently by this process (default: MAX_CONCURRENT_PRODUCTS)",
+    )
+    args = parser.parse_args()
+
+    init_db()
+    event_bus.set_forwarder(write_outbox_event)
+
+    scheduler = BatchScheduler(
+        args.workers,
+        lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", "60")),
+        poll_seconds=float(os.getenv("JOB_POLL_SECONDS", "2")),
+    )
+
+    stop_requested = False
+
+    def _handle_signal(signum, frame):
+        nonlocal stop_requested
+        if stop_requested:
+            logger.warning("Second signal received — exiting without waiting for in-flight products")
+            os._exit(1)
+        stop_requested = True
+
+    signal.signal(signal.SIGINT, _handle_signal)
+    signal.signal(signal.SIGTERM, _handle_signal)
+
+    scheduler.start()
+    logger.info(f"Worker {scheduler.worker_id} ready ({args.workers} concurrent products)")
+
+    while not stop_requested:
+        time.sleep(0.5)
+
+    logger.info("Stopping — waiting for in-flight products to finish (Ctrl-C again to force)")
+    scheduler.stop()
+    flush_writes()
+    logger.info("Worker stopped")
+
+
+if __name__ == "__main__":
+    main()